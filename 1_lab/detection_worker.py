@@ -0,0 +1,175 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import cv2
+
+from face_detection import draw_detections
+
+
+class DetectionResult:
+    """Готовый кадр: размеченное изображение и рамки лиц/глаз"""
+
+    def __init__(self, seq, frame, detections, elapsed):
+        self.seq = seq
+        self.frame = frame
+        self.detections = detections
+        self.elapsed = elapsed
+
+
+class DetectionWorker:
+    """Захват и детекция вне потока Tk.
+
+    Поток захвата постоянно читает камеру в одноместный буфер (старый кадр
+    вытесняется новым, поэтому в драйвере не копится очередь), потоки детекции
+    берут самый свежий кадр и публикуют размеченный результат. Цикл Tk только
+    забирает последний результат через latest().
+
+    Каждому потоку детекции — свой детектор из detector_factory(): каскады
+    OpenCV нельзя безопасно использовать из нескольких потоков одновременно.
+    VideoCapture принадлежит потоку захвата: stop() освобождает его, только
+    когда поток захвата завершился, а если тот ещё заблокирован в read(),
+    поток освободит источник сам на выходе.
+    При drop_frames=False (файл на полной скорости) захват ждёт, пока
+    предыдущий кадр возьмут в обработку, и кадры не пропускаются.
+    В metrics (lab_common.metrics.Metrics) пишутся этапы detect и draw
+    и счётчики кадров captured, processed, dropped.
+    """
+
+    def __init__(self, cap, detector_factory, workers=1, metrics=None, drop_frames=True):
+        self.cap = cap
+        self.detector_factory = detector_factory
+        self.workers = max(1, workers)
+        self.metrics = metrics
+        self.drop_frames = drop_frames
+
+        self.stop_event = threading.Event()
+        self.frame_cond = threading.Condition()
+        self.frame = None
+        self.frame_seq = 0
+        self.taken_seq = 0
+        self.busy = 0  # кадры, которые сейчас обрабатываются
+
+        self.result_lock = threading.Lock()
+        self.result = None
+        self.presented_seq = 0
+
+        self.captured = 0
+        self.dropped = 0
+        self.source_ended = False
+        self.release_lock = threading.Lock()
+        self.capture_thread = None
+        self.threads = []
+        self.detectors = []
+
+    def start(self):
+        self.stop_event.clear()
+        self.capture_thread = threading.Thread(target=self._capture_loop, name="face-capture", daemon=True)
+        self.threads = [self.capture_thread]
+        self.detectors = [self.detector_factory() for _ in range(self.workers)]
+        for i, detector in enumerate(self.detectors):
+            self.threads.append(threading.Thread(target=self._detect_loop, args=(detector,), name=f"face-detect-{i}", daemon=True))
+        for t in self.threads:
+            t.start()
+
+    def stop(self, timeout=2.0):
+        """Останавливает потоки и освобождает камеру"""
+        self.stop_event.set()
+        with self.frame_cond:
+            self.frame_cond.notify_all()
+        for t in self.threads:
+            t.join(timeout)
+        self.threads = []
+        # Освобождать VideoCapture, пока другой поток внутри read(), нельзя:
+        # если поток захвата не успел выйти, он освободит источник сам
+        if self.capture_thread is None or not self.capture_thread.is_alive():
+            self._release()
+
+    def _release(self):
+        with self.release_lock:
+            cap, self.cap = self.cap, None
+        if cap is not None:
+            cap.release()
+
+    def _capture_loop(self):
+        try:
+            self._capture_frames(self.cap)
+        finally:
+            if self.stop_event.is_set():
+                self._release()
+
+    def _capture_frames(self, cap):
+        while not self.stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                if getattr(cap, "ended", False):
+                    # Видеофайл или последовательность изображений закончились
+                    self.source_ended = True
+                    return
+                time.sleep(0.01)
+                continue
+            with self.frame_cond:
+                if not self.drop_frames:
+                    self.frame_cond.wait_for(lambda: self.stop_event.is_set() or self.frame_seq <= self.taken_seq)
+                dropped = self.frame_seq > self.taken_seq
+                if dropped:
+                    self.dropped += 1
+                self.frame = frame
+                self.frame_seq += 1
+                self.captured += 1
+                self.frame_cond.notify_all()
+            if self.metrics is not None:
+                self.metrics.count("captured")
+                if dropped:
+                    self.metrics.count("dropped")
+
+    def _stage(self, name):
+        return self.metrics.stage(name) if self.metrics is not None else nullcontext()
+
+    def _detect_loop(self, detector):
+        while not self.stop_event.is_set():
+            with self.frame_cond:
+                self.frame_cond.wait_for(lambda: self.stop_event.is_set() or self.frame_seq > self.taken_seq, 0.1)
+                if self.stop_event.is_set() or self.frame_seq <= self.taken_seq:
+                    continue
+                seq, frame = self.frame_seq, self.frame
+                self.taken_seq = seq
+                self.busy += 1
+                self.frame_cond.notify_all()
+
+            start_time = time.perf_counter()
+            try:
+                with self._stage("detect"):
+                    detections = detector.detect(frame)
+                with self._stage("draw"):
+                    annotated = draw_detections(frame, detections)
+            except cv2.error as e:
+                print(f"Ошибка при обработке кадра: {e}")
+            else:
+                result = DetectionResult(seq, annotated, detections, time.perf_counter() - start_time)
+                if self.metrics is not None:
+                    self.metrics.count("processed")
+
+                with self.result_lock:
+                    if self.result is None or self.result.seq < seq:
+                        self.result = result
+            with self.frame_cond:
+                self.busy -= 1
+
+    def finished(self):
+        """Источник закончился, все его кадры обработаны и последний результат уже забран через latest()"""
+        if not self.source_ended:
+            return False
+        with self.frame_cond:
+            if self.frame_seq > self.taken_seq or self.busy:
+                return False
+        with self.result_lock:
+            return self.result is None or self.result.seq <= self.presented_seq
+
+    def latest(self):
+        """Возвращает новый готовый результат или None, если нового нет"""
+        with self.result_lock:
+            if self.result is None or self.result.seq <= self.presented_seq:
+                return None
+            self.presented_seq = self.result.seq
+            return self.result
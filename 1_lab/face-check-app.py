@@ -1,23 +1,46 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+import argparse
+import os
+import sys
 import cv2
-from PIL import Image, ImageTk # pip install Pillow
+
+from face_backends import DEFAULT_BACKEND, available_backends
+from face_detection import FaceEyeDetector, draw_detections
+from detection_worker import DetectionWorker
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.frame_source import FrameSource, add_source_args, source_options
+from lab_common.metrics import Instrumentation, Metrics, add_metrics_args
+from lab_common.presenter import FramePresenter
+from lab_common.stats_panel import StatsPanel
+
+# Период обновления изображения в окне, мс (детекция идёт в фоновых потоках)
+DISPLAY_INTERVAL_MS = 30
 
 class FaceEyeDetectionApp:
-    def __init__(self, root):
+    def __init__(self, root, metrics=None, source="0", source_kwargs=None):
         self.root = root
         self.root.title("Обнаружение лиц и глаз")
         self.root.geometry("800x600")
 
+        # Время этапов детекции и отображения, счётчики кадров
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # Источник кадров: номер камеры, видеофайл, маска изображений или URL (см. lab_common.frame_source)
+        self.source = source
+        self.source_kwargs = source_kwargs or {}
+
         # Переменные для управления камерой
         self.cap = None
         self.is_running = False
+        self.worker = None
 
         # Загрузка каскадов
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        self.detector = FaceEyeDetector(metrics=self.metrics)
 
-        if self.face_cascade.empty() or self.eye_cascade.empty():
+        if self.detector.empty():
             messagebox.showerror("Ошибка", "Не удалось загрузить каскады Haar. Проверьте установку OpenCV.")
             self.root.destroy()
             return
@@ -33,6 +56,7 @@ class FaceEyeDetectionApp:
         # Label для отображения видео
         self.video_label = tk.Label(self.video_frame)
         self.video_label.pack()
+        self.presenter = FramePresenter(self.video_label)
 
         # Фрейм для кнопок
         self.button_frame = ttk.Frame(self.root)
@@ -50,13 +74,66 @@ class FaceEyeDetectionApp:
         self.exit_button = ttk.Button(self.button_frame, text="Выход", command=self.on_closing)
         self.exit_button.pack(side=tk.LEFT, padx=5)
 
+        # Быстрый режим: уменьшенный кадр, поиск рядом с прежними лицами, глаза в верхней половине лица
+        self.fast_mode_var = tk.BooleanVar(value=False)
+        self.fast_mode_check = ttk.Checkbutton(self.button_frame, text="Быстрый режим", variable=self.fast_mode_var,
+                                               command=self.toggle_fast_mode)
+        self.fast_mode_check.pack(side=tk.LEFT, padx=5)
+
+        # Детектор лиц: каскад Хаара или DNN-модели, найденные в каталоге models
+        ttk.Label(self.button_frame, text="Детектор:").pack(side=tk.LEFT, padx=(10, 0))
+        self.backend_var = tk.StringVar(value=DEFAULT_BACKEND)
+        self.backend_box = ttk.Combobox(self.button_frame, textvariable=self.backend_var, values=available_backends(),
+                                        width=8, state="readonly")
+        self.backend_box.pack(side=tk.LEFT, padx=5)
+        self.backend_box.bind("<<ComboboxSelected>>", self.change_backend)
+
+        # Панель времени этапов (grayscale, cascade_face, cascade_eye, draw, render)
+        self.stats_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.button_frame, text="Статистика", variable=self.stats_var,
+                        command=lambda: self.stats_panel.toggle(self.stats_var.get())).pack(side=tk.LEFT, padx=5)
+
+        # Статус: время детекции и число пропущенных кадров
+        self.status_label = ttk.Label(self.root, text="")
+        self.status_label.pack(pady=(0, 5))
+        self.stats_panel = StatsPanel(self.root, self.metrics, padx=10, anchor=tk.W)
+
+    def create_detector(self):
+        return FaceEyeDetector(backend=self.backend_var.get(), fast=self.fast_mode_var.get(), metrics=self.metrics)
+
+    def change_backend(self, event=None):
+        """Меняет детектор лиц; при запущенной камере потоки детекции перезапускаются"""
+        if self.backend_var.get() == self.detector.backend.name:
+            return
+        try:
+            self.detector = self.create_detector()
+        except (OSError, RuntimeError, cv2.error) as e:
+            messagebox.showerror("Ошибка", f"Не удалось загрузить детектор: {e}")
+            self.backend_var.set(self.detector.backend.name)
+            return
+        if self.is_running:
+            self.stop_detection()
+            self.start_detection()
+
+    def toggle_fast_mode(self):
+        detectors = [self.detector] + (self.worker.detectors if self.worker else [])
+        for detector in detectors:
+            detector.fast = self.fast_mode_var.get()
+            detector.reset()
+
     def start_detection(self):
         if not self.is_running:
-            self.cap = cv2.VideoCapture(0)
+            # Кадры декодируются заранее в своём потоке; для камеры read() отдаёт самый свежий кадр
+            self.cap = FrameSource(self.source, **self.source_kwargs)
             if not self.cap.isOpened():
-                messagebox.showerror("Ошибка", "Не удалось открыть веб-камеру.")
+                self.cap.release()
+                self.cap = None
+                messagebox.showerror("Ошибка", f"Не удалось открыть источник видео: {self.source}")
                 return
             self.is_running = True
+            self.worker = DetectionWorker(self.cap, self.create_detector, metrics=self.metrics,
+                                          drop_frames=not self.cap.lossless)
+            self.worker.start()
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             self.update_frame() # Запуск обновления кадров
@@ -64,54 +141,59 @@ class FaceEyeDetectionApp:
     def stop_detection(self):
         if self.is_running:
             self.is_running = False
-            if self.cap:
+            # Поток захвата останавливается и сам освобождает камеру
+            if self.worker:
+                self.worker.stop()
+                self.worker = None
+            elif self.cap:
                 self.cap.release()
             self.cap = None
-            self.video_label.config(image='') # Очистить изображение
+            self.presenter.clear() # Очистить изображение
+            self.status_label.config(text="")
             self.start_button.config(state=tk.NORMAL)
             self.stop_button.config(state=tk.DISABLED)
 
     def update_frame(self):
         if self.is_running:
-            ret, frame = self.cap.read()
-            if ret:
-                # Обработка кадра
-                processed_frame = self.detect_faces_and_eyes(frame)
-
-                # Конвертация OpenCV BGR -> RGB -> PIL Image -> PhotoImage
-                processed_frame_rgb = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-                img_pil = Image.fromarray(processed_frame_rgb)
-                img_tk = ImageTk.PhotoImage(image=img_pil)
-
-                # Обновление метки с изображением
-                self.video_label.imgtk = img_tk  # Сохраняем ссылку, чтобы изображение не исчезло
-                self.video_label.configure(image=img_tk)
+            # Забираем последний готовый кадр из фоновых потоков (если он появился)
+            result = self.worker.latest()
+            if result is not None:
+                # Обновление изображения на месте (BGR -> RGB в заранее выделенный буфер)
+                with self.metrics.stage("render"):
+                    self.presenter.show(result.frame)
+                self.status_label.config(
+                    text=f"{self.cap.describe()} | {self.detector.backend.name} | Детекция: {result.elapsed * 1000:.1f} мс | "
+                         f"Пропущено кадров: {self.worker.dropped}"
+                )
+            elif self.worker.finished():
+                # Файл дочитан и последний кадр показан
+                status = self.status_label.cget("text")
+                self.stop_detection()
+                self.status_label.config(text=f"{status} | Источник закончился")
+                return
 
-            # Повторный вызов функции через 10 мс для обновления кадра
-            self.root.after(10, self.update_frame)
+            # Повторный вызов функции с частотой отображения
+            self.root.after(DISPLAY_INTERVAL_MS, self.update_frame)
 
     def detect_faces_and_eyes(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-        
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-            roi_gray = gray[y:y+h, x:x+w]
-            roi_color = frame[y:y+h, x:x+w]
-            
-            eyes = self.eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=5, minSize=(10, 10))
-            for (ex, ey, ew, eh) in eyes:
-                cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
-        
-        return frame
+        detections = self.detector.detect(frame)
+        return draw_detections(frame, detections)
 
     def on_closing(self):
         self.stop_detection()
         self.root.destroy()
 
 if __name__ == "__main__":
+    parser = add_metrics_args(argparse.ArgumentParser(description="Обнаружение лиц и глаз"))
+    args = add_source_args(parser).parse_args()
+    metrics = Metrics()
+    instrumentation = Instrumentation.from_args(metrics, args, prefix="face")
+    instrumentation.start()
     root = tk.Tk()
-    app = FaceEyeDetectionApp(root)
+    app = FaceEyeDetectionApp(root, metrics, args.source, source_options(args))
     # Обработка закрытия окна через 'X'
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
\ No newline at end of file
+    try:
+        root.mainloop()
+    finally:
+        instrumentation.stop()
\ No newline at end of file
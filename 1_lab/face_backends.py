@@ -0,0 +1,152 @@
+import os
+
+import cv2
+
+# Файлы моделей лежат рядом с приложением (см. readme), каталог можно переопределить
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+# Размер рамки глаза относительно ширины лица, когда глаза берутся из ключевых точек YuNet
+EYE_BOX_RATIO = 0.25
+
+
+def clip_box(x0, y0, x1, y1, width, height):
+    """Рамка (x, y, w, h) в целых координатах, обрезанная по границам кадра"""
+    x0, y0 = max(0, int(x0)), max(0, int(y0))
+    x1, y1 = min(width, int(x1)), min(height, int(y1))
+    return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+
+class YuNetFaceNet:
+    """Детектор лиц YuNet (cv2.FaceDetectorYN).
+
+    Помимо рамок YuNet возвращает ключевые точки, поэтому рамки глаз строятся
+    по ним и каскад глаз не нужен. Пакетный вывод не поддерживается —
+    detect_batch обрабатывает кадры по одному.
+    """
+
+    batched = False
+
+    def __init__(self, model_path, score_threshold=0.6, nms_threshold=0.3, top_k=5000):
+        self.net = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold, top_k)
+        self.input_size = (320, 320)
+
+    def detect(self, frame, scale=1.0):
+        """Список (рамка лица, [рамки глаз]); scale < 1 — поиск по уменьшенному кадру"""
+        height, width = frame.shape[:2]
+        img = frame
+        if scale < 1.0:
+            img = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            scale = 1.0
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        size = (img.shape[1], img.shape[0])
+        if size != self.input_size:
+            self.net.setInputSize(size)
+            self.input_size = size
+
+        _, faces = self.net.detect(img)
+        if faces is None:
+            return []
+        faces = faces[:, :8] / scale
+        detections = []
+        for x, y, w, h, rx, ry, lx, ly in faces:
+            face = clip_box(x, y, x + w, y + h, width, height)
+            half = w * EYE_BOX_RATIO / 2
+            eyes = [clip_box(ex - half, ey - half, ex + half, ey + half, width, height) for ex, ey in ((rx, ry), (lx, ly))]
+            detections.append((face, eyes))
+        return detections
+
+    def detect_batch(self, frames, scale=1.0):
+        return [self.detect(frame, scale) for frame in frames]
+
+
+class SsdFaceNet:
+    """Детектор лиц SSD ResNet-10 из OpenCV (Caffe-модель, вход 300x300).
+
+    Кадры любого размера приводятся ко входу сети, поэтому масштаб scale
+    не используется. Несколько кадров собираются в один блоб и проходят
+    через сеть за один вызов forward(). Глаза ищет вызывающий код.
+    """
+
+    batched = True
+    input_size = (300, 300)
+    mean = (104.0, 177.0, 123.0)
+
+    def __init__(self, proto_path, model_path, score_threshold=0.6):
+        self.net = cv2.dnn.readNetFromCaffe(proto_path, model_path)
+        self.score_threshold = score_threshold
+
+    def detect(self, frame, scale=1.0):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, scale=1.0):
+        """Список результатов detect() для каждого кадра; глаза — None"""
+        images = [cv2.cvtColor(f, cv2.COLOR_GRAY2BGR) if f.ndim == 2 else f for f in frames]
+        blob = cv2.dnn.blobFromImages(images, 1.0, self.input_size, self.mean, swapRB=False, crop=False)
+        self.net.setInput(blob)
+        # Выход: [1, 1, N, 7] — номер кадра, класс, уверенность, x0, y0, x1, y1 (доли размера кадра)
+        out = self.net.forward().reshape(-1, 7)
+        out = out[out[:, 2] >= self.score_threshold]
+
+        results = [[] for _ in frames]
+        for image_id, _, _, x0, y0, x1, y1 in out:
+            image_id = int(image_id)
+            if not 0 <= image_id < len(frames):
+                continue
+            height, width = frames[image_id].shape[:2]
+            box = clip_box(x0 * width, y0 * height, x1 * width, y1 * height, width, height)
+            if box[2] > 0 and box[3] > 0:
+                results[image_id].append((box, None))
+        return results
+
+
+class FaceBackend:
+    """Способ поиска лиц: каскад Хаара или DNN-модель из файлов в каталоге моделей"""
+
+    def __init__(self, name, model_files=(), factory=None, requires=None):
+        self.name = name
+        self.model_files = tuple(model_files)
+        self.factory = factory
+        self.requires = requires
+
+    def model_paths(self, model_dir=None):
+        return [os.path.join(model_dir or MODELS_DIR, f) for f in self.model_files]
+
+    def available(self, model_dir=None):
+        # Часть классов есть не во всех сборках OpenCV, файлы моделей в репозиторий кладутся вручную
+        if self.requires and getattr(cv2, self.requires, None) is None:
+            return False
+        return all(os.path.isfile(p) for p in self.model_paths(model_dir))
+
+    def create_net(self, model_dir=None, score_threshold=0.6):
+        """Загружает DNN-модель; для каскада Хаара возвращает None"""
+        if self.factory is None:
+            return None
+        missing = [p for p in self.model_paths(model_dir) if not os.path.isfile(p)]
+        if missing:
+            raise FileNotFoundError(f"Нет файлов модели {self.name}: {', '.join(missing)}")
+        if self.requires and getattr(cv2, self.requires, None) is None:
+            raise RuntimeError(f"Детектор {self.name} недоступен в этой сборке OpenCV")
+        return self.factory(*self.model_paths(model_dir), score_threshold=score_threshold)
+
+
+BACKENDS = {
+    "haar": FaceBackend("haar"),
+    "yunet": FaceBackend("yunet", ["face_detection_yunet_2023mar.onnx"], YuNetFaceNet,
+                         requires="FaceDetectorYN"),
+    "ssd": FaceBackend("ssd", ["deploy.prototxt", "res10_300x300_ssd_iter_140000_fp16.caffemodel"], SsdFaceNet),
+}
+
+DEFAULT_BACKEND = "haar"
+
+
+def get_backend(name):
+    try:
+        return BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Неизвестный детектор лиц: {name}. Доступны: {', '.join(BACKENDS)}") from None
+
+
+def available_backends(model_dir=None):
+    return [name for name, backend in BACKENDS.items() if backend.available(model_dir)]
@@ -0,0 +1,222 @@
+"""Пакетный поиск лиц и глаз без интерфейса.
+
+Примеры:
+    python face_cli.py --images "archive/*.jpg" --output faces.jsonl
+    python face_cli.py --video camera01.mp4 --workers 8 --format csv --output faces.csv --annotate annotated.mp4
+    python face_cli.py --video camera01.mp4 --backend ssd --batch 8
+
+Работа делится между процессами пула: детектор загружается один раз на процесс,
+видео режется на диапазоны кадров, каждый процесс открывает файл сам.
+На каждый кадр выводятся рамки лиц и глаз (JSON Lines или CSV), в конце —
+задержка и пропускная способность выбранного детектора.
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from face_backends import BACKENDS, DEFAULT_BACKEND
+from face_detection import FaceEyeDetector, draw_detections
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.video_chunks import common_root, join_video_chunks, mirror_path, open_chunk_writer, video_chunks
+
+CSV_FIELDS = ["source", "frame", "face_x", "face_y", "face_w", "face_h", "eyes"]
+
+# Состояние процесса-обработчика: детектор создаётся один раз на процесс
+_worker = {}
+
+
+def init_worker(backend, model_dir, fast, batch):
+    # Внутри процессов пула OpenCV не должен порождать собственные потоки
+    cv2.setNumThreads(1)
+    _worker["detector"] = FaceEyeDetector(backend=backend, model_dir=model_dir, fast=fast)
+    _worker["batch"] = batch
+
+
+def make_record(source, frame_idx, detections, elapsed):
+    return {
+        "source": source,
+        "frame": frame_idx,
+        "faces": [{"box": list(face), "eyes": [list(eye) for eye in eyes]} for face, eyes in detections],
+        "time_ms": round(elapsed * 1000.0, 3),
+    }
+
+
+def process_image(args):
+    """Обрабатывает одно изображение; annotated_path — куда сохранить разметку (None — не сохранять)"""
+    path, annotated_path = args
+    start = time.perf_counter()
+    img = cv2.imread(path)
+    if img is None:
+        return {"source": path, "frame": 0, "error": "не удалось прочитать изображение"}
+    detector = _worker["detector"]
+    # Отдельные фотографии не связаны между собой — слежение не используется
+    detector.reset()
+    detections = detector.detect(img)
+
+    if annotated_path:
+        os.makedirs(os.path.dirname(annotated_path), exist_ok=True)
+        cv2.imwrite(annotated_path, draw_detections(img, detections))
+    return make_record(path, 0, detections, time.perf_counter() - start)
+
+
+def process_video_chunk(args):
+    """Обрабатывает кадры [first, last) видео пакетами по _worker["batch"] кадров.
+
+    Время пакета делится поровну между его кадрами.
+    """
+    path, first, last, chunk_path = args
+    detector = _worker["detector"]
+    batch = _worker["batch"]
+    detector.reset()
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    writer = None
+    records = []
+    frame_idx = first
+    # last=None — число кадров неизвестно, читаем до конца
+    end = last if last is not None else float("inf")
+    while frame_idx < end:
+        start = time.perf_counter()
+        frames = []
+        while frame_idx + len(frames) < end and len(frames) < batch:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        if not frames:
+            break
+        results = detector.detect_batch(frames)
+        for frame, detections in zip(frames, results):
+            if chunk_path:
+                if writer is None:
+                    writer = open_chunk_writer(chunk_path, frame, cap.get(cv2.CAP_PROP_FPS))
+                writer.write(draw_detections(frame, detections))
+        elapsed = (time.perf_counter() - start) / len(frames)
+        records.extend(make_record(path, frame_idx + i, detections, elapsed) for i, detections in enumerate(results))
+        frame_idx += len(frames)
+        if len(frames) < batch and frame_idx < end:
+            break
+    cap.release()
+    if writer is not None:
+        writer.release()
+    return records
+
+
+class RecordWriter:
+    """Запись результатов в JSON Lines или CSV (одна строка на лицо)"""
+
+    def __init__(self, out, fmt):
+        self.out = out
+        self.fmt = fmt
+        if fmt == "csv":
+            self.csv = csv.writer(out)
+            self.csv.writerow(CSV_FIELDS)
+
+    def write(self, record):
+        if self.fmt == "jsonl":
+            self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        faces = record.get("faces") or [None]
+        for face in faces:
+            if face is None:
+                # Кадр без лиц тоже попадает в отчёт
+                self.csv.writerow([record["source"], record["frame"], "", "", "", "", ""])
+                continue
+            eyes = ";".join(":".join(str(v) for v in eye) for eye in face["eyes"])
+            self.csv.writerow([record["source"], record["frame"], *face["box"], eyes])
+
+    def flush(self):
+        self.out.flush()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный поиск лиц и глаз на изображениях и видео")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="шаблон пути к изображениям, например \"archive/*.jpg\"")
+    source.add_argument("--video", help="видеофайл")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument("--chunk", type=int, default=200, help="кадров видео на одно задание")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND, help="детектор лиц")
+    parser.add_argument("--model-dir", help="каталог с файлами DNN-моделей (по умолчанию 1_lab/models)")
+    parser.add_argument("--batch", type=int, default=1, help="кадров видео в одном блобе DNN-детектора")
+    parser.add_argument("--fast", action="store_true", help="быстрый режим детектора (см. FaceEyeDetector)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--output", help="файл результатов (по умолчанию stdout)")
+    parser.add_argument("--annotate", help="каталог (для --images) или видеофайл (для --video) с разметкой")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Проверяем детектор до запуска пула: ошибка в инициализаторе процессов приводит к их бесконечному перезапуску
+    try:
+        detector = FaceEyeDetector(backend=args.backend, model_dir=args.model_dir)
+    except (OSError, RuntimeError, cv2.error) as e:
+        print(f"Не удалось загрузить детектор {args.backend}: {e}", file=sys.stderr)
+        return 1
+    if detector.empty():
+        print("Не удалось загрузить каскады Haar. Проверьте установку OpenCV.", file=sys.stderr)
+        return 1
+
+    if args.images:
+        paths = sorted(glob.glob(args.images))
+        if not paths:
+            print(f"Нет файлов по шаблону: {args.images}", file=sys.stderr)
+            return 1
+        # Разметка повторяет пути относительно общего каталога, как поле source в записях
+        root = common_root(paths)
+        tasks = [(path, mirror_path(args.annotate, path, root) if args.annotate else None) for path in paths]
+    else:
+        try:
+            chunks = video_chunks(args.video, args.chunk, args.annotate)
+        except OSError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    writer = RecordWriter(out, args.format)
+    start = time.perf_counter()
+    latencies = []
+    initargs = (args.backend, args.model_dir, args.fast, max(1, args.batch))
+    try:
+        with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=initargs) as pool:
+            if args.images:
+                for record in pool.imap(process_image, tasks, chunksize=4):
+                    writer.write(record)
+                    writer.flush()
+                    if "time_ms" in record:
+                        latencies.append(record["time_ms"])
+            else:
+                for records in pool.imap(process_video_chunk, chunks):
+                    for record in records:
+                        writer.write(record)
+                        latencies.append(record["time_ms"])
+                    writer.flush()
+                if args.annotate:
+                    join_video_chunks(chunks, args.annotate)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    count = len(latencies)
+    print(f"Детектор {args.backend}: обработано кадров {count} за {elapsed:.2f} с "
+          f"({count / elapsed if elapsed else 0:.1f} к/с)", file=sys.stderr)
+    if latencies:
+        p50, p90 = np.percentile(latencies, [50, 90])
+        print(f"Время на кадр: p50={p50:.1f} мс, p90={p90:.1f} мс", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+from contextlib import nullcontext
+
+import cv2
+
+from face_backends import DEFAULT_BACKEND, get_backend
+
+FACE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+EYE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_eye.xml'
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+class FaceEyeDetector:
+    """Поиск лиц и глаз каскадами Хаара или DNN-детектором лиц.
+
+    backend — имя из face_backends.BACKENDS. Для DNN-детекторов модель
+    загружается из model_dir; глаза берутся из ключевых точек (YuNet)
+    или ищутся каскадом глаз внутри найденных лиц (SSD).
+
+    Обычный режим повторяет исходный алгоритм: каскад лиц по всему кадру
+    с scaleFactor=1.1, затем каскад глаз по каждому лицу.
+
+    Быстрый режим (fast=True):
+    - полный проход выполняется по уменьшенному в downscale раз кадру,
+      найденные рамки масштабируются обратно;
+    - между полными проходами (раз в full_scan_every кадров или при потере
+      лица) лица ищутся только рядом с прежними положениями, а minSize/maxSize
+      каскада берутся из размеров прежних рамок;
+    - глаза ищутся только в верхней половине лица.
+    Для DNN-детекторов быстрый режим означает вход сети, уменьшенный
+    в downscale раз (если модель допускает произвольный размер входа).
+
+    metrics (lab_common.metrics.Metrics или любой объект с методом stage(name))
+    получает время этапов grayscale, dnn_face, cascade_face, cascade_eye.
+    """
+
+    def __init__(self, backend=DEFAULT_BACKEND, model_dir=None, score_threshold=0.6, fast=False, downscale=0.5, full_scan_every=10, search_margin=0.5, size_tolerance=0.3,
+                 scale_factor=1.1, min_neighbors=5, min_face_size=(30, 30), min_eye_size=(10, 10),
+                 face_cascade_path=FACE_CASCADE_PATH, eye_cascade_path=EYE_CASCADE_PATH, metrics=None):
+        self.backend = get_backend(backend)
+        self.face_net = self.backend.create_net(model_dir, score_threshold)
+        self.face_cascade = None if self.face_net else cv2.CascadeClassifier(face_cascade_path)
+        self.eye_cascade = cv2.CascadeClassifier(eye_cascade_path)
+
+        self.fast = fast
+        self.downscale = downscale
+        self.full_scan_every = full_scan_every
+        self.search_margin = search_margin
+        self.size_tolerance = size_tolerance
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_face_size = min_face_size
+        self.min_eye_size = min_eye_size
+        self.metrics = metrics
+
+        self.reset()
+
+    def empty(self):
+        if self.face_cascade is not None and self.face_cascade.empty():
+            return True
+        return self.eye_cascade.empty()
+
+    def reset(self):
+        """Сбрасывает состояние слежения (следующий кадр — полный проход)"""
+        self.prev_faces = []
+        self.frames_since_scan = 0
+
+    def save_state(self):
+        """Состояние слежения быстрого режима: один детектор может по очереди обслуживать несколько видеопотоков"""
+        return list(self.prev_faces), self.frames_since_scan
+
+    def load_state(self, state):
+        """Восстанавливает состояние из save_state(); None — полный проход на следующем кадре"""
+        if state is None:
+            self.reset()
+        else:
+            self.prev_faces, self.frames_since_scan = list(state[0]), state[1]
+
+    def _stage(self, name):
+        return self.metrics.stage(name) if self.metrics is not None else nullcontext()
+
+    def detect(self, frame):
+        """Возвращает список (рамка лица, [рамки глаз]) в координатах кадра"""
+        if self.face_net is not None:
+            with self._stage("dnn_face"):
+                faces = self.face_net.detect(frame, self._net_scale())
+            return self._with_eyes(frame, faces)
+        with self._stage("grayscale"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        with self._stage("cascade_face"):
+            if not self.fast:
+                faces = self._detect_faces(gray, self.min_face_size)
+            else:
+                faces = self._detect_faces_fast(gray)
+        with self._stage("cascade_eye"):
+            return [(face, self._detect_eyes(gray, face)) for face in faces]
+
+    def detect_batch(self, frames):
+        """detect() для списка кадров; DNN-детекторы с пакетным выводом обрабатывают их одним блобом"""
+        if self.face_net is None or not self.face_net.batched:
+            return [self.detect(frame) for frame in frames]
+        with self._stage("dnn_face"):
+            results = self.face_net.detect_batch(frames, self._net_scale())
+        return [self._with_eyes(frame, faces) for frame, faces in zip(frames, results)]
+
+    def _net_scale(self):
+        return self.downscale if self.fast else 1.0
+
+    def _with_eyes(self, frame, faces):
+        """Дополняет результат DNN-детектора рамками глаз, если сеть их не дала"""
+        if all(eyes is not None for _, eyes in faces):
+            return faces
+        with self._stage("grayscale"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        with self._stage("cascade_eye"):
+            return [(face, eyes if eyes is not None else self._detect_eyes(gray, face)) for face, eyes in faces]
+
+    def _detect_faces(self, gray, min_size, max_size=None):
+        kwargs = dict(scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=min_size)
+        if max_size is not None:
+            kwargs["maxSize"] = max_size
+        return [tuple(int(v) for v in face) for face in self.face_cascade.detectMultiScale(gray, **kwargs)]
+
+    def _detect_faces_fast(self, gray):
+        need_scan = (not self.prev_faces) or self.frames_since_scan >= self.full_scan_every
+        faces = None
+        if not need_scan:
+            faces = self._search_near_previous(gray)
+            # Если хотя бы одно лицо потеряно — на этом же кадре делаем полный проход
+            if len(faces) < len(self.prev_faces):
+                faces = None
+        if faces is None:
+            faces = self._full_scan(gray)
+            self.frames_since_scan = 0
+        else:
+            self.frames_since_scan += 1
+        self.prev_faces = faces
+        return faces
+
+    def _full_scan(self, gray):
+        """Полный проход по уменьшенному кадру"""
+        scale = self.downscale
+        if scale >= 1.0:
+            return self._detect_faces(gray, self.min_face_size)
+        h, w = gray.shape[:2]
+        small = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        min_size = (max(1, int(self.min_face_size[0] * scale)), max(1, int(self.min_face_size[1] * scale)))
+        return [
+            (int(x / scale), int(y / scale), int(fw / scale), int(fh / scale))
+            for (x, y, fw, fh) in self._detect_faces(small, min_size)
+        ]
+
+    def _search_near_previous(self, gray):
+        """Ищет лица только в окрестности прежних рамок с ограничением размера"""
+        img_h, img_w = gray.shape[:2]
+        faces = []
+        for (x, y, w, h) in self.prev_faces:
+            mx, my = int(w * self.search_margin), int(h * self.search_margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(img_w, x + w + mx), min(img_h, y + h + my)
+            lo, hi = 1.0 - self.size_tolerance, 1.0 + self.size_tolerance
+            min_size = (max(self.min_face_size[0], int(w * lo)), max(self.min_face_size[1], int(h * lo)))
+            max_size = (int(w * hi), int(h * hi))
+            found = self._detect_faces(gray[y0:y1, x0:x1], min_size, max_size)
+            if not found:
+                continue
+            # Из нескольких кандидатов берём ближайший по размеру к прежнему
+            fx, fy, fw, fh = min(found, key=lambda f: abs(f[2] - w))
+            face = (fx + x0, fy + y0, fw, fh)
+            # Соседние области поиска могут найти одно и то же лицо
+            if all(box_iou(face, other) < 0.5 for other in faces):
+                faces.append(face)
+        return faces
+
+    def _detect_eyes(self, gray, face):
+        x, y, w, h = face
+        # В быстром режиме глаза ищутся только в верхней половине лица
+        roi_h = h // 2 if self.fast else h
+        roi_gray = gray[y:y + roi_h, x:x + w]
+        if roi_gray.size == 0:
+            return []
+        eyes = self.eye_cascade.detectMultiScale(roi_gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                 minSize=self.min_eye_size)
+        return [(int(ex) + x, int(ey) + y, int(ew), int(eh)) for (ex, ey, ew, eh) in eyes]
+
+
+def draw_detections(frame, detections):
+    """Рисует рамки лиц (синие) и глаз (зелёные) на кадре"""
+    for (x, y, w, h), eyes in detections:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+        for (ex, ey, ew, eh) in eyes:
+            cv2.rectangle(frame, (ex, ey), (ex + ew, ey + eh), (0, 255, 0), 2)
+    return frame
@@ -0,0 +1,440 @@
+"""Сервис поиска лиц и глаз для нескольких видеопотоков без интерфейса.
+
+Примеры:
+    python face_service.py --stream door=0 --stream hall=rtsp://192.168.0.10:554/stream
+    python face_service.py --stream a=rec1.mp4 --stream b=rec2.mp4 --pacing fast --workers 4 --budget a=100
+
+API (по умолчанию http://127.0.0.1:8765):
+    GET /streams            — состояние потоков: частота, задержка, пропуски
+    GET /streams/<имя>      — последний результат потока
+    GET /metrics            — метрики в формате Prometheus
+    WebSocket /ws           — результаты детекции в JSON по мере готовности
+                              (/ws?stream=<имя> — только одного потока)
+
+Один цикл asyncio обслуживает все источники и клиентов API. Детекция идёт
+в общем пуле потоков: у каждого потока пула свой детектор (каскады OpenCV
+нельзя использовать из нескольких потоков сразу), а состояние слежения
+быстрого режима хранится у видеопотока и передаётся детектору вместе с кадром.
+Результаты — в том же формате, что у face_cli.py, плюс задержка от захвата.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from face_backends import BACKENDS, DEFAULT_BACKEND
+from face_cli import make_record
+from face_detection import FaceEyeDetector
+from service_http import WebSocket, read_request, send_json, send_response
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.frame_source import FrameSource, add_source_options, source_options
+from lab_common.metrics import Instrumentation, Metrics, add_metrics_args
+
+DEFAULT_PORT = 8765
+# Бюджет задержки от захвата кадра до готового результата, мс
+DEFAULT_BUDGET_MS = 200.0
+# Сколько ждать кадр от источника за один вызов read(), с
+READ_TIMEOUT = 0.5
+# Неотправленных сообщений на клиента WebSocket; при переполнении старые отбрасываются
+CLIENT_QUEUE = 32
+# Замеров задержки потока для перцентилей
+LATENCY_WINDOW = 200
+
+
+class Stream:
+    """Видеопоток сервиса: источник, последний непрочитанный кадр, состояние слежения и статистика"""
+
+    def __init__(self, name, source, budget):
+        self.name = name
+        self.source = source
+        self.budget = budget  # с
+        self.lossless = source.lossless
+
+        self.frame = None
+        self.frame_time = 0.0  # время захвата последнего кадра (perf_counter)
+        self.frame_seq = 0
+        self.taken_seq = 0
+        self.taken = asyncio.Event()  # кадр взят в обработку (для файлов без пропусков)
+        self.ready_since = None  # с какого момента поток ждёт свободного обработчика
+        self.busy = False
+        self.state = None  # состояние слежения детектора (FaceEyeDetector.save_state)
+        self.ended = False
+
+        self.result = None
+        self.processed = 0
+        self.dropped = 0  # кадры, вытесненные более новыми до обработки
+        self.late = 0  # результаты, не уложившиеся в бюджет
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.perf_counter()
+
+    @property
+    def ready(self):
+        return not self.busy and self.frame_seq > self.taken_seq
+
+    def deadline(self):
+        """Срок для планировщика: ожидание считается с первого необработанного кадра,
+        поэтому поток с большим бюджетом не вытесняется навсегда потоками с малым"""
+        return self.ready_since + self.budget
+
+    def summary(self):
+        ms = np.array(self.latencies) * 1000.0
+        p50, p90, p99 = np.percentile(ms, (50, 90, 99)) if len(ms) else (0.0, 0.0, 0.0)
+        elapsed = time.perf_counter() - self.started
+        return {
+            "name": self.name,
+            "source": self.source.describe(),
+            "budget_ms": round(self.budget * 1000.0, 1),
+            "captured": self.frame_seq,
+            "processed": self.processed,
+            "dropped": self.dropped + self.source.dropped,
+            "late": self.late,
+            "fps": round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": {"p50": round(float(p50), 2), "p90": round(float(p90), 2), "p99": round(float(p99), 2)},
+            "ended": self.ended,
+        }
+
+
+class FaceService:
+    """Захват N источников, справедливое распределение кадров по общему пулу детекторов, рассылка результатов.
+
+    Из каждого потока в обработке не больше одного кадра (так сохраняется
+    порядок кадров для слежения). Свободный обработчик получает самый свежий
+    кадр потока с самым ранним сроком: момент, с которого поток ждёт,
+    плюс его бюджет задержки. Кадры, пришедшие, пока поток ждёт, вытесняют
+    прежний (для файлов в режиме --pacing fast захват ждёт, и кадры не теряются).
+    """
+
+    def __init__(self, streams, detector_factory, workers=1, metrics=None):
+        self.streams = {s.name: s for s in streams}
+        self.detector_factory = detector_factory
+        self.workers = max(1, workers)
+        self.free = self.workers
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.local = threading.local()
+        self.clients = set()
+        self.tasks = set()  # кадры в обработке
+        self.wakeup = None
+        self.stopped = None
+
+    # --- Детекция (потоки пула) ---
+
+    def _detect_frame(self, frame, state):
+        detector = getattr(self.local, "detector", None)
+        if detector is None:
+            detector = self.local.detector = self.detector_factory()
+        detector.load_state(state)
+        start = time.perf_counter()
+        detections = detector.detect(frame)
+        return detections, detector.save_state(), time.perf_counter() - start
+
+    # --- Цикл asyncio ---
+
+    async def _capture(self, stream):
+        loop = asyncio.get_running_loop()
+        while not self.stopped.is_set():
+            ok, frame = await loop.run_in_executor(self.readers, stream.source.read, READ_TIMEOUT)
+            if not ok:
+                if stream.source.ended:
+                    stream.ended = True
+                    self.metrics.count("ended", labels={"stream": stream.name})
+                    return
+                continue
+            if stream.lossless and stream.frame_seq > stream.taken_seq:
+                stream.taken.clear()
+                await stream.taken.wait()
+            if stream.frame_seq > stream.taken_seq:
+                stream.dropped += 1
+                self.metrics.count("dropped", labels={"stream": stream.name})
+            stream.frame = frame
+            stream.frame_time = time.perf_counter()
+            stream.frame_seq += 1
+            if stream.ready_since is None:
+                stream.ready_since = stream.frame_time
+            self.metrics.count("captured", labels={"stream": stream.name})
+            self.wakeup.set()
+
+    async def _schedule(self):
+        while not self.stopped.is_set():
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.free:
+                ready = [s for s in self.streams.values() if s.ready]
+                if not ready:
+                    break
+                self._dispatch(min(ready, key=Stream.deadline))
+
+    def _dispatch(self, stream):
+        seq, frame, captured = stream.frame_seq, stream.frame, stream.frame_time
+        stream.taken_seq = seq
+        stream.ready_since = None
+        stream.frame = None
+        stream.busy = True
+        stream.taken.set()
+        self.free -= 1
+        task = asyncio.create_task(self._process(stream, seq, frame, captured))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _process(self, stream, seq, frame, captured):
+        loop = asyncio.get_running_loop()
+        try:
+            detections, stream.state, elapsed = await loop.run_in_executor(
+                self.pool, self._detect_frame, frame, stream.state)
+        except cv2.error as e:
+            print(f"{stream.name}: ошибка при обработке кадра: {e}", file=sys.stderr)
+            self.metrics.count("errors", labels={"stream": stream.name})
+        else:
+            latency = time.perf_counter() - captured
+            stream.processed += 1
+            stream.latencies.append(latency)
+            if latency > stream.budget:
+                stream.late += 1
+                self.metrics.count("late", labels={"stream": stream.name})
+            self.metrics.record(f"detect:{stream.name}", elapsed)
+            self.metrics.record(f"latency:{stream.name}", latency)
+            record = make_record(stream.name, seq, detections, elapsed)
+            record["latency_ms"] = round(latency * 1000.0, 3)
+            stream.result = record
+            self._broadcast(record)
+        finally:
+            stream.busy = False
+            self.free += 1
+            self.wakeup.set()
+
+    def _broadcast(self, record):
+        for client in list(self.clients):
+            wanted, queue = client[1], client[2]
+            if wanted and wanted != record["source"]:
+                continue
+            if queue.full():
+                # Медленный клиент получает свежие результаты, а не очередь устаревших
+                queue.get_nowait()
+                self.metrics.count("client_dropped")
+            queue.put_nowait(record)
+
+    # --- API ---
+
+    async def _handle_client(self, reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is None:
+                return
+            if request.method != "GET":
+                await send_json(writer, {"error": "поддерживается только GET"}, 405)
+            elif request.path == "/ws" and request.is_websocket:
+                await self._serve_websocket(request, reader, writer)
+                return
+            elif request.path == "/streams":
+                await send_json(writer, [s.summary() for s in self.streams.values()])
+            elif request.path.startswith("/streams/"):
+                stream = self.streams.get(request.path[len("/streams/"):])
+                if stream is None:
+                    await send_json(writer, {"error": "нет такого потока"}, 404)
+                else:
+                    await send_json(writer, {**stream.summary(), "result": stream.result})
+            elif request.path == "/metrics":
+                await send_response(writer, 200, self.metrics.to_prometheus("face"),
+                                    "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                await send_json(writer, {"error": "не найдено"}, 404)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_websocket(self, request, reader, writer):
+        wanted = request.query.get("stream")
+        if wanted and wanted not in self.streams:
+            await send_json(writer, {"error": "нет такого потока"}, 404)
+            writer.close()
+            return
+        ws = await WebSocket.accept(request, reader, writer)
+        client = (ws, wanted, asyncio.Queue(CLIENT_QUEUE))
+        self.clients.add(client)
+        self.metrics.set("clients", len(self.clients))
+        receiver = asyncio.create_task(ws.receive_loop())
+        try:
+            while not ws.closed:
+                get = asyncio.create_task(client[2].get())
+                done, _ = await asyncio.wait({get, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if get not in done:
+                    get.cancel()
+                    break
+                await ws.send_json(get.result())
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            self.metrics.set("clients", len(self.clients))
+            receiver.cancel()
+            await ws.close()
+
+    async def run(self, host="127.0.0.1", port=DEFAULT_PORT, on_ready=None):
+        """Работает до stop() (или пока все источники-файлы не закончатся и не будут обработаны)"""
+        self.wakeup = asyncio.Event()
+        self.stopped = asyncio.Event()
+        # Чтение источников не занимает потоки детекции: у каждого источника свой поток ожидания
+        self.readers = ThreadPoolExecutor(len(self.streams), thread_name_prefix="face-read")
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="face-detect")
+        server = await asyncio.start_server(self._handle_client, host, port)
+        self.address = "http://{}:{}".format(*server.sockets[0].getsockname()[:2])
+        captures = [asyncio.create_task(self._capture(s)) for s in self.streams.values()]
+        scheduler = asyncio.create_task(self._schedule())
+        if on_ready is not None:
+            on_ready(self)
+        try:
+            await self.stopped.wait()
+        finally:
+            server.close()
+            for client in list(self.clients):
+                await client[0].close()
+            for task in captures + [scheduler]:
+                task.cancel()
+            await asyncio.gather(*captures, scheduler, *self.tasks, return_exceptions=True)
+            for stream in self.streams.values():
+                stream.source.release()
+            self.readers.shutdown(wait=True)
+            self.pool.shutdown(wait=True)
+            await server.wait_closed()
+
+    def finished(self):
+        """Все источники закончились и их кадры обработаны (камеры и URL не заканчиваются)"""
+        return all(s.ended and not s.ready and not s.busy for s in self.streams.values())
+
+    def stop(self):
+        self.stopped.set()
+
+
+def parse_stream(value):
+    name, sep, spec = value.partition("=")
+    if not sep or not name or not spec:
+        raise argparse.ArgumentTypeError("ожидается ИМЯ=ИСТОЧНИК, например door=0 или hall=rtsp://...")
+    return name, spec
+
+
+def parse_budgets(values, names):
+    """--budget MS (для всех потоков) или ИМЯ=MS; возвращает {имя: секунды}"""
+    budgets = dict.fromkeys(names, DEFAULT_BUDGET_MS / 1000.0)
+    for value in values or []:
+        name, sep, ms = value.rpartition("=")
+        targets = [name] if sep else names
+        if sep and name not in budgets:
+            raise ValueError(f"бюджет для неизвестного потока {name}")
+        for target in targets:
+            budgets[target] = float(ms) / 1000.0
+    return budgets
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Сервис поиска лиц и глаз для нескольких видеопотоков")
+    parser.add_argument("--stream", action="append", type=parse_stream, required=True, metavar="ИМЯ=ИСТОЧНИК",
+                        help="видеопоток: номер камеры, видеофайл, маска изображений или URL (можно повторять)")
+    parser.add_argument("--budget", action="append", metavar="[ИМЯ=]МС",
+                        help=f"бюджет задержки потока, мс (по умолчанию {DEFAULT_BUDGET_MS:g}; можно повторять)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="потоков детекции")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND, help="детектор лиц")
+    parser.add_argument("--model-dir", help="каталог с файлами DNN-моделей (по умолчанию 1_lab/models)")
+    parser.add_argument("--fast", action="store_true", help="быстрый режим детектора (см. FaceEyeDetector)")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес API")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="порт API (0 — любой свободный)")
+    add_source_options(parser)
+    add_metrics_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [name for name, _ in args.stream]
+    if len(set(names)) != len(names):
+        print("Имена потоков должны быть разными", file=sys.stderr)
+        return 1
+    try:
+        budgets = parse_budgets(args.budget, names)
+    except ValueError as e:
+        print(f"Неверный --budget: {e}", file=sys.stderr)
+        return 1
+
+    metrics = Metrics()
+
+    def create_detector():
+        return FaceEyeDetector(backend=args.backend, model_dir=args.model_dir, fast=args.fast, metrics=metrics)
+
+    # Проверяем детектор до запуска: ошибки в потоках пула видны только при первом кадре
+    try:
+        detector = create_detector()
+    except (OSError, RuntimeError, cv2.error) as e:
+        print(f"Не удалось загрузить детектор {args.backend}: {e}", file=sys.stderr)
+        return 1
+    if detector.empty():
+        print("Не удалось загрузить каскады Haar. Проверьте установку OpenCV.", file=sys.stderr)
+        return 1
+
+    # Параллельность даёт пул потоков: внутренние потоки OpenCV в каждом из них только мешают
+    if args.workers > 1:
+        cv2.setNumThreads(1)
+
+    streams = []
+    for name, spec in args.stream:
+        source = FrameSource(spec, **source_options(args))
+        if not source.isOpened():
+            print(f"Не удалось открыть источник {name}: {spec}", file=sys.stderr)
+            source.release()
+            for stream in streams:
+                stream.source.release()
+            return 1
+        streams.append((name, source))
+
+    instrumentation = Instrumentation.from_args(metrics, args, prefix="face")
+    instrumentation.start()
+
+    async def serve():
+        service = FaceService([Stream(name, source, budgets[name]) for name, source in streams], create_detector,
+                              workers=args.workers, metrics=metrics)
+        loop = asyncio.get_running_loop()
+
+        def on_ready(service):
+            print(f"Сервис: {service.address} (потоков видео: {len(streams)}, детекторов: {service.workers})",
+                  file=sys.stderr)
+            try:
+                loop.add_signal_handler(signal.SIGTERM, service.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: остаётся Ctrl+C
+
+        async def watch_files():
+            # Если все источники — файлы, сервис завершается, когда они обработаны
+            while not service.finished():
+                await asyncio.sleep(0.2)
+            service.stop()
+
+        watcher = asyncio.create_task(watch_files())
+        try:
+            await service.run(args.host, args.port, on_ready)
+        finally:
+            watcher.cancel()
+        for stream in service.streams.values():
+            s = stream.summary()
+            print(f"{s['name']}: кадров {s['processed']}/{s['captured']}, {s['fps']:.1f} к/с, "
+                  f"задержка p50 {s['latency_ms']['p50']:.1f} мс, p99 {s['latency_ms']['p99']:.1f} мс, "
+                  f"вне бюджета {s['late']}, пропущено {s['dropped']}", file=sys.stderr)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\nПрервано", file=sys.stderr)
+    finally:
+        instrumentation.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
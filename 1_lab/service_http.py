@@ -0,0 +1,158 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Константа из RFC 6455 для ответа на рукопожатие WebSocket
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Предельный размер входящего сообщения WebSocket (клиенту сервиса писать почти нечего)
+WS_MAX_MESSAGE = 64 * 1024
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+STATUS_TEXT = {200: "OK", 101: "Switching Protocols", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class HttpRequest:
+    """Разобранный запрос: метод, путь, параметры строки запроса, заголовки (имена в нижнем регистре)"""
+
+    def __init__(self, method, target, headers):
+        url = urlsplit(target)
+        self.method = method
+        self.path = unquote(url.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.headers = headers
+
+    @property
+    def is_websocket(self):
+        return (self.headers.get("upgrade", "").lower() == "websocket"
+                and "sec-websocket-key" in self.headers)
+
+
+async def read_request(reader):
+    """Читает строку запроса и заголовки; None, если соединение закрыто или запрос некорректен"""
+    try:
+        line = await reader.readline()
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        return None
+    return HttpRequest(parts[0], parts[1], headers)
+
+
+async def send_response(writer, status, body, content_type="application/json; charset=utf-8"):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            "Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def send_json(writer, obj, status=200):
+    await send_response(writer, status, json.dumps(obj, ensure_ascii=False))
+
+
+class WebSocket:
+    """Серверная сторона WebSocket (RFC 6455): текстовые сообщения, ping/pong и закрытие.
+
+    Сервис только рассылает сообщения; входящие текстовые сообщения складываются
+    в очередь messages, управляющие кадры обрабатываются в receive_loop().
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+        self.messages = asyncio.Queue()
+        self.send_lock = asyncio.Lock()
+
+    @classmethod
+    async def accept(cls, request, reader, writer):
+        key = request.headers["sec-websocket-key"]
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write((f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        return cls(reader, writer)
+
+    async def _send_frame(self, opcode, payload):
+        n = len(payload)
+        if n < 126:
+            head = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 1 << 16:
+            head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else:
+            head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        async with self.send_lock:
+            self.writer.write(head + payload)
+            await self.writer.drain()
+
+    async def send_text(self, text):
+        if self.closed:
+            raise ConnectionError("WebSocket закрыт")
+        try:
+            await self._send_frame(OP_TEXT, text.encode("utf-8"))
+        except (ConnectionError, RuntimeError):
+            self.closed = True
+            raise ConnectionError("WebSocket закрыт")
+
+    async def send_json(self, obj):
+        await self.send_text(json.dumps(obj, ensure_ascii=False))
+
+    async def _read_frame(self):
+        b1, b2 = await self.reader.readexactly(2)
+        opcode, masked, n = b1 & 0x0F, b2 & 0x80, b2 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+        if n > WS_MAX_MESSAGE:
+            raise ValueError("слишком длинное сообщение WebSocket")
+        mask = await self.reader.readexactly(4) if masked else None
+        payload = await self.reader.readexactly(n)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return b1 & 0x80, opcode, payload
+
+    async def receive_loop(self):
+        """Читает кадры клиента до закрытия соединения"""
+        parts = []
+        try:
+            while not self.closed:
+                fin, opcode, payload = await self._read_frame()
+                if opcode == OP_CLOSE:
+                    await self._send_frame(OP_CLOSE, payload[:2])
+                    break
+                if opcode == OP_PING:
+                    await self._send_frame(OP_PONG, payload)
+                elif opcode in (OP_TEXT, OP_BINARY, OP_CONT):
+                    parts.append(payload)
+                    if fin:
+                        await self.messages.put(b"".join(parts).decode("utf-8", "replace"))
+                        parts = []
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.closed = True
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                await self._send_frame(OP_CLOSE, struct.pack("!H", 1000))
+            except (ConnectionError, RuntimeError):
+                pass
+        self.writer.close()
@@ -0,0 +1,136 @@
+import re
+import threading
+from collections import namedtuple
+
+# Рабочая точка: масштаб сцены, предел ключевых точек сцены (None — как у образца), детекция на каждом stride-м кадре
+OperatingPoint = namedtuple("OperatingPoint", "scale nfeatures stride")
+
+# Ступени от лучшего качества к самому дешёвому: сначала меньше точек, затем меньше кадр, в последнюю очередь пропуск кадров
+LEVELS = (
+    OperatingPoint(1.0, None, 1),
+    OperatingPoint(1.0, 1500, 1),
+    OperatingPoint(0.75, 1500, 1),
+    OperatingPoint(0.75, 1000, 1),
+    OperatingPoint(0.5, 1000, 1),
+    OperatingPoint(0.5, 500, 1),
+    OperatingPoint(0.5, 500, 2),
+    OperatingPoint(0.35, 500, 2),
+    OperatingPoint(0.35, 500, 3),
+)
+
+FPS, LATENCY = "fps", "latency"
+# Варианты цели в интерфейсе (можно ввести и своё значение: «25 к/с», «80 мс»)
+TARGET_CHOICES = ("выкл", "10 к/с", "15 к/с", "20 к/с", "30 к/с", "50 мс", "100 мс", "200 мс")
+
+
+def parse_target(text):
+    """(FPS, к/с) или (LATENCY, секунды) из строки вида «20 к/с», «20fps», «50 мс», «50ms»; None — без цели"""
+    text = (text or "").strip().lower()
+    if text in ("", "выкл", "off", "none"):
+        return None
+    m = re.fullmatch(r"(\d+(?:[.,]\d+)?)\s*(к/с|кадр/с|fps|мс|ms)", text)
+    if m is None:
+        raise ValueError(f"цель задаётся как «20 к/с» или «50 мс», получено: {text}")
+    value = float(m.group(1).replace(",", "."))
+    if value <= 0:
+        raise ValueError("цель должна быть положительной")
+    if m.group(2) in ("мс", "ms"):
+        return LATENCY, value / 1000.0
+    return FPS, value
+
+
+class AdaptiveController:
+    """Подбирает рабочую точку (масштаб сцены, nfeatures, шаг детекции) под бюджет времени кадра.
+
+    Цель FPS: бюджет — 1/fps на показанный кадр, сравнивается среднее время
+    обработки с учётом пропущенных кадров и параллельных обработчиков
+    (время детекции / stride / parallel).
+    Цель LATENCY: бюджет — задержка одного обработанного кадра; пропуск кадров
+    её не уменьшает, поэтому ступени со stride > 1 не используются.
+
+    Время сглаживается экспоненциально (alpha). Гистерезис: ступень
+    понижается, когда сглаженное время выше бюджета, и повышается, только
+    когда оно ниже low * бюджет; после смены ступени не меньше dwell замеров
+    ничего не меняется (при превышении бюджета больше чем в overload раз
+    ступень понижается уже через dwell / 5 замеров — медленные кадры
+    не должны долго копиться). Если повышение почти сразу пришлось откатить,
+    следующая попытка повышения откладывается вдвое дольше (до max_backoff раз).
+    """
+
+    def __init__(self, kind, value, levels=LEVELS, alpha=0.2, low=0.6, dwell=15, overload=2.0, max_backoff=8):
+        self.kind = kind
+        self.value = value
+        self.budget = 1.0 / value if kind == FPS else value
+        self.levels = [p for p in levels if kind == FPS or p.stride == 1]
+        self.alpha = alpha
+        self.low = low
+        self.dwell = dwell
+        self.overload = overload
+        self.max_backoff = max_backoff
+
+        self.lock = threading.Lock()
+        self.level = 0
+        self.cost = None  # сглаженное время на кадр, с
+        self.samples = 0  # замеров с последней смены ступени
+        self.backoff = 1
+        self.upgraded = False  # последняя смена была повышением
+        self.frame_counter = 0
+        self.changes = 0
+
+    @classmethod
+    def from_text(cls, text, **kwargs):
+        target = parse_target(text)
+        return None if target is None else cls(*target, **kwargs)
+
+    @property
+    def point(self):
+        return self.levels[self.level]
+
+    def take_frame(self):
+        """True, если этот кадр нужно обработать; иначе показывается прежний результат"""
+        with self.lock:
+            take = self.frame_counter % self.point.stride == 0
+            self.frame_counter += 1
+            return take
+
+    def update(self, seconds, parallel=1):
+        """Время обработки одного кадра (parallel — сколько кадров обрабатывается одновременно);
+        возвращает True, если рабочая точка сменилась"""
+        with self.lock:
+            cost = seconds / (self.point.stride * max(1, parallel)) if self.kind == FPS else seconds
+            self.cost = cost if self.cost is None else self.cost + self.alpha * (cost - self.cost)
+            self.samples += 1
+            overloaded = self.cost > self.overload * self.budget
+            if self.samples < (max(2, self.dwell // 5) if overloaded else self.dwell):
+                return False
+            if self.cost > self.budget and self.level < len(self.levels) - 1:
+                if self.upgraded and self.samples < 2 * self.dwell * self.backoff:
+                    # Повышение не удержалось — в следующий раз ждать дольше
+                    self.backoff = min(self.backoff * 2, self.max_backoff)
+                self._move(+1)
+                return True
+            if self.cost < self.low * self.budget and self.level > 0 and self.samples >= self.dwell * self.backoff:
+                self._move(-1)
+                return True
+            if self.samples >= 4 * self.dwell * self.backoff:
+                # Долгая стабильная работа — прежние неудачи забываются
+                self.backoff = 1
+            return False
+
+    def _move(self, step):
+        old = self.point
+        self.level += step
+        self.upgraded = step < 0
+        self.samples = 0
+        self.changes += 1
+        # Пересчёт оценки на новую ступень: пропорционально числу обрабатываемых кадров
+        if self.kind == FPS and self.cost is not None:
+            self.cost *= old.stride / self.point.stride
+
+    def describe(self):
+        p = self.point
+        target = f"{self.value:g} к/с" if self.kind == FPS else f"{self.value * 1000:g} мс"
+        nfeatures = f", точек {p.nfeatures}" if p.nfeatures else ""
+        stride = f", каждый {p.stride}-й кадр" if p.stride > 1 else ""
+        cost = f", {self.cost * 1000:.0f} мс/кадр" if self.cost is not None else ""
+        return f"Цель {target}: масштаб {p.scale:g}{nfeatures}{stride} ({self.level + 1}/{len(self.levels)}{cost})"
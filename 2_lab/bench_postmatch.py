@@ -0,0 +1,101 @@
+"""Микробенчмарк этапа после сопоставления: фильтрация соответствий и отрисовка.
+
+Сравнивает прежнюю реализацию (цикл по cv2.DMatch, списки координат,
+cv2.circle/cv2.line на каждую точку) с векторной (маска по массивам
+knnSearch, выборка координат по индексам, пакетная отрисовка).
+
+    python bench_postmatch.py --sizes 1000,10000 --repeat 20
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from object_matching import MatchResult, draw_match, ratio_test
+
+
+def make_data(n, rng, width=1280, height=720):
+    """Синтетические соответствия: n дескрипторов сцены, по два соседа в образце"""
+    n_obj = max(2, n // 2)
+    obj_pts = rng.uniform(0, 400, (n_obj, 2)).astype(np.float32)
+    scene_pts = rng.uniform(0, [width, height], (n, 2)).astype(np.float32)
+    indices = rng.integers(0, n_obj, (n, 2)).astype(np.int32)
+    dists = np.sort(rng.uniform(0, 1, (n, 2)).astype(np.float32), axis=1)
+
+    keypoints_obj = [cv2.KeyPoint(float(x), float(y), 4.0) for x, y in obj_pts]
+    keypoints_scene = [cv2.KeyPoint(float(x), float(y), 4.0) for x, y in scene_pts]
+    matches = [
+        (cv2.DMatch(q, int(indices[q, 0]), float(dists[q, 0])), cv2.DMatch(q, int(indices[q, 1]), float(dists[q, 1])))
+        for q in range(n)
+    ]
+    return keypoints_obj, keypoints_scene, matches, obj_pts, indices, dists
+
+
+def filter_loop(keypoints_obj, keypoints_scene, matches, ratio=0.75):
+    """Прежний вариант: цикл по парам DMatch и списки координат"""
+    good_matches = []
+    for pair in matches:
+        if len(pair) < 2:
+            continue
+        m, n = pair
+        if m.distance < ratio * n.distance:
+            good_matches.append(m)
+    src_pts = np.float32([keypoints_obj[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+    dst_pts = np.float32([keypoints_scene[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+    return src_pts, dst_pts
+
+
+def filter_vectorized(obj_pts, keypoints_scene, indices, dists, ratio=0.75):
+    """Новый вариант: маска по массивам и выборка по индексам"""
+    query_idx, train_idx = ratio_test(indices, dists, ratio)
+    src_pts = obj_pts[train_idx].reshape(-1, 1, 2)
+    dst_pts = cv2.KeyPoint_convert(keypoints_scene)[query_idx].reshape(-1, 1, 2)
+    return src_pts, dst_pts
+
+
+def draw_loop(img, dst, pts):
+    """Прежний вариант: круг и линия на каждую точку, центр пересчитывается в цикле"""
+    for x_scene, y_scene in pts:
+        cv2.circle(img, (int(x_scene), int(y_scene)), 4, (255, 0, 0), -1)
+        center_x = int((dst[0][0][0] + dst[2][0][0]) / 2)
+        center_y = int((dst[0][0][1] + dst[2][0][1]) / 2)
+        cv2.line(img, (int(x_scene), int(y_scene)), (center_x, center_y), (0, 0, 255), 1)
+
+
+def timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк фильтрации соответствий и отрисовки")
+    parser.add_argument("--sizes", default="1000,10000", help="число соответствий через запятую")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    canvas = np.zeros((720, 1280, 3), np.uint8)
+    corners = np.float32([[300, 200], [300, 500], [700, 500], [700, 200]]).reshape(-1, 1, 2)
+
+    print(f"{'соответствий':>12} {'этап':<10} {'до, мс':>9} {'после, мс':>10} {'ускорение':>10}")
+    for n in (int(v) for v in args.sizes.split(",")):
+        keypoints_obj, keypoints_scene, matches, obj_pts, indices, dists = make_data(n, rng)
+        _, dst_pts = filter_vectorized(obj_pts, keypoints_scene, indices, dists)
+        result = MatchResult(np.eye(3), corners, dst_pts.reshape(-1, 2))
+
+        before = timeit(lambda: filter_loop(keypoints_obj, keypoints_scene, matches), args.repeat)
+        after = timeit(lambda: filter_vectorized(obj_pts, keypoints_scene, indices, dists), args.repeat)
+        print(f"{n:>12} {'фильтр':<10} {before:>9.3f} {after:>10.3f} {before / after:>9.1f}x")
+
+        before = timeit(lambda: draw_loop(canvas.copy(), corners, result.inlier_pts), args.repeat)
+        after = timeit(lambda: draw_match(canvas.copy(), result), args.repeat)
+        print(f"{n:>12} {'отрисовка':<10} {before:>9.3f} {after:>10.3f} {before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
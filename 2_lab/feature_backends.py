@@ -0,0 +1,100 @@
+import cv2
+
+# Алгоритмы индексов FLANN
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+# Тип расстояния для cv2.flann_Index (cvflann::FLANN_DIST_HAMMING)
+FLANN_DIST_HAMMING = 9
+
+KDTREE_INDEX_PARAMS = dict(algorithm=FLANN_INDEX_KDTREE, trees=4)
+LSH_INDEX_PARAMS = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+FLANN_SEARCH_PARAMS = dict(checks=64)
+
+
+class FeatureBackend:
+    """Связка «детектор + матчер» для одного типа признаков.
+
+    Вещественные дескрипторы (SIFT) сопоставляются по L2 через KD-дерево FLANN,
+    бинарные (ORB, AKAZE, BRISK) — по расстоянию Хэмминга через LSH-индекс.
+    """
+
+    def __init__(self, name, factory, default_params, binary):
+        self.name = name
+        self.factory = factory
+        self.default_params = dict(default_params)
+        self.binary = binary
+
+    @property
+    def available(self):
+        # В некоторых сборках OpenCV часть детекторов отсутствует
+        return getattr(cv2, self.factory, None) is not None
+
+    @property
+    def index_params(self):
+        return LSH_INDEX_PARAMS if self.binary else KDTREE_INDEX_PARAMS
+
+    def params(self, params=None):
+        """Параметры детектора: значения по умолчанию, дополненные переданными"""
+        merged = dict(self.default_params)
+        if params:
+            merged.update((k, v) for k, v in params.items() if k in merged)
+        return merged
+
+    def create_detector(self, params=None):
+        factory = getattr(cv2, self.factory, None)
+        if factory is None:
+            raise RuntimeError(f"Детектор {self.name} недоступен в этой сборке OpenCV")
+        return factory(**self.params(params))
+
+    def create_index(self, descriptors):
+        """Индекс FLANN по матрице дескрипторов"""
+        if self.binary:
+            return cv2.flann_Index(descriptors, self.index_params, FLANN_DIST_HAMMING)
+        return cv2.flann_Index(descriptors, self.index_params)
+
+    def ratio_threshold(self, ratio):
+        """Порог теста Лоу для расстояний из flann_Index.knnSearch.
+
+        KD-дерево возвращает квадраты L2-расстояний, LSH — расстояния Хэмминга.
+        """
+        return ratio if self.binary else ratio ** 2
+
+
+BACKENDS = {
+    "SIFT": FeatureBackend("SIFT", "SIFT_create", {
+        "nfeatures": 0,
+        "nOctaveLayers": 3,
+        "contrastThreshold": 0.04,
+        "edgeThreshold": 10,
+        "sigma": 1.6,
+    }, binary=False),
+    "ORB": FeatureBackend("ORB", "ORB_create", {
+        "nfeatures": 2000,
+        "scaleFactor": 1.2,
+        "nlevels": 8,
+        "fastThreshold": 20,
+    }, binary=True),
+    "AKAZE": FeatureBackend("AKAZE", "AKAZE_create", {
+        "threshold": 0.001,
+        "nOctaves": 4,
+        "nOctaveLayers": 4,
+    }, binary=True),
+    "BRISK": FeatureBackend("BRISK", "BRISK_create", {
+        "thresh": 30,
+        "octaves": 3,
+        "patternScale": 1.0,
+    }, binary=True),
+}
+
+DEFAULT_BACKEND = "SIFT"
+
+
+def get_backend(name):
+    try:
+        return BACKENDS[name.upper()]
+    except KeyError:
+        raise ValueError(f"Неизвестный тип признаков: {name}. Доступны: {', '.join(BACKENDS)}") from None
+
+
+def available_backends():
+    return [name for name, backend in BACKENDS.items() if backend.available]
@@ -2,25 +2,76 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import cv2
 from PIL import Image, ImageTk
-import numpy as np
+import argparse
 import os
+import sys
 import time
 
+from feature_backends import DEFAULT_BACKEND, available_backends
+from object_matching import TemplateCache, draw_match, match_scaled, match_template, match_template_pyramid
+from template_library import TemplateLibrary
+from pipeline import FramePipeline
+from tracking import ObjectTracker
+from adaptive import FPS, TARGET_CHOICES, AdaptiveController, parse_target
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.frame_source import CAMERA, FrameSource, add_source_args, source_kind, source_options
+from lab_common.metrics import Instrumentation, Metrics, add_metrics_args
+from lab_common.presenter import FramePresenter, fit_size
+from lab_common.stats_panel import StatsPanel
+
+# Каталог, в котором сохраняются предвычисленные модели образцов
+TEMPLATE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".template_cache")
+
+# Масштабы уменьшенной сцены для грубого поиска и запас области уточнения
+PYRAMID_SCALES = ("0.25", "0.5", "0.75")
+PYRAMID_ROI_MARGIN = 0.2
+
+# Полная детекция в режиме слежения запускается не реже, чем раз в столько кадров
+TRACKING_REDETECT_EVERY = 30
+
+# Число потоков-обработчиков в конвейерном режиме
+PIPELINE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# Период опроса камеры без конвейера, если цель по частоте кадров не задана, мс
+WEBCAM_INTERVAL_MS = 30
+
 class ImageMatchingApp:
-    def __init__(self, root):
+    def __init__(self, root, metrics=None, source="0", source_kwargs=None, target=None):
         self.root = root
-        self.root.title("Поиск образа в реальном времени (SIFT)")
+        self.root.title(f"Поиск образа в реальном времени ({DEFAULT_BACKEND})")
         self.root.geometry("1200x800")
 
+        # Время этапов поиска (detect, match, homography, track, draw, render) и счётчики кадров
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # Источник видео: номер камеры, видеофайл, маска изображений или URL (см. lab_common.frame_source)
+        self.source = source
+        self.source_kwargs = source_kwargs or {}
+
+        # Адаптивное качество под цель «N к/с» или «N мс» (None — всегда полное качество)
+        self.controller = AdaptiveController.from_text(target) if target else None
+        self.last_matches = []  # (результат, подпись) последнего обработанного кадра — для пропущенных кадров
+
         # Переменные
         self.cap = None
         self.is_running = False
         self.is_processing = False
+        self.pipeline = None
+        self.tracker = None
         self.scene_image = None
         self.object_image = None
+        self.object_model = None
+        self.template_library = None
+        self.library_dir = ""
+        self.backend = DEFAULT_BACKEND
         self.scene_path = ""
         self.object_path = ""
 
+        # Кэш моделей образцов (ключевые точки/дескрипторы считаются один раз)
+        self.template_cache = TemplateCache(TEMPLATE_CACHE_DIR)
+
         # Создание интерфейса
         self.create_widgets()
 
@@ -39,7 +90,8 @@ class ImageMatchingApp:
 
         self.source_var = tk.StringVar(value="webcam")
 
-        webcam_radio = ttk.Radiobutton(control_frame, text="Включить веб-камеру", variable=self.source_var, value="webcam", command=self.toggle_source)
+        webcam_text = "Включить веб-камеру" if source_kind(self.source) == CAMERA else f"Видеопоток: {self.source}"
+        webcam_radio = ttk.Radiobutton(control_frame, text=webcam_text, variable=self.source_var, value="webcam", command=self.toggle_source)
         webcam_radio.pack(anchor=tk.W)
 
         image_radio = ttk.Radiobutton(control_frame, text="Загрузить изображение", variable=self.source_var, value="image", command=self.toggle_source)
@@ -65,6 +117,25 @@ class ImageMatchingApp:
         self.object_path_label = ttk.Label(control_frame, text="", wraplength=200)
         self.object_path_label.pack(anchor=tk.W, fill=tk.X, pady=(0, 5))
 
+        # Выбор каталога образцов (поиск нескольких объектов сразу)
+        library_label = ttk.Label(control_frame, text="Или каталог образцов:")
+        library_label.pack(anchor=tk.W, pady=(10, 5))
+
+        self.library_button = ttk.Button(control_frame, text="Выбрать каталог", command=self.load_template_library)
+        self.library_button.pack(anchor=tk.W, fill=tk.X)
+
+        self.library_path_label = ttk.Label(control_frame, text="", wraplength=200)
+        self.library_path_label.pack(anchor=tk.W, fill=tk.X, pady=(0, 5))
+
+        # Тип признаков (детектор + матчер); переключается без остановки камеры
+        backend_label = ttk.Label(control_frame, text="Тип признаков:")
+        backend_label.pack(anchor=tk.W, pady=(15, 5))
+
+        self.backend_var = tk.StringVar(value=DEFAULT_BACKEND)
+        backend_box = ttk.Combobox(control_frame, textvariable=self.backend_var, values=available_backends(), state="readonly")
+        backend_box.pack(anchor=tk.W, fill=tk.X)
+        backend_box.bind("<<ComboboxSelected>>", self.change_backend)
+
         # Чекбоксы
         self.show_markers_var = tk.BooleanVar(value=True)
         show_markers_check = ttk.Checkbutton(control_frame, text="Отобразить маркеры", variable=self.show_markers_var)
@@ -72,16 +143,68 @@ class ImageMatchingApp:
 
         self.connect_markers_var = tk.BooleanVar(value=True)
         connect_markers_check = ttk.Checkbutton(control_frame, text="Соединить подобные маркеры", variable=self.connect_markers_var)
-        connect_markers_check.pack(anchor=tk.W, pady=(0, 15))
+        connect_markers_check.pack(anchor=tk.W, pady=(0, 5))
+
+        # Копии флагов в обычных атрибутах: переменные Tk нельзя читать из потоков обработки
+        self.show_markers = self.show_markers_var.get()
+        self.connect_markers = self.connect_markers_var.get()
+        self.show_markers_var.trace_add("write", self.sync_draw_options)
+        self.connect_markers_var.trace_add("write", self.sync_draw_options)
+
+        # Грубый поиск на уменьшенном кадре с уточнением в области объекта
+        self.pyramid_var = tk.BooleanVar(value=False)
+        pyramid_check = ttk.Checkbutton(control_frame, text="Грубый поиск на уменьшенном кадре", variable=self.pyramid_var)
+        pyramid_check.pack(anchor=tk.W, pady=(0, 5))
+
+        pyramid_frame = ttk.Frame(control_frame)
+        pyramid_frame.pack(anchor=tk.W, fill=tk.X, pady=(0, 5))
+        ttk.Label(pyramid_frame, text="Масштаб:").pack(side=tk.LEFT)
+        self.pyramid_scale_var = tk.StringVar(value="0.5")
+        pyramid_scale_box = ttk.Combobox(pyramid_frame, textvariable=self.pyramid_scale_var, values=PYRAMID_SCALES, width=6, state="readonly")
+        pyramid_scale_box.pack(side=tk.LEFT, padx=5)
+
+        self.use_pyramid = self.pyramid_var.get()
+        self.pyramid_scale = float(self.pyramid_scale_var.get())
+        self.pyramid_var.trace_add("write", self.sync_draw_options)
+        self.pyramid_scale_var.trace_add("write", self.sync_draw_options)
+
+        # Слежение оптическим потоком между полными детекциями
+        self.tracking_var = tk.BooleanVar(value=True)
+        tracking_check = ttk.Checkbutton(control_frame, text="Слежение между детекциями", variable=self.tracking_var)
+        tracking_check.pack(anchor=tk.W, pady=(0, 5))
+
+        self.pipeline_var = tk.BooleanVar(value=True)
+        pipeline_check = ttk.Checkbutton(control_frame, text="Конвейерная обработка (потоки)", variable=self.pipeline_var)
+        pipeline_check.pack(anchor=tk.W, pady=(0, 5))
+
+        # Цель скорости: качество (масштаб сцены, число точек, шаг детекции) подстраивается под неё
+        ttk.Label(control_frame, text="Целевая скорость:").pack(anchor=tk.W, pady=(5, 0))
+        self.target_var = tk.StringVar(value=self.target_text())
+        target_box = ttk.Combobox(control_frame, textvariable=self.target_var, values=TARGET_CHOICES)
+        target_box.pack(anchor=tk.W, fill=tk.X, pady=(0, 5))
+        target_box.bind("<<ComboboxSelected>>", self.change_target)
+        target_box.bind("<Return>", self.change_target)
+
+        self.stats_var = tk.BooleanVar(value=False)
+        stats_check = ttk.Checkbutton(control_frame, text="Статистика этапов", variable=self.stats_var,
+                                      command=lambda: self.stats_panel.toggle(self.stats_var.get()))
+        stats_check.pack(anchor=tk.W, pady=(0, 15))
 
         # Кнопка "Загрузка видео"
         self.start_button = ttk.Button(control_frame, text="Загрузка видео", command=self.start_matching)
         self.start_button.pack(fill=tk.X, pady=10)
 
         # Статусная строка
-        self.status_label = ttk.Label(control_frame, text="Процессорное время = 0.000000", anchor=tk.W)
+        self.status_label = ttk.Label(control_frame, text="Процессорное время = 0.000000", anchor=tk.W, wraplength=230)
         self.status_label.pack(fill=tk.X, side=tk.BOTTOM, pady=(10, 0))
 
+        # Статистика конвейера: частота захвата, обработки и пропущенные кадры
+        self.pipeline_label = ttk.Label(control_frame, text="", anchor=tk.W, wraplength=230)
+        self.pipeline_label.pack(fill=tk.X, side=tk.BOTTOM)
+
+        # Перцентили времени этапов (показывается флажком «Статистика этапов»)
+        self.stats_panel = StatsPanel(control_frame, self.metrics, fill=tk.X, side=tk.BOTTOM)
+
         # Основной фрейм для отображения видео/изображения
         self.display_frame = ttk.Frame(self.root)
         self.display_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -99,12 +222,8 @@ class ImageMatchingApp:
 
         self.canvas.configure(yscrollcommand=self.v_scrollbar.set, xscrollcommand=self.h_scrollbar.set)
 
-        # Frame внутри Canvas для изображения
-        self.image_frame = ttk.Frame(self.canvas)
-        self.canvas.create_window((0, 0), window=self.image_frame, anchor=tk.NW)
-
-        # Обновление прокрутки при изменении размера
-        self.image_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        # Одна картинка на Canvas, обновляется на месте (без пересоздания виджетов на каждом кадре)
+        self.presenter = FramePresenter(self.canvas)
 
         # Фрейм для мини-изображения (объект) — фиксируем внизу
         mini_frame = ttk.Frame(self.display_frame, height=150)
@@ -119,6 +238,12 @@ class ImageMatchingApp:
     def on_window_resize(self, event):
         pass
 
+    def sync_draw_options(self, *args):
+        self.show_markers = self.show_markers_var.get()
+        self.connect_markers = self.connect_markers_var.get()
+        self.use_pyramid = self.pyramid_var.get()
+        self.pyramid_scale = float(self.pyramid_scale_var.get())
+
     def toggle_source(self):
         if self.source_var.get() == "webcam":
             self.scene_button.config(state=tk.DISABLED)
@@ -127,6 +252,27 @@ class ImageMatchingApp:
         else:
             self.scene_button.config(state=tk.NORMAL)
 
+    def target_text(self):
+        controller = self.controller
+        if controller is None:
+            return TARGET_CHOICES[0]
+        return f"{controller.value:g} к/с" if controller.kind == FPS else f"{controller.value * 1000:g} мс"
+
+    def change_target(self, event=None):
+        """Новая цель скорости; рабочая точка подбирается заново с полного качества"""
+        try:
+            self.controller = AdaptiveController.from_text(self.target_var.get())
+        except ValueError as e:
+            messagebox.showerror("Ошибка", str(e))
+            self.target_var.set(self.target_text())
+            return
+        self.last_matches = []
+
+    def operating_point(self):
+        """Рабочая точка адаптивного контроллера для видео; для отдельного изображения — None (полное качество)"""
+        controller = self.controller
+        return controller.point if controller is not None and self.is_running else None
+
     def load_scene_image(self):
         file_path = filedialog.askopenfilename(title="Выберите изображение сцены", filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff")])
         if file_path:
@@ -150,10 +296,65 @@ class ImageMatchingApp:
                 messagebox.showerror("Ошибка", "Не удалось загрузить изображение объекта.")
                 self.object_path = ""
                 self.object_image = None
+                self.object_model = None
             else:
+                self.object_model = self.template_cache.get(self.object_image, backend=self.backend)
                 self.object_path_label.config(text=os.path.basename(file_path))
+                if self.tracker is not None:
+                    self.tracker = self.create_tracker()
+                # Одиночный образец заменяет ранее загруженную библиотеку
+                self.template_library = None
+                self.library_path_label.config(text="")
                 self.display_mini_object(self.object_image)
 
+    def load_template_library(self):
+        dir_path = filedialog.askdirectory(title="Выберите каталог с изображениями образцов")
+        if not dir_path:
+            return
+        library = self.build_library(dir_path)
+        if library is None:
+            return
+        count = len(library)
+        self.template_library = library
+        self.library_dir = dir_path
+        self.library_path_label.config(text=f"{os.path.basename(dir_path)} ({count} шт.)")
+        # Библиотека заменяет одиночный образец
+        self.object_path = ""
+        self.object_image = None
+        self.object_model = None
+        self.object_path_label.config(text="")
+        self.mini_label.config(image="", text=f"Образцов в библиотеке: {count}")
+        self.mini_label.image = None
+
+    def build_library(self, dir_path):
+        library = TemplateLibrary(self.template_cache, backend=self.backend)
+        try:
+            count = library.load_directory(dir_path)
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось прочитать каталог:\n{e}")
+            return None
+        if count == 0:
+            messagebox.showerror("Ошибка", "В каталоге не найдено подходящих изображений образцов.")
+            return None
+        library.build()
+        return library
+
+    def change_backend(self, event=None):
+        """Переключает тип признаков на лету: модели образцов перестраиваются, камера не останавливается"""
+        backend = self.backend_var.get()
+        if backend == self.backend:
+            return
+        self.backend = backend
+        self.root.title(f"Поиск образа в реальном времени ({backend})")
+        if self.object_image is not None:
+            self.object_model = self.template_cache.get(self.object_image, backend=backend)
+        if self.template_library is not None:
+            library = self.build_library(self.library_dir)
+            if library is not None:
+                self.template_library = library
+        if self.tracker is not None:
+            self.tracker = self.create_tracker()
+
     def display_mini_object(self, img):
         if img is None:
             return
@@ -173,78 +374,89 @@ class ImageMatchingApp:
         if img is None:
             return
 
-        # Конвертируем в RGB
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img_rgb)
-
         # Масштабируем, чтобы вписаться в экран (не больше оригинала)
         screen_width = self.root.winfo_screenwidth()
         screen_height = self.root.winfo_screenheight()
         max_width = screen_width - 300  # Учитываем левую панель
         max_height = screen_height - 250  # Учитываем статус, миниатюру и рамки
 
-        w, h = pil_img.size
-        scale = min(max_width / w, max_height / h, 1.0)
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-
-        resized_pil = pil_img.resize((new_w, new_h), Image.LANCZOS)
-        photo = ImageTk.PhotoImage(image=resized_pil)
-
-        # Удаляем предыдущее изображение
-        for widget in self.image_frame.winfo_children():
-            widget.destroy()
+        h, w = img.shape[:2]
+        size = fit_size(w, h, max_width, max_height)
 
-        # Создаем Label с изображением
-        label = tk.Label(self.image_frame, image=photo, bg="black")
-        label.image = photo  # Сохраняем ссылку
-        label.pack()
+        # Для видео с камеры — быстрая интерполяция, для статичной сцены — LANCZOS
+        old_size = self.presenter.size
+        with self.metrics.stage("render"):
+            new_w, new_h = self.presenter.show(img, size, live=self.is_running)
 
-        # Обновляем область прокрутки
-        self.canvas.update_idletasks()
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        # Обновляем область прокрутки только при смене размера
+        if (new_w, new_h) != old_size:
+            self.canvas.configure(scrollregion=(0, 0, new_w, new_h))
 
     def start_matching(self):
-        if self.object_image is None:
-            messagebox.showwarning("Предупреждение", "Пожалуйста, выберите изображение объекта.")
+        if self.object_model is None and self.template_library is None:
+            messagebox.showwarning("Предупреждение", "Пожалуйста, выберите изображение объекта или каталог образцов.")
             return
 
         if self.source_var.get() == "webcam":
             if not self.is_running:
-                self.cap = cv2.VideoCapture(0)
+                self.cap = FrameSource(self.source, **self.source_kwargs)
                 if not self.cap.isOpened():
-                    messagebox.showerror("Ошибка", "Не удалось открыть веб-камеру. Проверьте подключение и разрешения.")
+                    self.cap.release()
+                    self.cap = None
+                    messagebox.showerror("Ошибка", f"Не удалось открыть источник видео: {self.source}. "
+                                                   "Проверьте подключение и разрешения.")
                     return
                 self.is_running = True
                 self.start_button.config(text="Остановить")
-                self.update_webcam()
+                # Слежение — только для одиночного образца; кадры ему нужны строго по порядку
+                if self.tracking_var.get() and self.template_library is None:
+                    self.tracker = self.create_tracker()
+                if self.pipeline_var.get():
+                    workers = 1 if self.tracker is not None else PIPELINE_WORKERS
+                    self.pipeline = FramePipeline(self.cap, self.match_current, workers=workers,
+                                                  drop_frames=not self.cap.lossless)
+                    self.pipeline.start()
+                    self.poll_pipeline()
+                else:
+                    self.update_webcam()
             else:
                 self.stop_matching()
         else:
             if self.scene_image is None:
                 messagebox.showwarning("Предупреждение", "Пожалуйста, выберите изображение сцены.")
                 return
-            result_img = self.match_objects_sift(self.scene_image, self.object_image)
+            result_img = self.match_current(self.scene_image)
             self.display_image(result_img)
             self.update_status_time()
 
     def stop_matching(self):
+        # Сначала останавливаем потоки конвейера, затем освобождаем камеру
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+            self.pipeline_label.config(text="")
         if self.is_running and self.cap:
             self.cap.release()
             self.cap = None
         self.is_running = False
+        self.tracker = None
         self.start_button.config(text="Загрузка видео")
         self.is_processing = False
 
     def update_webcam(self):
         if self.is_running:
-            ret, frame = self.cap.read()
+            tick_start = time.perf_counter()
+            # Короткий таймаут: цикл Tk не ждёт кадра из зависшего сетевого потока
+            ret, frame = self.cap.read(timeout=0.01)
+            if not ret and self.cap.ended:
+                self.finish_source()
+                return
             if ret:
                 if not self.is_processing:
                     self.is_processing = True
                     start_time = time.perf_counter()
                     try:
-                        result_img = self.match_objects_sift(frame, self.object_image)
+                        result_img = self.match_current(frame)
                         end_time = time.perf_counter()
                         elapsed_time = end_time - start_time
                         self.update_status_time(elapsed_time)
@@ -253,92 +465,142 @@ class ImageMatchingApp:
                         print(f"Ошибка при обработке кадра: {e}")
                     finally:
                         self.is_processing = False
-            # Повторный вызов через 30 мс
-            self.root.after(30, self.update_webcam)
-
-    def match_objects_sift(self, scene_img, object_img):
-        """Выполняет поиск объекта на сцене с помощью SIFT"""
-        # Преобразуем в серое изображение для обработки
-        gray_scene = cv2.cvtColor(scene_img, cv2.COLOR_BGR2GRAY)
-        gray_object = cv2.cvtColor(object_img, cv2.COLOR_BGR2GRAY)
-
-        # Инициализация детектора SIFT
-        sift = cv2.SIFT_create()
-
-        # Находим ключевые точки и дескрипторы для обоих изображений
-        keypoints_obj, descriptors_obj = sift.detectAndCompute(gray_object, None)
-        keypoints_scene, descriptors_scene = sift.detectAndCompute(gray_scene, None)
-
-        if descriptors_obj is None or descriptors_scene is None:
-            # Не удалось найти ключевые точки
-            return scene_img.copy()
-
-        # Используем Brute Force Matcher с L2 расстоянием (для SIFT)
-        bf = cv2.BFMatcher(cv2.NORM_L2, crossCheck=False)
-
-        # Находим соответствия
-        matches = bf.knnMatch(descriptors_obj, descriptors_scene, k=2)
-
-        # Применяем отношение Лоу (Lowes ratio test) для фильтрации хороших соответствий
-        good_matches = []
-        for m, n in matches:
-            if m.distance < 0.75 * n.distance:  # Порог можно настроить
-                good_matches.append(m)
-
-        # Если нашли достаточно соответствий, рисуем их
-        result_img = scene_img.copy()
-        if len(good_matches) > 10:  # Минимальное количество хороших соответствий
-            # Получаем координаты ключевых точек
-            src_pts = np.float32([keypoints_obj[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-            dst_pts = np.float32([keypoints_scene[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-
-            # Находим гомографию (перспективное преобразование) между объектом и сценой
-            M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-            matchesMask = mask.ravel().tolist()
-
-            if M is not None:
-                # Получаем размеры объекта
-                h, w = gray_object.shape
-
-                # Находим углы объекта в сцене
-                pts = np.float32([[0, 0], [0, h-1], [w-1, h-1], [w-1, 0]]).reshape(-1, 1, 2)
-                dst = cv2.perspectiveTransform(pts, M)
-
-                # Рисуем прямоугольник вокруг объекта
-                cv2.polylines(result_img, [np.int32(dst)], True, (0, 255, 0), 3, cv2.LINE_AA)
-
-                # Рисуем маркеры и линии, если нужно
-                if self.show_markers_var.get():
-                    for i, match in enumerate(good_matches):
-                        if matchesMask[i]:
-                            # Координаты точки на сцене
-                            x_scene, y_scene = keypoints_scene[match.trainIdx].pt
-
-                            # Рисуем круг в точке на сцене
-                            cv2.circle(result_img, (int(x_scene), int(y_scene)), 4, (255, 0, 0), -1)
-
-                            # Соединяем линией, если нужно
-                            if self.connect_markers_var.get():
-                                # Цвет линии
-                                color = (0, 0, 255)  # Красный
-                                # Рисуем линию от точки на сцене к центру найденного прямоугольника
-                                center_x = int((dst[0][0][0] + dst[2][0][0]) / 2)
-                                center_y = int((dst[0][0][1] + dst[2][0][1]) / 2)
-                                cv2.line(result_img, (int(x_scene), int(y_scene)), (center_x, center_y), color, 1)
+            self.root.after(self.next_frame_delay(time.perf_counter() - tick_start), self.update_webcam)
+
+    def next_frame_delay(self, elapsed):
+        """Пауза до следующего кадра: с целью по частоте — остаток периода кадра, иначе постоянный период"""
+        controller = self.controller
+        if controller is None or controller.kind != FPS:
+            return WEBCAM_INTERVAL_MS
+        return max(1, int(1000.0 / controller.value - elapsed * 1000.0))
+
+    def poll_pipeline(self):
+        """Забирает из конвейера последний готовый кадр и выводит его (поток Tk)"""
+        if self.is_running and self.pipeline is not None:
+            result = self.pipeline.latest_result()
+            if result is not None:
+                result_img, elapsed_time = result
+                self.update_status_time(elapsed_time)
+                self.display_image(result_img)
+            elif self.pipeline.finished():
+                self.finish_source()
+                return
+            stats = self.pipeline.stats()
+            self.metrics.set("capture_fps", round(stats["capture_fps"], 2))
+            self.metrics.set("dropped", stats["dropped"])
+            self.pipeline_label.config(
+                text=f"{self.cap.describe()}\nЗахват: {stats['capture_fps']:.1f} к/с | "
+                     f"Обработка: {stats['processed_fps']:.1f} к/с | Пропущено: {stats['dropped']}"
+            )
+            self.root.after(15, self.poll_pipeline)
+
+    def finish_source(self):
+        """Видеофайл или последовательность изображений закончились: останавливаем, последний кадр остаётся на экране"""
+        self.stop_matching()
+        self.status_label.config(text=f"{self.status_label.cget('text')} | Источник закончился")
+
+    def match_current(self, scene_img):
+        """Ищет на сцене текущий образец или все образцы библиотеки.
+
+        Для видео с заданной целью скорости часть кадров пропускается
+        (на них рисуется прежний результат), а время обработки передаётся контроллеру.
+        """
+        controller = self.controller if self.is_running else None
+        if controller is not None and not controller.take_frame():
+            self.metrics.count("skipped")
+            return self.draw_last_matches(scene_img)
+        self.metrics.count("frames")
+        start = time.perf_counter()
+        with self.metrics.stage("process"):
+            if self.template_library is not None:
+                result_img = self.match_objects_library(scene_img, self.template_library)
+            else:
+                result_img = self.match_objects_sift(scene_img, self.object_model)
+        if controller is not None:
+            pipeline = self.pipeline
+            controller.update(time.perf_counter() - start, pipeline.workers if pipeline is not None else 1)
+            self.metrics.set("adaptive_level", controller.level + 1)
+        return result_img
 
+    def draw_last_matches(self, scene_img):
+        with self.metrics.stage("draw"):
+            result_img = scene_img.copy()
+            for result, label in self.last_matches:
+                draw_match(result_img, result, self.show_markers, self.connect_markers, label=label)
         return result_img
 
+    def match_objects_library(self, scene_img, library):
+        """Выполняет поиск всех образцов библиотеки на сцене (общий FLANN-индекс)"""
+        point = self.operating_point()
+        scale, nfeatures = (point.scale, point.nfeatures) if point is not None else (1.0, None)
+        with self.metrics.stage("library_match"):
+            detections = match_scaled(scene_img, scale, lambda img: library.match(img, nfeatures))
+        self.last_matches = [(det, f"{det.name} ({det.inliers})") for det in detections]
+        return self.draw_last_matches(scene_img)
+
+    def create_tracker(self):
+        return ObjectTracker(lambda frame: self.find_object(frame, self.object_model), self.object_model.shape,
+                             redetect_every=TRACKING_REDETECT_EVERY)
+
+    def find_object(self, scene_img, object_model):
+        """Полная детекция образца (с грубым поиском на уменьшенном кадре, если он включён).
+
+        Сцена уменьшается и число её ключевых точек ограничивается по рабочей точке контроллера.
+        """
+        point = self.operating_point()
+        scale, nfeatures = (point.scale, point.nfeatures) if point is not None else (1.0, None)
+        if self.use_pyramid:
+            return match_scaled(scene_img, scale, lambda img: match_template_pyramid(
+                img, object_model, scales=(self.pyramid_scale,), roi_margin=PYRAMID_ROI_MARGIN, nfeatures=nfeatures))
+        return match_scaled(scene_img, scale, lambda img: match_template(img, object_model, nfeatures=nfeatures))
+
+    def match_objects_sift(self, scene_img, object_model):
+        """Выполняет поиск объекта на сцене (по умолчанию — с помощью SIFT).
+
+        Сам поиск вынесен в object_matching.match_template; ключевые точки,
+        дескрипторы, детектор и матчер образца берутся из предвычисленной модели.
+        В режиме веб-камеры между детекциями объект сопровождается трекером.
+        """
+        tracker = self.tracker
+        if tracker is not None:
+            result = tracker.process(scene_img)
+        else:
+            result = self.find_object(scene_img, object_model)
+        # Этапы поиска уже замерены в match_template (или трекером); total — это «process»
+        self.metrics.record_timings({k: v for k, v in result.timings.items() if k != "total"})
+        self.metrics.count("tracked" if result.tracked else "detected")
+        self.last_matches = [(result, None)]
+        return self.draw_last_matches(scene_img)
+
     def update_status_time(self, elapsed_time=None):
         if elapsed_time is None:
             elapsed_time = 0.0
-        self.status_label.config(text=f"Процессорное время = {elapsed_time:.6f}")
+        text = f"Процессорное время = {elapsed_time:.6f}"
+        # Текущая рабочая точка адаптивного качества
+        controller = self.controller
+        if controller is not None and self.is_running:
+            text += "\n" + controller.describe()
+        self.status_label.config(text=text)
 
     def on_closing(self):
         self.stop_matching()
         self.root.destroy()
 
 if __name__ == "__main__":
+    parser = add_metrics_args(argparse.ArgumentParser(description="Поиск образа в реальном времени"))
+    parser.add_argument("--target", help="целевая скорость видео: «20 к/с» или «50 мс» (качество подстраивается)")
+    args = add_source_args(parser).parse_args()
+    try:
+        parse_target(args.target)
+    except ValueError as e:
+        parser.error(str(e))
+    metrics = Metrics()
+    instrumentation = Instrumentation.from_args(metrics, args, prefix="match")
+    instrumentation.start()
     root = tk.Tk()
-    app = ImageMatchingApp(root)
+    app = ImageMatchingApp(root, metrics, args.source, source_options(args), args.target)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
\ No newline at end of file
+    try:
+        root.mainloop()
+    finally:
+        instrumentation.stop()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""Пакетный поиск образца без интерфейса.
+
+Примеры:
+    python match_cli.py --template obj.png --images "scenes/*.jpg" --output result.jsonl
+    python match_cli.py --template obj.png --video clip.mp4 --workers 8 --annotate annotated.mp4
+
+Результаты выводятся в формате JSON Lines (одна строка на кадр/изображение):
+гомография, углы найденного объекта, число inlier-точек и время этапов.
+"""
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+
+from feature_backends import BACKENDS, DEFAULT_BACKEND
+from object_matching import TemplateModel, draw_match, match_template, match_template_pyramid
+from tracking import ObjectTracker
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.video_chunks import common_root, join_video_chunks, mirror_path, open_chunk_writer, video_chunks
+
+# Состояние процесса-обработчика: модель образца строится один раз на процесс
+_worker = {}
+
+
+def init_worker(template_path, scales=None, roi_margin=0.2, track_every=0, backend=DEFAULT_BACKEND):
+    # Внутри процессов пула OpenCV не должен порождать собственные потоки
+    cv2.setNumThreads(1)
+    img = cv2.imread(template_path)
+    _worker["model"] = TemplateModel.from_image(img, backend=backend)
+    _worker["scales"] = scales
+    _worker["roi_margin"] = roi_margin
+    _worker["track_every"] = track_every
+
+
+def match(scene):
+    if _worker["scales"]:
+        return match_template_pyramid(scene, _worker["model"], scales=_worker["scales"], roi_margin=_worker["roi_margin"])
+    return match_template(scene, _worker["model"])
+
+
+def process_image(args):
+    """Обрабатывает одно изображение; annotated_path — куда сохранить разметку (None — не сохранять)"""
+    path, annotated_path = args
+    start = time.perf_counter()
+    scene = cv2.imread(path)
+    if scene is None:
+        return {"source": path, "error": "не удалось прочитать изображение"}
+    result = match(scene)
+    record = {"source": path}
+    record.update(result.to_dict())
+
+    if annotated_path:
+        draw_match(scene, result)
+        os.makedirs(os.path.dirname(annotated_path), exist_ok=True)
+        cv2.imwrite(annotated_path, scene)
+    record["time_ms"]["wall"] = round((time.perf_counter() - start) * 1000.0, 3)
+    return record
+
+
+def process_video_chunk(args):
+    """Обрабатывает кадры [first, last) видео. Каждый процесс открывает файл сам"""
+    path, first, last, chunk_path = args
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    writer = None
+    records = []
+    # Слежение между детекциями внутри фрагмента (кадры фрагмента идут по порядку)
+    tracker = None
+    if _worker["track_every"]:
+        tracker = ObjectTracker(match, _worker["model"].shape, redetect_every=_worker["track_every"])
+    # last=None — число кадров неизвестно, читаем до конца
+    for frame_idx in range(first, last) if last is not None else itertools.count(first):
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        result = tracker.process(frame) if tracker is not None else match(frame)
+        record = {"source": path, "frame": frame_idx}
+        record.update(result.to_dict())
+        records.append(record)
+
+        if chunk_path:
+            if writer is None:
+                writer = open_chunk_writer(chunk_path, frame, cap.get(cv2.CAP_PROP_FPS))
+            writer.write(draw_match(frame, result))
+        record["time_ms"]["wall"] = round((time.perf_counter() - start) * 1000.0, 3)
+    cap.release()
+    if writer is not None:
+        writer.release()
+    return records
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный поиск образца на изображениях и видео")
+    parser.add_argument("--template", required=True, help="изображение-образец")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="шаблон пути к изображениям сцены, например \"scenes/*.jpg\"")
+    source.add_argument("--video", help="видеофайл")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=list(BACKENDS), help="тип признаков")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument("--chunk", type=int, default=100, help="кадров видео на одно задание")
+    parser.add_argument("--scales", type=lambda v: [float(x) for x in v.split(",")],
+                        help="грубый поиск на уменьшенной сцене, масштабы через запятую, например 0.25,0.5")
+    parser.add_argument("--roi-margin", type=float, default=0.2, help="запас области уточнения (доля размера объекта)")
+    parser.add_argument("--track", type=int, default=0, metavar="N",
+                        help="для видео: слежение оптическим потоком, полная детекция не реже раза в N кадров")
+    parser.add_argument("--output", help="файл JSON Lines (по умолчанию stdout)")
+    parser.add_argument("--annotate", help="каталог (для --images) или видеофайл (для --video) с разметкой")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if cv2.imread(args.template) is None:
+        print(f"Не удалось загрузить образец: {args.template}", file=sys.stderr)
+        return 1
+    if not BACKENDS[args.backend].available:
+        print(f"Детектор {args.backend} недоступен в этой сборке OpenCV", file=sys.stderr)
+        return 1
+
+    if args.images:
+        paths = sorted(glob.glob(args.images))
+        if not paths:
+            print(f"Нет файлов по шаблону: {args.images}", file=sys.stderr)
+            return 1
+        # Разметка повторяет пути относительно общего каталога, как поле source в записях
+        root = common_root(paths)
+        tasks = [(path, mirror_path(args.annotate, path, root) if args.annotate else None) for path in paths]
+    else:
+        try:
+            chunks = video_chunks(args.video, args.chunk, args.annotate)
+        except OSError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    count = 0
+    try:
+        with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.template, args.scales, args.roi_margin, args.track, args.backend)) as pool:
+            if args.images:
+                for record in pool.imap(process_image, tasks, chunksize=4):
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    count += 1
+            else:
+                for records in pool.imap(process_video_chunk, chunks):
+                    for record in records:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    count += len(records)
+                if args.annotate:
+                    join_video_chunks(chunks, args.annotate)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Обработано кадров: {count} за {elapsed:.2f} с ({count / elapsed if elapsed else 0:.1f} к/с)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from feature_backends import DEFAULT_BACKEND, FLANN_SEARCH_PARAMS, get_backend
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.hashing import image_hash
+
+
+def model_key(img, params, backend=DEFAULT_BACKEND):
+    """Ключ кэша: хэш изображения + тип признаков + параметры детектора"""
+    params_str = backend + ":" + ",".join(f"{k}={params[k]!r}" for k in sorted(params))
+    return image_hash(img) + "-" + hashlib.sha1(params_str.encode()).hexdigest()[:12]
+
+
+def keypoints_to_array(keypoints):
+    """Упаковывает cv2.KeyPoint в массив (N, 7) для сохранения на диск"""
+    return np.array(
+        [(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id) for kp in keypoints],
+        dtype=np.float32,
+    ).reshape(-1, 7)
+
+
+def array_to_keypoints(arr):
+    """Восстанавливает список cv2.KeyPoint из массива (N, 7)"""
+    return [
+        cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+        for x, y, size, angle, response, octave, class_id in arr
+    ]
+
+
+def limited_detector(local, backend, params, nfeatures):
+    """Детектор потока local с пределом nfeatures ключевых точек (создаётся один раз на поток и предел)"""
+    detectors = getattr(local, "limited_detectors", None)
+    if detectors is None:
+        detectors = local.limited_detectors = {}
+    detector = detectors.get(nfeatures)
+    if detector is None:
+        detector = detectors[nfeatures] = backend.create_detector({**params, "nfeatures": nfeatures})
+    return detector
+
+
+class TemplateModel:
+    """Предвычисленная модель образца: детектор, матчер, ключевые точки и дескрипторы.
+
+    Строится один раз при загрузке образца и переиспользуется на каждом кадре.
+    Тип признаков задаётся именем из feature_backends.BACKENDS.
+    """
+
+    def __init__(self, keypoints, descriptors, shape, params, key, backend=DEFAULT_BACKEND):
+        self.keypoints = keypoints
+        self.descriptors = descriptors
+        self.shape = shape  # (h, w) образца — нужен для углов рамки
+        self.backend = get_backend(backend)
+        self.params = self.backend.params(params)
+        self.key = key
+        # Координаты точек отдельным массивом, чтобы не обращаться к KeyPoint на каждом кадре
+        self.points = np.float32([kp.pt for kp in keypoints]).reshape(-1, 2)
+
+        # Детектор и матчер создаются по одному на поток: объекты OpenCV
+        # не гарантируют потокобезопасность при параллельной обработке кадров
+        self._local = threading.local()
+
+    @property
+    def detector(self):
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = self.backend.create_detector(self.params)
+        return detector
+
+    def scene_detector(self, nfeatures=None):
+        """Детектор для сцены; nfeatures ограничивает число её ключевых точек, если тип признаков это поддерживает"""
+        if nfeatures is None or "nfeatures" not in self.params:
+            return self.detector
+        return limited_detector(self._local, self.backend, self.params, nfeatures)
+
+    @property
+    def index(self):
+        """FLANN-индекс по дескрипторам образца (строится один раз на поток)"""
+        index = getattr(self._local, "index", None)
+        if index is None and self.descriptors is not None:
+            index = self._local.index = self.backend.create_index(self.descriptors)
+        return index
+
+    @classmethod
+    def from_image(cls, img, params=None, key=None, backend=DEFAULT_BACKEND):
+        params = get_backend(backend).params(params)
+        if key is None:
+            key = model_key(img, params, backend)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        detector = get_backend(backend).create_detector(params)
+        keypoints, descriptors = detector.detectAndCompute(gray, None)
+        return cls(keypoints, descriptors, gray.shape[:2], params, key, backend)
+
+    def save(self, path):
+        """Сохраняет модель в .npz (ключевые точки, дескрипторы, параметры)"""
+        descriptors = self.descriptors if self.descriptors is not None else np.empty((0, 0), np.uint8)
+        np.savez_compressed(
+            path,
+            keypoints=keypoints_to_array(self.keypoints),
+            descriptors=descriptors,
+            shape=np.array(self.shape, dtype=np.int32),
+            param_names=np.array(sorted(self.params)),
+            param_values=np.array([float(self.params[k]) for k in sorted(self.params)]),
+            key=np.array(self.key),
+            backend=np.array(self.backend.name),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Загружает модель, сохранённую методом save()"""
+        with np.load(path, allow_pickle=False) as data:
+            keypoints = array_to_keypoints(data["keypoints"])
+            descriptors = data["descriptors"]
+            shape = tuple(int(v) for v in data["shape"])
+            backend = str(data["backend"]) if "backend" in data else DEFAULT_BACKEND
+            defaults = get_backend(backend).default_params
+            params = {}
+            for name, value in zip(data["param_names"], data["param_values"]):
+                default = defaults.get(str(name), value)
+                params[str(name)] = type(default)(value)
+            key = str(data["key"])
+        if len(descriptors) == 0:
+            descriptors = None
+        return cls(keypoints, descriptors, shape, params, key, backend)
+
+
+class TemplateCache:
+    """Кэш моделей образцов по хэшу содержимого и параметрам детектора.
+
+    Если задан cache_dir, модели дополнительно сохраняются на диск и
+    подхватываются оттуда при следующем запуске.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.models = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get(self, img, params=None, backend=DEFAULT_BACKEND):
+        params = get_backend(backend).params(params)
+        key = model_key(img, params, backend)
+
+        model = self.models.get(key)
+        if model is not None:
+            self.hits += 1
+            return model
+
+        if self.cache_dir and os.path.exists(self._disk_path(key)):
+            try:
+                model = TemplateModel.load(self._disk_path(key))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Не удалось прочитать кэш образца {key}: {e}")
+                model = None
+
+        if model is None:
+            self.misses += 1
+            model = TemplateModel.from_image(img, params, key, backend)
+            if self.cache_dir:
+                try:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    model.save(self._disk_path(key))
+                except OSError as e:
+                    print(f"Не удалось сохранить кэш образца {key}: {e}")
+        else:
+            self.hits += 1
+
+        self.models[key] = model
+        return model
+
+    def clear(self):
+        self.models.clear()
+
+
+class MatchResult:
+    """Результат поиска образца на сцене"""
+
+    def __init__(self, homography=None, corners=None, inlier_pts=None, good_matches=0, keypoints=0, timings=None,
+                 inlier_obj_pts=None):
+        self.homography = homography
+        self.corners = corners  # (4, 1, 2) углы образца в координатах сцены
+        self.inlier_pts = inlier_pts if inlier_pts is not None else np.empty((0, 2), np.float32)
+        # Те же inlier-точки в координатах образца (нужны для слежения между детекциями)
+        self.inlier_obj_pts = inlier_obj_pts if inlier_obj_pts is not None else np.empty((0, 2), np.float32)
+        self.tracked = False  # True, если результат получен слежением, а не детекцией
+        self.good_matches = good_matches
+        self.keypoints = keypoints
+        self.timings = timings if timings is not None else {}
+
+    @property
+    def found(self):
+        return self.homography is not None
+
+    @property
+    def inliers(self):
+        return len(self.inlier_pts)
+
+    def to_dict(self):
+        """Представление для JSON (гомография, углы, число inlier-точек, время этапов в мс)"""
+        return {
+            "found": self.found,
+            "homography": self.homography.tolist() if self.found else None,
+            "corners": self.corners.reshape(-1, 2).round(2).tolist() if self.corners is not None else None,
+            "inliers": self.inliers,
+            "good_matches": self.good_matches,
+            "keypoints": self.keypoints,
+            "tracked": self.tracked,
+            "time_ms": {k: round(v * 1000.0, 3) for k, v in self.timings.items()},
+        }
+
+
+def object_corners(shape, M):
+    """Проецирует углы образца размера shape=(h, w) на сцену"""
+    h, w = shape
+    pts = np.float32([[0, 0], [0, h - 1], [w - 1, h - 1], [w - 1, 0]]).reshape(-1, 1, 2)
+    return cv2.perspectiveTransform(pts, M)
+
+
+def ratio_test(indices, dists, threshold):
+    """Тест Лоу над массивами результата knnSearch (k=2).
+
+    Возвращает номера прошедших дескрипторов запроса и номера их ближайших
+    соседей в индексе. Пары без второго соседа (LSH) отбрасываются.
+    """
+    good = (indices[:, 0] >= 0) & (indices[:, 1] >= 0) & (dists[:, 0] < threshold * dists[:, 1])
+    return np.flatnonzero(good), indices[good, 0]
+
+
+def match_template(scene_img, model, ratio=0.75, min_matches=10, ransac_thresh=5.0, nfeatures=None):
+    """Выполняет поиск образца (TemplateModel) на сцене.
+
+    Не зависит от интерфейса: используется и окном ImageMatchingApp,
+    и пакетным режимом match_cli.py. nfeatures — предел ключевых точек сцены
+    (по умолчанию — как у образца).
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    # Преобразуем в серое изображение для обработки
+    gray_scene = cv2.cvtColor(scene_img, cv2.COLOR_BGR2GRAY) if scene_img.ndim == 3 else scene_img
+    keypoints_scene, descriptors_scene = model.scene_detector(nfeatures).detectAndCompute(gray_scene, None)
+    t = time.perf_counter()
+    timings["detect"] = t - start
+
+    result = MatchResult(keypoints=len(keypoints_scene), timings=timings)
+    if model.descriptors is None or len(model.descriptors) < 2 or descriptors_scene is None:
+        # Не удалось найти ключевые точки
+        timings["total"] = time.perf_counter() - start
+        return result
+
+    # Для каждого дескриптора сцены ищем два ближайших в индексе образца;
+    # результат сразу в виде массивов индексов и расстояний
+    indices, dists = model.index.knnSearch(descriptors_scene, 2, params=FLANN_SEARCH_PARAMS)
+
+    # Применяем отношение Лоу (Lowes ratio test) маской по массивам
+    query_idx, train_idx = ratio_test(indices, dists, model.backend.ratio_threshold(ratio))
+    result.good_matches = len(query_idx)
+    t_match = time.perf_counter()
+    timings["match"] = t_match - t
+
+    if len(query_idx) > min_matches:
+        # Получаем координаты ключевых точек выборкой по индексам
+        src_pts = model.points[train_idx].reshape(-1, 1, 2)
+        dst_pts = cv2.KeyPoint_convert(keypoints_scene)[query_idx].reshape(-1, 1, 2)
+
+        # Находим гомографию (перспективное преобразование) между объектом и сценой
+        M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, ransac_thresh)
+        if M is not None:
+            result.homography = M
+            result.corners = object_corners(model.shape, M)
+            inlier_mask = mask.ravel().astype(bool)
+            result.inlier_pts = dst_pts.reshape(-1, 2)[inlier_mask]
+            result.inlier_obj_pts = src_pts.reshape(-1, 2)[inlier_mask]
+        timings["homography"] = time.perf_counter() - t_match
+
+    timings["total"] = time.perf_counter() - start
+    return result
+
+
+def disc_offsets(radius):
+    """Смещения пикселей закрашенного круга радиуса radius"""
+    r = np.arange(-radius, radius + 1)
+    dy, dx = np.meshgrid(r, r, indexing="ij")
+    inside = dx * dx + dy * dy <= radius * radius
+    return dy[inside], dx[inside]
+
+
+MARKER_RADIUS = 4
+_MARKER_DY, _MARKER_DX = disc_offsets(MARKER_RADIUS)
+
+
+def draw_markers(img, pts, color):
+    """Рисует закрашенные круги во всех точках pts (N, 2) одной операцией над массивом"""
+    if len(pts) == 0:
+        return
+    h, w = img.shape[:2]
+    centers = np.rint(pts).astype(np.int32)
+    ys = (centers[:, 1:2] + _MARKER_DY).ravel()
+    xs = (centers[:, 0:1] + _MARKER_DX).ravel()
+    inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+    img[ys[inside], xs[inside]] = color
+
+
+def draw_match(img, result, show_markers=True, connect_markers=True, label=None):
+    """Рисует на img (на месте) рамку найденного объекта, маркеры и линии к центру"""
+    if not result.found:
+        return img
+
+    dst = result.corners
+    # Рисуем прямоугольник вокруг объекта
+    cv2.polylines(img, [np.int32(dst)], True, (0, 255, 0), 3, cv2.LINE_AA)
+    if label:
+        x, y = np.int32(dst)[0][0]
+        cv2.putText(img, label, (int(x), max(int(y) - 8, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2, cv2.LINE_AA)
+
+    # Рисуем маркеры и линии, если нужно — сразу для всех точек
+    if show_markers and len(result.inlier_pts):
+        pts = np.int32(result.inlier_pts)
+        if connect_markers:
+            # Все отрезки «точка -> центр рамки» одним вызовом polylines
+            center = np.int32((dst[0][0] + dst[2][0]) / 2)
+            segments = np.empty((len(pts), 2, 2), np.int32)
+            segments[:, 0] = pts
+            segments[:, 1] = center
+            cv2.polylines(img, list(segments), False, (0, 0, 255), 1)
+        draw_markers(img, result.inlier_pts, (255, 0, 0))
+    return img
+
+
+def scale_homography(M, sx, sy=None, dx=0.0, dy=0.0):
+    """Переводит гомографию в другую систему координат сцены: x' = sx * x + dx"""
+    sy = sx if sy is None else sy
+    S = np.array([[sx, 0, dx], [0, sy, dy], [0, 0, 1]], dtype=np.float64)
+    return S @ M
+
+
+def scale_result(result, factor):
+    """Переводит рамку и точки результата (на месте) в систему координат сцены, увеличенной в factor раз"""
+    if result.found:
+        result.homography = scale_homography(result.homography, factor)
+        result.corners = result.corners * np.float32(factor)
+    result.inlier_pts = result.inlier_pts * np.float32(factor)
+    return result
+
+
+def match_scaled(scene_img, scale, match_fn):
+    """Вызывает match_fn на сцене, уменьшенной в scale раз; результат (или список результатов) — в координатах исходной сцены"""
+    if scale >= 1.0:
+        return match_fn(scene_img)
+    start = time.perf_counter()
+    h, w = scene_img.shape[:2]
+    small = cv2.resize(scene_img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    resize_time = time.perf_counter() - start
+    result = match_fn(small)
+    for r in result if isinstance(result, list) else [result]:
+        scale_result(r, 1.0 / scale)
+        r.timings["resize"] = resize_time
+        if "total" in r.timings:
+            r.timings["total"] += resize_time
+    return result
+
+
+def match_template_pyramid(scene_img, model, scales=(0.5,), roi_margin=0.2, **match_kwargs):
+    """Поиск «от грубого к точному».
+
+    Сначала образец ищется на уменьшенной сцене (масштабы scales перебираются
+    от меньшего к большему, пока объект не найден), затем гомография
+    переносится на полный размер, и признаки заново извлекаются только внутри
+    предсказанной области (рамка объекта, расширенная на roi_margin от её размера).
+    Грубый и уточнённый результаты принимаются, только если у них не меньше
+    min_matches inlier-точек RANSAC: гомография по 3–5 точкам указывает
+    куда угодно. Если уточнение не удалось, объект ищется по полному кадру.
+    """
+    start = time.perf_counter()
+    min_matches = match_kwargs.get("min_matches", 10)
+    img_h, img_w = scene_img.shape[:2]
+
+    coarse = None
+    coarse_scale = 1.0
+    for scale in sorted(scales):
+        if scale >= 1.0:
+            break
+        small = cv2.resize(scene_img, (max(1, int(img_w * scale)), max(1, int(img_h * scale))), interpolation=cv2.INTER_AREA)
+        result = match_template(small, model, **match_kwargs)
+        if result.found and result.inliers >= min_matches:
+            coarse, coarse_scale = result, scale
+            break
+    t_coarse = time.perf_counter()
+
+    if coarse is None:
+        # На уменьшенных сценах объект не найден — обычный поиск по полному кадру
+        result = match_template(scene_img, model, **match_kwargs)
+        result.timings["coarse"] = t_coarse - start
+        result.timings["total"] = time.perf_counter() - start
+        return result
+
+    # Переносим грубую гомографию на полный размер
+    M = scale_homography(coarse.homography, 1.0 / coarse_scale)
+    corners = object_corners(model.shape, M)
+
+    # Область интереса: рамка объекта с запасом, обрезанная по границам кадра
+    x, y, w, h = cv2.boundingRect(np.int32(corners))
+    mx, my = int(w * roi_margin), int(h * roi_margin)
+    x0, y0 = max(0, x - mx), max(0, y - my)
+    x1, y1 = min(img_w, x + w + mx), min(img_h, y + h + my)
+
+    refined = None
+    if x1 - x0 > 8 and y1 - y0 > 8:
+        refined = match_template(scene_img[y0:y1, x0:x1], model, **match_kwargs)
+
+    if refined is not None and refined.found and refined.inliers >= min_matches:
+        result = refined
+        result.homography = scale_homography(refined.homography, 1.0, dx=x0, dy=y0)
+        result.corners = refined.corners + np.float32([x0, y0])
+        result.inlier_pts = refined.inlier_pts + np.float32([x0, y0])
+    else:
+        # Грубая гомография не подтвердилась в своей области — поиск по полному кадру
+        result = match_template(scene_img, model, **match_kwargs)
+
+    result.timings["coarse"] = t_coarse - start
+    result.timings["refine"] = time.perf_counter() - t_coarse
+    result.timings["total"] = time.perf_counter() - start
+    return result
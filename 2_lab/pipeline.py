@@ -0,0 +1,220 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateMeter:
+    """Скользящая оценка частоты событий (событий в секунду) по временному окну"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.stamps = deque()
+        self.lock = threading.Lock()
+
+    def tick(self):
+        now = time.perf_counter()
+        with self.lock:
+            self.stamps.append(now)
+            self._trim(now)
+
+    def rate(self):
+        now = time.perf_counter()
+        with self.lock:
+            self._trim(now)
+            if len(self.stamps) < 2:
+                return 0.0
+            span = now - self.stamps[0]
+            return (len(self.stamps) - 1) / span if span > 0 else 0.0
+
+    def _trim(self, now):
+        while self.stamps and now - self.stamps[0] > self.window:
+            self.stamps.popleft()
+
+
+class LatestFrameBuffer:
+    """Одноместный буфер: хранит только последний кадр, старые кадры вытесняются"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.taken_seq = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame, wait=False):
+        """Кладёт кадр; при wait=True сначала ждёт, пока предыдущий кадр возьмут в обработку"""
+        with self.cond:
+            if wait:
+                self.cond.wait_for(lambda: self.closed or self.taken_seq >= self.seq)
+                if self.closed:
+                    return
+            if self.frame is not None and self.taken_seq < self.seq:
+                # Предыдущий кадр так и не был взят в обработку
+                self.dropped += 1
+            self.frame = frame
+            self.seq += 1
+            self.cond.notify_all()
+
+    def get_newer(self, timeout=0.1, on_take=None):
+        """Возвращает (seq, frame) кадра, который ещё не брали, или None по таймауту.
+
+        on_take() вызывается под блокировкой буфера до того, как кадр отмечен
+        взятым, — чтобы кадр ни в какой момент не был «ничьим».
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.closed or self.seq > self.taken_seq, timeout):
+                return None
+            if self.closed:
+                return None
+            if on_take is not None:
+                on_take()
+            self.taken_seq = self.seq
+            self.cond.notify_all()
+            return self.seq, self.frame
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class FramePipeline:
+    """Конвейер захват -> обработка -> отображение.
+
+    Поток захвата постоянно читает камеру и держит только свежий кадр,
+    пул потоков обрабатывает кадры функцией process_fn (OpenCV отпускает GIL),
+    а потребитель (цикл Tk) забирает последний готовый результат через
+    latest_result(). Сам VideoCapture конвейер не закрывает.
+    При drop_frames=False (файл на полной скорости) кадры не пропускаются:
+    захват ждёт, пока предыдущий кадр возьмут в обработку.
+    """
+
+    def __init__(self, cap, process_fn, workers=2, drop_frames=True):
+        self.cap = cap
+        self.process_fn = process_fn
+        self.workers = max(1, workers)
+        self.drop_frames = drop_frames
+
+        self.buffer = LatestFrameBuffer()
+        self.stop_event = threading.Event()
+        self.slots = threading.Semaphore(self.workers)
+        self.executor = None
+        self.threads = []
+
+        self.result_lock = threading.Lock()
+        self.result = None  # (seq, результат, время обработки)
+        self.presented_seq = 0
+
+        self.capture_rate = RateMeter()
+        self.process_rate = RateMeter()
+        self.dispatched = 0
+        self.processed = 0
+        self.source_ended = False
+        self.stale = 0  # обработанные кадры, устаревшие к моменту готовности
+        self.errors = 0
+
+    def start(self):
+        self.stop_event.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="match")
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._dispatch_loop, name="dispatch", daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.buffer.close()
+        for t in self.threads:
+            t.join(timeout=2.0)
+        self.threads = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _capture_loop(self):
+        while not self.stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                if getattr(self.cap, "ended", False):
+                    # Видеофайл или последовательность изображений закончились
+                    self.source_ended = True
+                    return
+                time.sleep(0.01)
+                continue
+            self.capture_rate.tick()
+            self.buffer.put(frame, wait=not self.drop_frames)
+
+    def _dispatch_loop(self):
+        while not self.stop_event.is_set():
+            # Ждём свободного обработчика, затем берём самый свежий кадр
+            if not self.slots.acquire(timeout=0.1):
+                continue
+            item = self.buffer.get_newer(on_take=self._count_dispatched)
+            if item is None:
+                self.slots.release()
+                continue
+            seq, frame = item
+            try:
+                future = self.executor.submit(self._process, seq, frame)
+            except RuntimeError:
+                # Пул уже остановлен
+                with self.result_lock:
+                    self.dispatched -= 1
+                self.slots.release()
+                return
+            future.add_done_callback(lambda _: self.slots.release())
+
+    def _count_dispatched(self):
+        with self.result_lock:
+            self.dispatched += 1
+
+    def _process(self, seq, frame):
+        start_time = time.perf_counter()
+        try:
+            result = self.process_fn(frame)
+        except Exception as e:
+            with self.result_lock:
+                self.errors += 1
+            print(f"Ошибка при обработке кадра: {e}")
+            return
+        elapsed = time.perf_counter() - start_time
+        self.process_rate.tick()
+        with self.result_lock:
+            self.processed += 1
+            if self.result is not None and self.result[0] > seq:
+                # Другой обработчик уже выдал более свежий кадр
+                self.stale += 1
+                return
+            self.result = (seq, result, elapsed)
+
+    def latest_result(self):
+        """Возвращает (результат, время обработки) нового готового кадра или None"""
+        with self.result_lock:
+            if self.result is None or self.result[0] <= self.presented_seq:
+                return None
+            seq, result, elapsed = self.result
+            self.presented_seq = seq
+            return result, elapsed
+
+    def finished(self):
+        """Источник закончился, все его кадры обработаны и последний результат уже забран"""
+        if not self.source_ended:
+            return False
+        # Тот же порядок блокировок, что при взятии кадра: буфер, затем результат
+        with self.buffer.cond, self.result_lock:
+            if self.buffer.seq > self.buffer.taken_seq or self.processed + self.errors < self.dispatched:
+                return False
+            return self.result is None or self.result[0] <= self.presented_seq
+
+    def stats(self):
+        return {
+            "capture_fps": self.capture_rate.rate(),
+            "processed_fps": self.process_rate.rate(),
+            "dropped": self.buffer.dropped + self.stale,
+            "processed": self.processed,
+            "errors": self.errors,
+        }
@@ -0,0 +1,181 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from feature_backends import DEFAULT_BACKEND, FLANN_SEARCH_PARAMS, get_backend
+from object_matching import MatchResult, TemplateCache, limited_detector, object_corners
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif")
+# Соседей в общем индексе на дескриптор сцены: среди них ищется второй сосед из того же образца
+LIBRARY_KNN = 8
+
+
+class Detection(MatchResult):
+    """Найденный на сцене образец библиотеки"""
+
+    def __init__(self, template_id, name, homography, corners, inlier_pts, votes):
+        super().__init__(homography, corners, inlier_pts, good_matches=votes)
+        self.template_id = template_id
+        self.name = name
+        self.votes = votes
+
+    def to_dict(self):
+        data = super().to_dict()
+        data.update(template=self.name, votes=self.votes)
+        return data
+
+
+def template_ratio_test(indices, dists, template_ids, threshold):
+    """Тест Лоу отдельно для каждого образца над результатом knnSearch с k > 2.
+
+    Ближайший сосед каждого образца среди k найденных сравнивается со вторым
+    соседом из того же образца, а не просто со вторым в общем индексе: иначе
+    почти одинаковые образцы библиотеки (копии, варианты одного товара)
+    взаимно гасят совпадения. Если второго соседа того же образца среди k нет,
+    он не ближе k-го, и сравнение идёт с k-м; если индекс вернул меньше k
+    соседей (LSH), такие совпадения отбрасываются.
+
+    Возвращает номера дескрипторов запроса и номера их соседей в индексе
+    (дескриптор сцены может голосовать за несколько образцов).
+    """
+    valid = indices >= 0
+    ids = np.where(valid, template_ids[np.maximum(indices, 0)], -1)
+    k = ids.shape[1]
+    bound = np.where(valid[:, -1], dists[:, -1], 0)
+    first = valid.copy()
+    second = np.repeat(bound[:, None], k, axis=1)
+    for j in range(k):
+        first[:, j] &= (ids[:, :j] != ids[:, j:j + 1]).all(axis=1)
+        # Обход от дальних к ближним: остаётся ближайший сосед того же образца после j-го
+        for j2 in range(k - 1, j, -1):
+            same = valid[:, j2] & (ids[:, j2] == ids[:, j])
+            second[:, j] = np.where(same, dists[:, j2], second[:, j])
+    query_idx, column = np.nonzero(first & (dists < threshold * second))
+    return query_idx, indices[query_idx, column]
+
+
+class TemplateLibrary:
+    """Библиотека образцов с общим FLANN-индексом.
+
+    Дескрипторы всех образцов складываются в одну матрицу (KD-дерево для SIFT,
+    LSH для бинарных признаков), для каждой строки
+    хранится номер образца. Дескрипторы сцены считаются и сопоставляются с
+    индексом один раз на кадр (knn соседей, тест Лоу — отдельно для каждого
+    образца, см. template_ratio_test); гомография ищется только для образцов,
+    набравших достаточно голосов.
+    """
+
+    def __init__(self, cache=None, params=None, ratio=0.75, min_votes=10, backend=DEFAULT_BACKEND, knn=LIBRARY_KNN):
+        self.cache = cache if cache is not None else TemplateCache()
+        self.backend = get_backend(backend)
+        self.params = self.backend.params(params)
+        self.ratio = ratio
+        self.min_votes = min_votes
+        self.knn = knn
+
+        self.names = []
+        self.models = []
+        self._local = threading.local()
+
+        # Общий индекс и таблица соответствия «строка дескриптора -> образец»
+        self.index = None
+        self.template_ids = None
+        self.local_points = None
+
+    @property
+    def detector(self):
+        # Отдельный детектор на каждый поток обработки
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = self.backend.create_detector(self.params)
+        return detector
+
+    def __len__(self):
+        return len(self.models)
+
+    def add(self, name, img):
+        model = self.cache.get(img, self.params, self.backend.name)
+        if model.descriptors is None:
+            print(f"Образец {name}: ключевые точки не найдены, пропущен")
+            return False
+        self.names.append(name)
+        self.models.append(model)
+        self.index = None
+        return True
+
+    def load_directory(self, path):
+        """Загружает все изображения каталога как образцы. Возвращает число добавленных"""
+        added = 0
+        for file_name in sorted(os.listdir(path)):
+            if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img = cv2.imread(os.path.join(path, file_name))
+            if img is None:
+                print(f"Не удалось загрузить образец {file_name}")
+                continue
+            if self.add(os.path.splitext(file_name)[0], img):
+                added += 1
+        return added
+
+    def build(self):
+        """Строит общий FLANN-индекс по дескрипторам всех образцов"""
+        if not self.models:
+            self.index = None
+            return
+        descriptors = np.vstack([m.descriptors for m in self.models])
+        self.template_ids = np.concatenate(
+            [np.full(len(m.descriptors), i, dtype=np.int32) for i, m in enumerate(self.models)]
+        )
+        self.local_points = np.vstack([m.points for m in self.models]).astype(np.float32)
+        self.index = self.backend.create_index(descriptors)
+
+    def match(self, scene_img, nfeatures=None):
+        """Ищет все образцы библиотеки на сцене. Возвращает список Detection.
+
+        nfeatures — предел ключевых точек сцены, если тип признаков его поддерживает.
+        """
+        if self.index is None:
+            self.build()
+        if self.index is None:
+            return []
+
+        gray_scene = cv2.cvtColor(scene_img, cv2.COLOR_BGR2GRAY) if scene_img.ndim == 3 else scene_img
+        detector = self.detector
+        if nfeatures is not None and "nfeatures" in self.params:
+            detector = limited_detector(self._local, self.backend, self.params, nfeatures)
+        keypoints_scene, descriptors_scene = detector.detectAndCompute(gray_scene, None)
+        if descriptors_scene is None or len(descriptors_scene) < 2:
+            return []
+        scene_points = cv2.KeyPoint_convert(keypoints_scene)
+
+        # Один поиск по общему индексу для всех дескрипторов сцены
+        knn = max(2, min(self.knn, len(self.template_ids)))
+        indices, dists = self.index.knnSearch(descriptors_scene, knn, params=FLANN_SEARCH_PARAMS)
+
+        # Тест Лоу внутри каждого образца
+        query_idx, train_idx = template_ratio_test(
+            indices, dists, self.template_ids, self.backend.ratio_threshold(self.ratio))
+        match_ids = self.template_ids[train_idx]
+
+        votes = np.bincount(match_ids, minlength=len(self.models))
+        detections = []
+        for template_id in np.nonzero(votes >= self.min_votes)[0]:
+            sel = match_ids == template_id
+            src_pts = self.local_points[train_idx[sel]].reshape(-1, 1, 2)
+            dst_pts = scene_points[query_idx[sel]].reshape(-1, 1, 2)
+
+            M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+            if M is None:
+                continue
+            inlier_mask = mask.ravel().astype(bool)
+            if inlier_mask.sum() < self.min_votes:
+                continue
+
+            corners = object_corners(self.models[template_id].shape, M)
+            detections.append(Detection(
+                int(template_id), self.names[template_id], M, corners,
+                dst_pts.reshape(-1, 2)[inlier_mask], int(votes[template_id]),
+            ))
+        return detections
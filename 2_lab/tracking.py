@@ -0,0 +1,125 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from object_matching import MatchResult, object_corners
+
+# Параметры пирамидального оптического потока Лукаса-Канаде
+LK_PARAMS = dict(
+    winSize=(21, 21),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01),
+)
+
+
+class ObjectTracker:
+    """Конечный автомат «детекция -> слежение».
+
+    После успешной детекции inlier-точки сопровождаются разреженным
+    оптическим потоком (calcOpticalFlowPyrLK), а гомография пересчитывается
+    по ним. Полная детекция detect_fn(frame) запускается снова, если
+    выживших точек меньше min_points, доля inlier-точек RANSAC среди
+    сопровождаемых ниже min_inlier_ratio, средняя ошибка репроекции по всем
+    точкам, прошедшим проверку прямого-обратного потока, выше
+    max_reproj_error пикселей или прошло redetect_every кадров.
+
+    Порог RANSAC (ransac_threshold) строже предела проверки: иначе ошибка,
+    посчитанная по самим inlier-точкам, никогда не превысит предел.
+    """
+
+    DETECT = "detect"
+    TRACK = "track"
+
+    def __init__(self, detect_fn, template_shape, redetect_every=30, min_points=12, max_reproj_error=3.0,
+                 max_fb_error=1.0, ransac_threshold=1.5, min_inlier_ratio=0.7):
+        self.detect_fn = detect_fn
+        self.template_shape = template_shape
+        self.redetect_every = redetect_every
+        self.min_points = min_points
+        self.max_reproj_error = max_reproj_error
+        self.max_fb_error = max_fb_error
+        self.ransac_threshold = ransac_threshold
+        self.min_inlier_ratio = min_inlier_ratio
+        # Кадры должны обрабатываться строго по очереди
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.state = self.DETECT
+        self.prev_gray = None
+        self.obj_pts = None
+        self.scene_pts = None
+        self.frames_since_detect = 0
+        self.detections = 0
+        self.tracked_frames = 0
+
+    def process(self, frame):
+        with self.lock:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            result = None
+            if self.state == self.TRACK and self.frames_since_detect + 1 < self.redetect_every:
+                result = self._track(gray)
+            if result is None:
+                result = self._detect(frame)
+            self.prev_gray = gray
+            return result
+
+    def _detect(self, frame):
+        result = self.detect_fn(frame)
+        self.detections += 1
+        self.frames_since_detect = 0
+        if result.found and len(result.inlier_obj_pts) >= self.min_points:
+            self.state = self.TRACK
+            self.obj_pts = result.inlier_obj_pts.astype(np.float32).reshape(-1, 1, 2)
+            self.scene_pts = result.inlier_pts.astype(np.float32).reshape(-1, 1, 2)
+        else:
+            self.state = self.DETECT
+        return result
+
+    def _track(self, gray):
+        start = time.perf_counter()
+
+        # Прямой и обратный проход потока: отбрасываем точки с большой ошибкой возврата
+        next_pts, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.scene_pts, None, **LK_PARAMS)
+        if next_pts is None:
+            return None
+        back_pts, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, next_pts, None, **LK_PARAMS)
+        fb_error = np.linalg.norm((back_pts - self.scene_pts).reshape(-1, 2), axis=1)
+        keep = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+        if keep.sum() < self.min_points:
+            return None
+
+        obj_pts = self.obj_pts[keep]
+        scene_pts = next_pts[keep]
+        M, mask = cv2.findHomography(obj_pts, scene_pts, cv2.RANSAC, self.ransac_threshold)
+        if M is None:
+            return None
+        inliers = mask.ravel().astype(bool)
+        # Доля считается от всех сопровождаемых точек: потерянные потоком тоже говорят о сбое
+        if inliers.sum() < self.min_points or inliers.sum() < self.min_inlier_ratio * len(self.scene_pts):
+            return None
+
+        # Средняя ошибка репроекции по всем точкам, пережившим проверку потока, а не только по inlier-точкам
+        projected = cv2.perspectiveTransform(obj_pts, M)
+        reproj_error = float(np.linalg.norm((projected - scene_pts).reshape(-1, 2), axis=1).mean())
+        if reproj_error > self.max_reproj_error:
+            return None
+
+        self.obj_pts = obj_pts[inliers]
+        self.scene_pts = scene_pts[inliers]
+        self.frames_since_detect += 1
+        self.tracked_frames += 1
+
+        result = MatchResult(
+            homography=M,
+            corners=object_corners(self.template_shape, M),
+            inlier_pts=self.scene_pts.reshape(-1, 2),
+            inlier_obj_pts=self.obj_pts.reshape(-1, 2),
+            good_matches=int(inliers.sum()),
+        )
+        result.tracked = True
+        elapsed = time.perf_counter() - start
+        result.timings = {"track": elapsed, "total": elapsed}
+        return result
@@ -2,18 +2,40 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import cv2
 import pytesseract
-from PIL import Image, ImageTk
+from PIL import ImageTk
+import argparse
 import os
-from typing import Optional, Tuple
-
-# === Конфигурация ===
-TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-if os.path.exists(TESSERACT_PATH):
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+import sys
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from ocr_batch import BatchOCR
+from ocr_cache import OcrCache
+from ocr_engine import (DEFAULT_LANG, ENGINE_STATS, CancelToken, OcrCancelled, calibrate_engine, create_engine,
+                        engine_name, recognize, recognize_regions, recognize_structured, set_engine, set_metrics)
+from ocr_structured import StructuredResult, draw_words
+from ocr_tiles import is_large_image, load_preview, recognize_tiled
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.metrics import Instrumentation, Metrics, add_metrics_args
+from lab_common.presenter import FramePresenter, fit_size
+from lab_common.stats_panel import StatsPanel
+
+# Период обновления индикатора пакетной обработки, мс
+BATCH_POLL_MS = 200
+# Период проверки готовых результатов распознавания, мс
+OCR_POLL_MS = 100
+# Кэш распознанного текста на диске (повторно открытые документы не распознаются заново)
+OCR_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache")
+# Сеансов tesserocr на набор языков (None — по числу ядер); без tesserocr tesseract запускается процессом
+OCR_POOL_SIZE = None
 
 
 class OCRApp:
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: tk.Tk, metrics: Optional[Metrics] = None):
         self.root = root
         self.root.title("OCR: Распознавание текста с изображений")
         self.root.geometry("1100x750")
@@ -21,9 +43,34 @@ class OCRApp:
 
         # --- Данные ---
         self.image_path: str = ""
+        # Для очень больших изображений в памяти держится только предпросмотр, распознавание идёт по полосам
+        self.tiled: bool = False
         self.original_image: Optional[cv2.Mat] = None
         self.processed_image: Optional[cv2.Mat] = None
         self.photo_ref: Optional[ImageTk.PhotoImage] = None
+        self.batch: Optional[BatchOCR] = None
+        self.batch_thread: Optional[threading.Thread] = None
+        self.batch_error: Optional[str] = None
+
+        # Распознавание идёт в фоновом потоке по очереди; ключ задания — (файл, язык, режим)
+        self.ocr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr")
+        self.ocr_jobs: Dict[Tuple[str, str, str], Tuple[Future, CancelToken]] = {}
+        self.ocr_done: "queue.Queue[Tuple[Tuple[str, str, str], Future]]" = queue.Queue()
+        # Слова с рамками для текущего изображения (режим «Рамки слов»)
+        self.structured_result: Optional[StructuredResult] = None
+        self.ocr_polling = False
+        self.ocr_cache = OcrCache(OCR_CACHE_DIR)
+        set_engine(create_engine("auto", OCR_POOL_SIZE))
+        # Время этапов threshold, regions, tesseract, render и счётчики кэша
+        self.metrics = metrics if metrics is not None else Metrics()
+        set_metrics(self.metrics)
+        # Языки, для которых уже замерены накладные расходы вызова движка. Замер идёт
+        # в своём потоке, чтобы не задерживать очередь распознавания
+        self.calibrated = set()
+        self.calibration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-calibrate")
+        self.calibrating: Dict[str, Future] = {}
+        # Текст, распознанный для изображений, которые уже не на экране
+        self.recognized: Dict[str, str] = {}
 
         # --- Стили ---
         self.setup_styles()
@@ -69,9 +116,19 @@ class OCRApp:
         ttk.Label(control_frame, text="Язык распознавания:", font=('Segoe UI', 10, 'bold')).pack(
             padx=10, anchor='w'
         )
-        self.lang_var = tk.StringVar(value="rus+eng")
+        self.lang_var = tk.StringVar(value=DEFAULT_LANG)
         lang_entry = ttk.Entry(control_frame, textvariable=self.lang_var, font=('Consolas', 10))
-        lang_entry.pack(fill=tk.X, padx=10, pady=(0, 15))
+        lang_entry.pack(fill=tk.X, padx=10, pady=(0, 5))
+
+        # Поиск текстовых областей: tesseract получает только блоки с текстом, блоки распознаются параллельно
+        self.regions_var = tk.BooleanVar(value=False)
+        self.regions_check = ttk.Checkbutton(control_frame, text="Только текстовые области", variable=self.regions_var)
+        self.regions_check.pack(padx=10, pady=(0, 5), anchor='w')
+
+        # Рамки и уверенность слов за тот же прогон tesseract; сохраняются в TSV, hOCR или JSON
+        self.words_var = tk.BooleanVar(value=False)
+        self.words_check = ttk.Checkbutton(control_frame, text="Рамки слов (TSV / hOCR / JSON)", variable=self.words_var)
+        self.words_check.pack(padx=10, pady=(0, 15), anchor='w')
 
         # Кнопки действий
         self.recognize_btn = ttk.Button(
@@ -79,16 +136,52 @@ class OCRApp:
         )
         self.recognize_btn.pack(fill=tk.X, padx=10, pady=5)
 
+        self.cancel_btn = ttk.Button(
+            control_frame, text="⏹ Отменить распознавание", command=self.cancel_recognition, state=tk.DISABLED
+        )
+        self.cancel_btn.pack(fill=tk.X, padx=10, pady=(0, 5))
+
         self.save_btn = ttk.Button(
             control_frame, text="💾 Сохранить текст", command=self.save_text
         )
         self.save_btn.pack(fill=tk.X, padx=10, pady=(5, 0))
 
+        # Пакетная обработка: папка с изображениями, многостраничный TIFF или PDF
+        ttk.Label(control_frame, text="Пакетная обработка:", font=('Segoe UI', 10, 'bold')).pack(
+            padx=10, pady=(15, 0), anchor='w'
+        )
+        self.batch_folder_btn = ttk.Button(
+            control_frame, text="📁 Папка с изображениями", command=self.start_batch_folder
+        )
+        self.batch_folder_btn.pack(fill=tk.X, padx=10, pady=(5, 0))
+        self.batch_file_btn = ttk.Button(
+            control_frame, text="📄 Многостраничный TIFF / PDF", command=self.start_batch_file
+        )
+        self.batch_file_btn.pack(fill=tk.X, padx=10, pady=(5, 0))
+
+        workers_frame = ttk.Frame(control_frame)
+        workers_frame.pack(fill=tk.X, padx=10, pady=(5, 0))
+        ttk.Label(workers_frame, text="Потоков:").pack(side=tk.LEFT)
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+        ttk.Spinbox(workers_frame, from_=1, to=64, textvariable=self.workers_var, width=5).pack(side=tk.LEFT, padx=5)
+
+        self.batch_progress = ttk.Progressbar(control_frame, mode='determinate')
+        self.batch_progress.pack(fill=tk.X, padx=10, pady=(5, 0))
+        self.batch_cancel_btn = ttk.Button(
+            control_frame, text="⏹ Остановить пакет", command=self.cancel_batch, state=tk.DISABLED
+        )
+        self.batch_cancel_btn.pack(fill=tk.X, padx=10, pady=(5, 0))
+
         # Статус
         self.status_var = tk.StringVar(value="Готов к работе")
         status_label = ttk.Label(control_frame, textvariable=self.status_var, foreground='#888', font=('Segoe UI', 9))
         status_label.pack(padx=10, pady=(15, 5), anchor='w')
 
+        self.stats_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="Статистика этапов", variable=self.stats_var,
+                        command=lambda: self.stats_panel.toggle(self.stats_var.get())).pack(padx=10, anchor='w')
+        self.stats_panel = StatsPanel(control_frame, self.metrics, padx=10, anchor='w')
+
         # Добавляем фрейм в панель
         main_pane.add(control_frame)
 
@@ -112,6 +205,7 @@ class OCRApp:
         h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
 
         self.image_container = self.canvas.create_image(0, 0, anchor=tk.NW)
+        self.presenter = FramePresenter(self.canvas, item=self.image_container)
         self.canvas.bind("<Configure>", self.on_canvas_resize)
 
         right_pane.add(image_frame, weight=3)
@@ -143,27 +237,39 @@ class OCRApp:
         if not path:
             return
 
-        img = cv2.imread(path)
+        tiled = is_large_image(path)
+        if tiled:
+            img, factor = load_preview(path)
+        else:
+            img = cv2.imread(path)
         if img is None:
             messagebox.showerror("Ошибка", "Невозможно загрузить изображение.")
             return
 
         self.image_path = path
+        self.tiled = tiled
         self.original_image = img
         self.processed_image = None
+        self.structured_result = None
         self.path_label.config(text=os.path.basename(path))
         self.text_widget.delete(1.0, tk.END)
+        if path in self.recognized:
+            self.text_widget.insert(tk.END, self.recognized.pop(path))
         self.display_image(img)
-        self.status_var.set("Изображение загружено")
+        # Большое изображение распознаётся по полосам только как текст: рамки слов и текстовые области недоступны
+        self.words_check.config(state=tk.DISABLED if tiled else tk.NORMAL)
+        self.regions_check.config(state=tk.DISABLED if tiled else tk.NORMAL)
+        if tiled:
+            self.status_var.set(f"Большое изображение: предпросмотр 1:{factor}, распознавание по полосам "
+                                "(только текст, без рамок слов и текстовых областей)")
+        else:
+            self.status_var.set("Изображение загружено")
 
     def display_image(self, img: cv2.Mat):
         """Отображает изображение с автоматическим масштабированием под canvas"""
         if img is None:
             return
 
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img_rgb)
-
         # Получаем размеры canvas
         canvas_w = self.canvas.winfo_width()
         canvas_h = self.canvas.winfo_height()
@@ -173,16 +279,14 @@ class OCRApp:
             self.root.after(50, lambda: self.display_image(img))
             return
 
-        # Масштабируем с сохранением пропорций
-        img_w, img_h = pil_img.size
-        scale = min(canvas_w / img_w, canvas_h / img_h)
-        new_w, new_h = int(img_w * scale), int(img_h * scale)
-
-        resized = pil_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-        self.photo_ref = ImageTk.PhotoImage(resized)
+        # Масштабируем с сохранением пропорций (статичное изображение — LANCZOS)
+        img_h, img_w = img.shape[:2]
+        size = fit_size(img_w, img_h, canvas_w, canvas_h, allow_upscale=True)
 
-        # Обновляем изображение на canvas
-        self.canvas.itemconfig(self.image_container, image=self.photo_ref)
+        # Обновляем изображение на canvas на месте
+        with self.metrics.stage("render"):
+            new_w, new_h = self.presenter.show(img, size, live=False)
+        self.photo_ref = self.presenter.photo
         self.canvas.config(scrollregion=(0, 0, new_w, new_h))
 
     def recognize_text(self):
@@ -190,30 +294,221 @@ class OCRApp:
             messagebox.showwarning("Внимание", "Сначала загрузите изображение.")
             return
 
-        self.status_var.set("Распознавание...")
-        self.root.update_idletasks()
+        # Повторное нажатие для того же изображения и языка не создаёт второе задание
+        if self.tiled:
+            mode = "text"
+        else:
+            mode = "words" if self.words_var.get() else "regions" if self.regions_var.get() else "text"
+        key = (self.image_path, self.lang_var.get().strip(), mode)
+        if key in self.ocr_jobs:
+            self.status_var.set("Это изображение уже распознаётся")
+            return
 
+        token = CancelToken()
+        if self.tiled:
+            # Полное разрешение читается с диска по полосам уже в фоновом потоке
+            future = self.ocr_executor.submit(recognize_tiled, self.image_path, key[1], token, self.ocr_cache)
+        else:
+            recognize_fn = {"text": recognize, "regions": recognize_regions, "words": recognize_structured}[mode]
+            future = self.ocr_executor.submit(recognize_fn, self.original_image, key[1], token, self.ocr_cache)
+        self.ocr_jobs[key] = (future, token)
+        if key[1] not in self.calibrated and key[1] not in self.calibrating:
+            self.calibrating[key[1]] = self.calibration_executor.submit(calibrate_engine, key[1])
+        # Колбэк вызывается в фоновом потоке — только кладём результат в очередь для цикла Tk
+        future.add_done_callback(lambda f, key=key: self.ocr_done.put((key, f)))
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.update_ocr_status()
+        if not self.ocr_polling:
+            self.ocr_polling = True
+            self.root.after(OCR_POLL_MS, self.poll_ocr)
+
+    def update_ocr_status(self):
+        if not self.ocr_jobs:
+            return
+        names = [os.path.basename(key[0]) for key in self.ocr_jobs]
+        queued = f" (в очереди ещё {len(names) - 1})" if len(names) > 1 else ""
+        self.status_var.set(f"Распознавание: {names[0]}{queued}...")
+
+    def poll_ocr(self):
+        """Забирает готовые результаты фоновых заданий (вызывается в цикле Tk)"""
+        while True:
+            try:
+                key, future = self.ocr_done.get_nowait()
+            except queue.Empty:
+                break
+            self.ocr_jobs.pop(key, None)
+            self.finish_recognition(key[0], future)
+            self.update_cache_metrics()
+        self.poll_calibration()
+
+        if self.ocr_jobs:
+            self.update_ocr_status()
+        else:
+            self.cancel_btn.config(state=tk.DISABLED)
+        if self.ocr_jobs or self.calibrating:
+            self.root.after(OCR_POLL_MS, self.poll_ocr)
+        else:
+            self.ocr_polling = False
+
+    def poll_calibration(self):
+        """Учитывает завершённые замеры накладных расходов; неудачный замер повторится при следующем распознавании"""
+        for lang, future in list(self.calibrating.items()):
+            if not future.done():
+                continue
+            del self.calibrating[lang]
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is None:
+                self.calibrated.add(lang)
+            elif not isinstance(error, pytesseract.TesseractNotFoundError):
+                # Об отсутствии tesseract сообщает само распознавание
+                self.status_var.set(f"Не удалось замерить накладные расходы ({lang}): {error}")
+
+    def finish_recognition(self, path: str, future: Future):
         try:
-            gray = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2GRAY)
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            self.processed_image = thresh
-
-            lang = self.lang_var.get().strip() or "eng"
-            config = f'--oem 3 --psm 6 -l {lang}'
-            text = pytesseract.image_to_string(thresh, config=config)
-
-            self.text_widget.delete(1.0, tk.END)
-            self.text_widget.insert(tk.END, text.strip() or "(Текст не найден)")
-
-            self.display_image(thresh)  # Показываем обработанное изображение
-            self.status_var.set("Распознавание завершено")
-
+            if future.cancelled():
+                raise OcrCancelled()
+            result, thresh = future.result()
+        except OcrCancelled:
+            self.status_var.set("Распознавание отменено")
+            return
         except pytesseract.TesseractNotFoundError:
             messagebox.showerror("Ошибка", "Tesseract не найден. Проверьте путь к tesseract.exe.")
             self.status_var.set("Ошибка: Tesseract не установлен")
+            return
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось распознать текст:\n{e}")
             self.status_var.set("Ошибка при распознавании")
+            return
+
+        structured = result if isinstance(result, StructuredResult) else None
+        text = (structured.text if structured else result).strip() or "(Текст не найден)"
+        if path != self.image_path:
+            # Пользователь уже открыл другое изображение — текст покажем, когда он вернётся к этому
+            self.recognized[path] = text
+            self.status_var.set(f"{os.path.basename(path)}: распознавание завершено | {self.cache_status()}")
+            return
+
+        self.structured_result = structured
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.insert(tk.END, text)
+        if structured is not None:
+            # Рамки слов рисуются поверх обработанного (или, при попадании в кэш, исходного) изображения
+            self.display_image(draw_words(thresh if thresh is not None else self.original_image, structured))
+            words = len(structured.words)
+            source = "из кэша" if thresh is None else "распознано"
+            self.status_var.set(f"Слов {source}: {words} | {self.cache_status()} | {self.engine_status()}")
+            return
+        if thresh is None:
+            # Текст взят из кэша — бинаризация не выполнялась, остаётся исходное изображение
+            self.status_var.set(f"Текст взят из кэша | {self.cache_status()}")
+            return
+        self.processed_image = thresh
+        self.display_image(thresh)  # Показываем обработанное изображение
+        self.status_var.set(f"Распознавание завершено | {self.cache_status()} | {self.engine_status()}")
+
+    def update_cache_metrics(self):
+        stats = self.ocr_cache.stats()
+        self.metrics.set("cache_hits", stats["hits"])
+        self.metrics.set("cache_misses", stats["misses"])
+
+    def cache_status(self) -> str:
+        stats = self.ocr_cache.stats()
+        return f"Кэш: попаданий {stats['hits']}, промахов {stats['misses']}"
+
+    def engine_status(self) -> str:
+        stats = ENGINE_STATS.summary()
+        status = f"{engine_name()}: {stats['mean_ms']:.0f} мс/вызов"
+        if stats["overhead_share"] is not None:
+            status += f", накладные ~{stats['overhead_share']:.0%}"
+        return status
+
+    def cancel_recognition(self):
+        """Отменяет задания в очереди и завершает запущенный процесс tesseract"""
+        for future, token in self.ocr_jobs.values():
+            future.cancel()
+            token.cancel()
+        self.status_var.set("Отмена распознавания...")
+
+    def on_closing(self):
+        self.cancel_recognition()
+        self.cancel_batch()
+        self.ocr_executor.shutdown(wait=False, cancel_futures=True)
+        self.calibration_executor.shutdown(wait=False, cancel_futures=True)
+        set_engine(None)
+        set_metrics(None)
+        self.root.destroy()
+
+    def start_batch_folder(self):
+        path = filedialog.askdirectory(title="Папка с изображениями")
+        if path:
+            self.start_batch(path)
+
+    def start_batch_file(self):
+        filetypes = [("TIFF и PDF", "*.tif *.tiff *.pdf")]
+        path = filedialog.askopenfilename(title="Выберите многостраничный документ", filetypes=filetypes)
+        if path:
+            self.start_batch(path)
+
+    def start_batch(self, path: str):
+        """Запускает пакетное распознавание в фоновом потоке; текст страниц пишется в выбранную папку"""
+        if self.batch is not None:
+            return
+        output_dir = filedialog.askdirectory(title="Папка для распознанного текста")
+        if not output_dir:
+            return
+        try:
+            workers = max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            workers = os.cpu_count() or 1
+
+        self.batch = BatchOCR(output_dir, lang=self.lang_var.get().strip() or "eng", workers=workers,
+                              cache=self.ocr_cache, regions=self.regions_var.get())
+        self.batch_error = None
+        self.batch_thread = threading.Thread(target=self._run_batch, args=(self.batch, path), daemon=True)
+        self.batch_thread.start()
+
+        self.batch_folder_btn.config(state=tk.DISABLED)
+        self.batch_file_btn.config(state=tk.DISABLED)
+        self.batch_cancel_btn.config(state=tk.NORMAL)
+        self.poll_batch()
+
+    def _run_batch(self, batch: BatchOCR, path: str):
+        # Выполняется в фоновом потоке: виджеты Tk отсюда не трогаем
+        try:
+            batch.run(path)
+        except pytesseract.TesseractNotFoundError:
+            self.batch_error = "Tesseract не найден. Проверьте путь к tesseract.exe."
+        except Exception as e:
+            self.batch_error = str(e)
+
+    def poll_batch(self):
+        done, total, rate = self.batch.progress()
+        self.batch_progress.config(maximum=max(total, 1), value=done)
+        self.metrics.set("batch_pages", done)
+        self.metrics.set("batch_pages_per_s", round(rate, 2))
+        self.update_cache_metrics()
+        if self.batch_thread.is_alive():
+            self.status_var.set(f"Пакет: {done}/{total} стр., {rate:.2f} стр/с")
+            self.root.after(BATCH_POLL_MS, self.poll_batch)
+            return
+
+        errors = len(self.batch.errors)
+        self.status_var.set(
+            f"Пакет завершён: {done}/{total} стр., {rate:.2f} стр/с, ошибок: {errors} | {self.cache_status()}"
+        )
+        if self.batch_error:
+            messagebox.showerror("Ошибка", f"Пакетная обработка прервана:\n{self.batch_error}")
+        self.batch = None
+        self.batch_folder_btn.config(state=tk.NORMAL)
+        self.batch_file_btn.config(state=tk.NORMAL)
+        self.batch_cancel_btn.config(state=tk.DISABLED)
+
+    def cancel_batch(self):
+        if self.batch is not None:
+            self.batch.cancel()
+            self.status_var.set("Остановка пакета...")
 
     def save_text(self):
         content = self.text_widget.get(1.0, tk.END).strip()
@@ -221,14 +516,25 @@ class OCRApp:
             messagebox.showwarning("Внимание", "Нет текста для сохранения.")
             return
 
+        filetypes = [("Текстовые файлы", "*.txt")]
+        if self.structured_result is not None:
+            filetypes += [("JSON со словами и рамками", "*.json"), ("hOCR", "*.hocr"), ("TSV tesseract", "*.tsv")]
         path = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("Текстовые файлы", "*.txt"), ("Все файлы", "*.*")],
+            filetypes=filetypes + [("Все файлы", "*.*")],
             title="Сохранить распознанный текст"
         )
         if not path:
             return
 
+        # Структурированные форматы берутся из результата, обычный текст — из поля (его можно править)
+        fmt = os.path.splitext(path)[1].lower().lstrip('.')
+        if fmt in ("json", "hocr", "tsv"):
+            if self.structured_result is None:
+                messagebox.showwarning("Внимание", "Включите «Рамки слов» и распознайте изображение заново.")
+                return
+            content = self.structured_result.export(fmt)
+
         try:
             with open(path, 'w', encoding='utf-8') as f:
                 f.write(content)
@@ -238,6 +544,14 @@ class OCRApp:
 
 
 if __name__ == "__main__":
+    args = add_metrics_args(argparse.ArgumentParser(description="Распознавание текста с изображений")).parse_args()
+    metrics = Metrics()
+    instrumentation = Instrumentation.from_args(metrics, args, prefix="ocr")
+    instrumentation.start()
     root = tk.Tk()
-    app = OCRApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = OCRApp(root, metrics)
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
+    try:
+        root.mainloop()
+    finally:
+        instrumentation.stop()
\ No newline at end of file
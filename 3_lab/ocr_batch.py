@@ -0,0 +1,266 @@
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image, ImageSequence
+
+from ocr_engine import DEFAULT_LANG, CancelToken, OcrCancelled, recognize, recognize_regions, recognize_structured
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+TIFF_EXTENSIONS = (".tif", ".tiff")
+PDF_EXTENSIONS = (".pdf",)
+
+# Разрешение растеризации PDF, точек на дюйм
+DEFAULT_DPI = 300
+
+
+def _open_pdf(path):
+    """Открывает PDF доступной библиотекой: pypdfium2 или PyMuPDF (обе необязательны)"""
+    try:
+        import pypdfium2
+        return "pdfium", pypdfium2.PdfDocument(path)
+    except ImportError:
+        pass
+    try:
+        import fitz
+        return "fitz", fitz.open(path)
+    except ImportError:
+        raise RuntimeError("Для чтения PDF установите pypdfium2 или PyMuPDF") from None
+
+
+def _pdf_pages(path, dpi):
+    kind, doc = _open_pdf(path)
+    try:
+        for i in range(len(doc)):
+            if kind == "pdfium":
+                bitmap = doc[i].render(scale=dpi / 72, grayscale=True)
+                img = np.array(bitmap.to_pil().convert("L"))
+            else:
+                pix = doc[i].get_pixmap(dpi=dpi, colorspace="gray", alpha=False)
+                img = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width).copy()
+            yield i, img
+    finally:
+        doc.close()
+
+
+def _tiff_pages(path):
+    # Страницы многостраничного TIFF декодируются по одной, а не все сразу
+    with Image.open(path) as im:
+        for i, frame in enumerate(ImageSequence.Iterator(im)):
+            yield i, np.array(frame.convert("L"))
+
+
+def page_count(path):
+    """Число страниц в файле (для индикатора прогресса)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in TIFF_EXTENSIONS:
+        with Image.open(path) as im:
+            return getattr(im, "n_frames", 1)
+    if ext in PDF_EXTENSIONS:
+        _, doc = _open_pdf(path)
+        try:
+            return len(doc)
+        finally:
+            doc.close()
+    return 1
+
+
+def list_sources(path):
+    """Файлы для обработки: сам файл или поддерживаемые файлы каталога по алфавиту"""
+    if not os.path.isdir(path):
+        return [path]
+    extensions = IMAGE_EXTENSIONS + TIFF_EXTENSIONS + PDF_EXTENSIONS
+    return [
+        os.path.join(path, name) for name in sorted(os.listdir(path))
+        if name.lower().endswith(extensions) and os.path.isfile(os.path.join(path, name))
+    ]
+
+
+def iter_pages(sources, dpi=DEFAULT_DPI):
+    """Перебирает страницы по одной: (файл, номер страницы, число страниц, изображение в оттенках серого).
+
+    Если файл не удалось прочитать, вместо изображения отдаётся исключение.
+    """
+    for source in sources:
+        ext = os.path.splitext(source)[1].lower()
+        try:
+            if ext in TIFF_EXTENSIONS:
+                total = page_count(source)
+                pages = _tiff_pages(source)
+            elif ext in PDF_EXTENSIONS:
+                total = page_count(source)
+                pages = _pdf_pages(source, dpi)
+            else:
+                total = 1
+                pages = [(0, cv2.imread(source, cv2.IMREAD_GRAYSCALE))]
+            for index, img in pages:
+                yield source, index, total, img
+        except (OSError, ValueError, RuntimeError, Image.DecompressionBombError) as e:
+            # Повреждённый файл, нет библиотеки для PDF или страница больше Image.MAX_IMAGE_PIXELS —
+            # ошибка попадает в отчёт, остальные файлы обрабатываются
+            yield source, 0, 1, e
+
+
+def page_name(stem, index, total):
+    return stem if total == 1 else f"{stem}_p{index + 1:04d}"
+
+
+def output_stems(sources, totals):
+    """Основа имён выходных файлов для каждого источника: {файл: основа}.
+
+    Обычно это имя файла без расширения. Если имена страниц совпали бы с уже
+    выданными (scan.png и одностраничный scan.tif, или файл x_p0001.png рядом
+    с многостраничным x.pdf), добавляется расширение, а затем номер. Регистр
+    не учитывается: в Windows и macOS имена Scan.txt и scan.txt совпадают.
+    """
+    used = set()
+    stems = {}
+    for source, total in zip(sources, totals):
+        base, ext = os.path.splitext(os.path.basename(source))
+        ext = ext.lstrip(".").lower()
+        candidates = itertools.chain([base, f"{base}_{ext}"], (f"{base}_{ext}_{n}" for n in itertools.count(2)))
+        for stem in candidates:
+            names = {page_name(stem, i, total).lower() for i in range(total)}
+            if not names & used:
+                break
+        used |= names
+        stems[source] = stem
+    return stems
+
+
+def output_path(output_dir, stem, index, total, fmt="txt"):
+    return os.path.join(output_dir, f"{page_name(stem, index, total)}.{fmt}")
+
+
+class BatchOCR:
+    """Пакетное распознавание страниц в пуле потоков.
+
+    Каждый вызов tesseract — отдельный процесс или сеанс пула tesserocr (ocr_pool),
+    поэтому для параллельной работы достаточно потоков: пока tesseract
+    распознаёт страницу, GIL свободен.
+    Страницы декодируются в вызывающем потоке по мере освобождения пула —
+    в памяти одновременно не больше 2 * workers страниц. Текст каждой страницы
+    записывается в output_dir сразу после её распознавания.
+    """
+
+    def __init__(self, output_dir, lang=DEFAULT_LANG, workers=None, dpi=DEFAULT_DPI, cache=None, regions=False,
+                 output_format="txt"):
+        self.output_dir = output_dir
+        self.lang = lang
+        self.cache = cache
+        self.regions = regions
+        # txt — только текст; tsv, hocr, json — слова с рамками и уверенностью (ocr_structured)
+        self.output_format = output_format
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.dpi = dpi
+        self.stop_event = threading.Event()
+        self.tokens = set()
+        self.stems = {}
+
+        self.lock = threading.Lock()
+        self.total = 0
+        self.done = 0
+        self.errors = []
+        self.start_time = None
+        self.end_time = None
+
+    def progress(self):
+        """(готово страниц, всего страниц, страниц в секунду)"""
+        with self.lock:
+            if self.start_time is None:
+                return self.done, self.total, 0.0
+            elapsed = (self.end_time or time.perf_counter()) - self.start_time
+            return self.done, self.total, self.done / elapsed if elapsed > 0 else 0.0
+
+    def cancel(self):
+        """Прекращает подачу страниц и завершает уже запущенные процессы tesseract"""
+        self.stop_event.set()
+        with self.lock:
+            tokens = list(self.tokens)
+        for token in tokens:
+            token.cancel()
+
+    def _recognize_page(self, source, index, total, img):
+        if isinstance(img, Exception):
+            raise img
+        if img is None:
+            raise ValueError("не удалось прочитать изображение")
+        # tesseract сам распараллеливается через OpenMP; при нескольких процессах это лишь мешает
+        token = CancelToken(thread_limit=1 if self.workers > 1 else None)
+        with self.lock:
+            self.tokens.add(token)
+        try:
+            if self.stop_event.is_set():
+                token.cancel()
+            if self.output_format != "txt":
+                result, _ = recognize_structured(img, self.lang, token, self.cache)
+                text = result.export(self.output_format)
+            elif self.regions:
+                # Страницы и так распознаются параллельно — блоки одной страницы идут по очереди
+                text, _ = recognize_regions(img, self.lang, token, self.cache, workers=1)
+            else:
+                text, _ = recognize(img, self.lang, token, self.cache)
+        finally:
+            with self.lock:
+                self.tokens.discard(token)
+        stem = self.stems.get(source) or os.path.splitext(os.path.basename(source))[0]
+        path = output_path(self.output_dir, stem, index, total, self.output_format)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text.strip())
+        return path
+
+    def run(self, path, on_page=None):
+        """Распознаёт файл или каталог. on_page(файл, страница, путь к тексту или None, ошибка) —
+        вызывается из рабочих потоков по готовности каждой страницы."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        sources = list_sources(path)
+        totals = []
+        for source in sources:
+            try:
+                totals.append(page_count(source))
+            except Exception:
+                totals.append(1)
+        self.stems = output_stems(sources, totals)
+        with self.lock:
+            self.total = sum(totals)
+            self.start_time = time.perf_counter()
+
+        def task(source, index, total, img):
+            try:
+                result, error = self._recognize_page(source, index, total, img), None
+            except pytesseract.TesseractNotFoundError:
+                self.stop_event.set()
+                raise
+            except OcrCancelled:
+                return
+            except Exception as e:
+                result, error = None, str(e)
+            with self.lock:
+                self.done += 1
+                if error:
+                    self.errors.append((source, index, error))
+            if on_page is not None:
+                on_page(source, index, result, error)
+
+        pending = set()
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="ocr") as pool:
+                for page in iter_pages(sources, self.dpi):
+                    if self.stop_event.is_set():
+                        break
+                    pending.add(pool.submit(task, *page))
+                    if len(pending) >= 2 * self.workers:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            future.result()
+                for future in pending:
+                    future.result()
+        finally:
+            with self.lock:
+                self.end_time = time.perf_counter()
+        return self.progress()
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Общие компоненты лабораторных лежат в каталоге lab_common в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_common.hashing import image_hash
+
+
+def ocr_key(img, preprocess, config):
+    """Ключ кэша: хэш исходного изображения + описание предобработки + строка конфигурации tesseract"""
+    return digest_key(image_hash(img), preprocess, config)
+
+
+def digest_key(digest, preprocess, config):
+    """Ключ кэша по уже посчитанному хэшу изображения (тот же, что даёт image_hash)"""
+    params = f"{preprocess}|{config}"
+    return digest + "-" + hashlib.sha1(params.encode()).hexdigest()[:12]
+
+
+class OcrCache:
+    """Кэш распознанного текста по содержимому изображения и параметрам распознавания.
+
+    В памяти хранится не больше max_entries последних результатов (LRU).
+    Если задан cache_dir, тексты дополнительно сохраняются на диск; когда
+    их суммарный размер превышает max_disk_bytes, удаляются давно не
+    использованные файлы. Методы безопасно вызывать из нескольких потоков.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=256, max_disk_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+        self.texts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_bytes = None
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    def get(self, key):
+        """Текст из кэша или None"""
+        with self.lock:
+            text = self.texts.get(key)
+            if text is not None:
+                self.texts.move_to_end(key)
+                self.hits += 1
+                return text
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    text = f.read()
+                # Время изменения файла служит отметкой последнего использования
+                os.utime(path)
+            except FileNotFoundError:
+                text = None
+            except OSError as e:
+                print(f"Не удалось прочитать кэш OCR {key}: {e}")
+                text = None
+
+        with self.lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        with self.lock:
+            self._remember(key, text)
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._disk_path(key)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш OCR {key}: {e}")
+            return
+        with self.lock:
+            if self.disk_bytes is not None:
+                self.disk_bytes += size
+        self._evict_disk()
+
+    def _remember(self, key, text):
+        self.texts[key] = text
+        self.texts.move_to_end(key)
+        while len(self.texts) > self.max_entries:
+            self.texts.popitem(last=False)
+
+    def _evict_disk(self):
+        """Удаляет самые давно использованные файлы, пока кэш не уложится в max_disk_bytes"""
+        with self.lock:
+            if self.disk_bytes is not None and self.disk_bytes <= self.max_disk_bytes:
+                return
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".txt") and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self.disk_bytes = total
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.texts), "disk_bytes": self.disk_bytes}
+
+    def clear(self):
+        with self.lock:
+            self.texts.clear()
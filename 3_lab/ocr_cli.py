@@ -0,0 +1,97 @@
+"""Пакетное распознавание текста без интерфейса.
+
+Примеры:
+    python ocr_cli.py --input scans/ --output-dir texts/
+    python ocr_cli.py --input archive.tiff --output-dir texts/ --workers 8 --lang rus
+    python ocr_cli.py --input book.pdf --output-dir texts/ --dpi 200
+    python ocr_cli.py --input scans/ --output-dir index/ --format json
+    python ocr_cli.py --input scans/ --output-dir texts/ --engine process
+
+На вход подаётся каталог с изображениями, многостраничный TIFF или PDF
+(нужен pypdfium2 или PyMuPDF). Страницы распознаются параллельно, текст
+каждой страницы записывается в отдельный файл сразу по готовности.
+Если установлен tesserocr, страницы распознаются пулом долгоживущих
+сеансов tesseract, иначе — отдельным процессом на каждую страницу.
+"""
+import argparse
+import os
+import sys
+
+import pytesseract
+
+from ocr_batch import DEFAULT_DPI, BatchOCR
+from ocr_cache import OcrCache
+from ocr_engine import DEFAULT_LANG, ENGINES, calibrate_engine, create_engine, engine_report, set_engine
+from ocr_structured import EXPORT_FORMATS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетное распознавание текста: каталог, многостраничный TIFF или PDF")
+    parser.add_argument("--input", required=True, help="каталог с изображениями, файл TIFF или PDF")
+    parser.add_argument("--output-dir", required=True, help="каталог для текстовых файлов")
+    parser.add_argument("--lang", default=DEFAULT_LANG, help="языки tesseract, например rus+eng")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="одновременных процессов tesseract")
+    parser.add_argument("--engine", choices=ENGINES, default="auto",
+                        help="tesserocr — пул сеансов, process — процесс tesseract на каждый вызов")
+    parser.add_argument("--pool-size", type=int, help="сеансов tesserocr на набор языков (по умолчанию = --workers)")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="разрешение растеризации PDF")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="txt",
+                        help="txt — текст; tsv, hocr, json — слова с рамками и уверенностью")
+    parser.add_argument("--regions", action="store_true", help="распознавать только найденные текстовые области")
+    parser.add_argument("--cache-dir", help="каталог кэша распознанного текста (повторные страницы не распознаются)")
+    parser.add_argument("--cache-size", type=int, default=256, help="предельный размер кэша на диске, МБ")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.input):
+        print(f"Нет такого файла или каталога: {args.input}", file=sys.stderr)
+        return 1
+
+    if args.regions and args.format != "txt":
+        print("--regions поддерживается только с --format txt", file=sys.stderr)
+        return 1
+
+    try:
+        set_engine(create_engine(args.engine, args.pool_size or args.workers))
+    except RuntimeError as e:
+        print(f"Движок {args.engine} недоступен: {e}", file=sys.stderr)
+        return 1
+
+    cache = OcrCache(args.cache_dir, max_disk_bytes=args.cache_size * 1024 * 1024) if args.cache_dir else None
+    batch = BatchOCR(args.output_dir, lang=args.lang, workers=args.workers, dpi=args.dpi, cache=cache,
+                     regions=args.regions, output_format=args.format)
+
+    def on_page(source, index, path, error):
+        done, total, rate = batch.progress()
+        if error:
+            print(f"\n{os.path.basename(source)}, стр. {index + 1}: {error}", file=sys.stderr)
+        print(f"\rСтраниц: {done}/{total} ({rate:.2f} стр/с)", end="", file=sys.stderr, flush=True)
+
+    try:
+        done, total, rate = batch.run(args.input, on_page)
+    except pytesseract.TesseractNotFoundError:
+        print("\nTesseract не найден. Проверьте установку и путь к tesseract.", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        batch.cancel()
+        print("\nПрервано", file=sys.stderr)
+        return 130
+
+    print(f"\rСтраниц: {done}/{total} ({rate:.2f} стр/с), ошибок: {len(batch.errors)}", file=sys.stderr)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Кэш: попаданий {stats['hits']}, промахов {stats['misses']}", file=sys.stderr)
+    if done > len(batch.errors):
+        try:
+            calibrate_engine(args.lang)
+        except Exception:
+            pass  # без калибровки выводится только среднее время вызова
+        print(engine_report(), file=sys.stderr)
+    set_engine(None)
+    return 1 if batch.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
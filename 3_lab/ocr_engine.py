@@ -0,0 +1,293 @@
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+import pytesseract
+
+from ocr_cache import ocr_key
+from ocr_pool import EngineStats, TesserocrPool, tesserocr
+from ocr_structured import StructuredResult
+from text_regions import draw_regions, find_text_regions
+
+# === Конфигурация ===
+TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+if os.path.exists(TESSERACT_PATH):
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+
+DEFAULT_LANG = "rus+eng"
+# Описание предобработки для ключа кэша: при её изменении старые результаты не подойдут
+PREPROCESS = "gray+otsu"
+REGIONS_PREPROCESS = "regions:gradient+close|gray+otsu"
+# Если текстовые блоки занимают большую часть страницы, выгоднее распознать её целиком
+DENSE_PAGE_RATIO = 0.6
+
+# auto — пул сеансов tesserocr, если он установлен, иначе процесс tesseract на каждый вызов
+ENGINES = ("auto", "tesserocr", "process")
+# Текущий движок: пул сеансов (ocr_pool.TesserocrPool) или None — процесс на каждый вызов
+_engine = None
+ENGINE_STATS = EngineStats()
+# Метрики этапов (lab_common.metrics.Metrics), задаются set_metrics; None — без замеров
+_metrics = None
+
+
+class OcrCancelled(Exception):
+    """Распознавание отменено пользователем"""
+
+
+class CancelToken:
+    """Отмена распознавания: cancel() завершает запущенные процессы tesseract.
+
+    Токен можно отменить до запуска процесса — тогда процесс будет убит
+    сразу после старта. thread_limit — OMP_THREAD_LIMIT для процессов
+    tesseract, запущенных с этим токеном (окружение самого приложения
+    не меняется; для сеансов tesserocr не действует).
+    """
+
+    def __init__(self, thread_limit=None):
+        self.thread_limit = thread_limit
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.procs = set()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for proc in self.procs:
+                if proc.poll() is None:
+                    proc.kill()
+
+    def attach(self, proc):
+        with self.lock:
+            self.procs.add(proc)
+            if self.cancelled:
+                proc.kill()
+
+    def detach(self, proc):
+        with self.lock:
+            self.procs.discard(proc)
+
+    def check(self):
+        if self.cancelled:
+            raise OcrCancelled()
+
+
+def set_metrics(metrics):
+    """Включает замер этапов threshold, regions, tesseract для всех последующих вызовов"""
+    global _metrics
+    _metrics = metrics
+
+
+def stage(name):
+    metrics = _metrics
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def tesseract_config(lang):
+    return f'--oem 3 --psm 6 -l {lang}'
+
+
+def preprocess(img):
+    """Оттенки серого и бинаризация Оцу"""
+    with stage("threshold"):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+
+def create_engine(name="auto", pool_size=None):
+    """Пул сеансов tesserocr на pool_size сеансов для набора языков или None для запуска процессов"""
+    if name not in ENGINES:
+        raise ValueError(f"Неизвестный движок: {name}. Доступны: {', '.join(ENGINES)}")
+    if name == "process" or (name == "auto" and tesserocr is None):
+        return None
+    return TesserocrPool(pool_size)
+
+
+def set_engine(engine):
+    """Переключает движок для всех последующих вызовов; прежний пул закрывается"""
+    global _engine
+    old, _engine = _engine, engine
+    ENGINE_STATS.reset()
+    if old is not None and old is not engine:
+        old.close()
+
+
+def engine_name():
+    engine = _engine
+    if engine is None:
+        return "tesseract (процесс на вызов)"
+    return f"tesserocr (сеансов {engine.sessions()}, до {engine.size} на язык, загрузка {engine.init_time:.1f} с)"
+
+
+def _run_process(img, config, token=None):
+    """Запускает tesseract, передавая изображение через stdin и читая текст из stdout.
+
+    В отличие от pytesseract.image_to_string не создаёт временных файлов,
+    а процесс доступен токену отмены.
+    """
+    ok, png = cv2.imencode(".png", img)
+    if not ok:
+        raise ValueError("не удалось закодировать изображение")
+    cmd = [pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout"]
+    cmd += shlex.split(config, posix=sys.platform != "win32")
+    kwargs = pytesseract.pytesseract.subprocess_args()
+    if token is not None and token.thread_limit:
+        env = dict(kwargs.get("env") or os.environ)
+        env.setdefault("OMP_THREAD_LIMIT", str(token.thread_limit))
+        kwargs["env"] = env
+    try:
+        proc = subprocess.Popen(cmd, **kwargs)
+    except FileNotFoundError:
+        raise pytesseract.TesseractNotFoundError() from None
+    if token is not None:
+        token.attach(proc)
+    try:
+        out, err = proc.communicate(png.tobytes())
+    finally:
+        if token is not None:
+            token.detach(proc)
+    if token is not None:
+        token.check()
+    if proc.returncode:
+        raise pytesseract.TesseractError(proc.returncode, pytesseract.pytesseract.get_errors(err))
+    return out.decode("utf-8", errors="replace")
+
+
+def _call_engine(img, config, token=None, stats=None):
+    engine = _engine
+    if engine is not None:
+        return engine.run(img, config, token, stats)
+    start = time.perf_counter()
+    text = _run_process(img, config, token)
+    if stats is not None:
+        stats.add(time.perf_counter() - start)
+    return text
+
+
+def run_tesseract(img, config, token=None):
+    """Распознаёт изображение текущим движком: сеансом пула или отдельным процессом tesseract"""
+    with stage("tesseract"):
+        return _call_engine(img, config, token, ENGINE_STATS)
+
+
+def calibrate_engine(lang=DEFAULT_LANG):
+    """Замеряет накладные расходы одного вызова движка на пустом изображении (один раз на набор языков)"""
+    lang = lang or "eng"
+    if lang in ENGINE_STATS.overhead:
+        return ENGINE_STATS.overhead[lang]
+    blank = np.full((64, 256), 255, np.uint8)
+    times = []
+    # Процесс каждый раз загружает модели заново, у пула первый вызов может ещё создавать сеанс
+    for _ in range(2):
+        start = time.perf_counter()
+        _call_engine(blank, tesseract_config(lang))
+        times.append(time.perf_counter() - start)
+    with ENGINE_STATS.lock:
+        ENGINE_STATS.overhead[lang] = min(times)
+    return min(times)
+
+
+def engine_report():
+    """Строка со средним временем вызова и долей накладных расходов в нём"""
+    stats = ENGINE_STATS.summary()
+    report = f"{engine_name()}: вызовов {stats['calls']}, в среднем {stats['mean_ms']:.0f} мс"
+    if stats["overhead_ms"] is not None:
+        report += (f", из них накладные ~{stats['overhead_ms']:.0f} мс ({stats['overhead_share']:.0%}),"
+                   f" распознавание ~{stats['recognition_ms']:.0f} мс")
+    return report
+
+
+def recognize_structured(img, lang=DEFAULT_LANG, token=None, cache=None):
+    """Один прогон tesseract с выводом TSV: текст, рамки строк и слов, уверенность.
+
+    Возвращает (StructuredResult, бинаризованное изображение); при попадании
+    в кэш изображение — None.
+    """
+    config = tesseract_config(lang or "eng") + " tsv"
+    key = None
+    if cache is not None:
+        key = ocr_key(img, PREPROCESS, config)
+        tsv = cache.get(key)
+        if tsv is not None:
+            return StructuredResult(tsv), None
+
+    thresh = preprocess(img)
+    if token is not None:
+        token.check()
+    tsv = run_tesseract(thresh, config, token)
+    if cache is not None:
+        cache.put(key, tsv)
+    return StructuredResult(tsv), thresh
+
+
+def tesseract_region_config(lang, lines):
+    # Однострочный блок — режим одной строки, несколько строк — единый блок текста
+    return f'--oem 3 --psm {7 if lines == 1 else 6} -l {lang}'
+
+
+def recognize(img, lang=DEFAULT_LANG, token=None, cache=None):
+    """Распознаёт текст на изображении. Возвращает (текст, бинаризованное изображение).
+
+    Если передан кэш (ocr_cache.OcrCache) и результат в нём есть, ни бинаризация,
+    ни tesseract не выполняются — вместо изображения возвращается None.
+    """
+    config = tesseract_config(lang or "eng")
+    key = None
+    if cache is not None:
+        key = ocr_key(img, PREPROCESS, config)
+        text = cache.get(key)
+        if text is not None:
+            return text, None
+
+    thresh = preprocess(img)
+    if token is not None:
+        token.check()
+    text = run_tesseract(thresh, config, token)
+    if cache is not None:
+        cache.put(key, text)
+    return text, thresh
+
+
+def recognize_regions(img, lang=DEFAULT_LANG, token=None, cache=None, workers=None):
+    """Распознаёт только найденные текстовые блоки, параллельно, и собирает текст в порядке чтения.
+
+    Возвращает (текст, изображение с рамками блоков); при попадании в кэш —
+    (текст, None). Плотно заполненная текстом страница распознаётся целиком.
+    """
+    lang = lang or "eng"
+    key = None
+    if cache is not None:
+        key = ocr_key(img, REGIONS_PREPROCESS, tesseract_config(lang))
+        text = cache.get(key)
+        if text is not None:
+            return text, None
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    with stage("regions"):
+        regions = find_text_regions(gray)
+    text_area = sum(w * h for _, _, w, h, _ in regions)
+    if text_area > DENSE_PAGE_RATIO * gray.shape[0] * gray.shape[1]:
+        text, thresh = recognize(gray, lang, token)
+    else:
+        def recognize_region(region):
+            x, y, w, h, lines = region
+            if token is not None:
+                token.check()
+            crop = preprocess(gray[y:y + h, x:x + w])
+            return run_tesseract(crop, tesseract_region_config(lang, lines), token).strip()
+
+        with ThreadPoolExecutor(max(1, workers or os.cpu_count() or 1), thread_name_prefix="ocr-region") as pool:
+            texts = list(pool.map(recognize_region, regions))
+        text = "\n".join(t for t in texts if t)
+        thresh = draw_regions(gray, regions)
+
+    if cache is not None:
+        cache.put(key, text)
+    return text, thresh
@@ -0,0 +1,178 @@
+import os
+import shlex
+import sys
+import threading
+import time
+
+import numpy as np
+
+try:
+    import tesserocr
+except ImportError:  # необязательная зависимость: без неё tesseract запускается процессом на каждый вызов
+    tesserocr = None
+
+# Заголовок TSV: tesserocr отдаёт строки без него, а командная строка tesseract — с ним
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+
+def parse_config(config):
+    """Разбирает строку параметров tesseract: (языки, --oem, --psm, нужен ли вывод TSV)"""
+    args = shlex.split(config, posix=sys.platform != "win32")
+    lang, oem, psm, tsv = "eng", 3, 3, False
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("-l", "--oem", "--psm") and i + 1 < len(args):
+            value = args[i + 1]
+            if arg == "-l":
+                lang = value
+            elif arg == "--oem":
+                oem = int(value)
+            else:
+                psm = int(value)
+            i += 2
+            continue
+        if arg == "tsv":
+            tsv = True
+        i += 1
+    return lang, oem, psm, tsv
+
+
+class TesserocrPool:
+    """Пул долгоживущих сеансов tesseract (tesserocr) для каждого набора языков.
+
+    Языковые модели загружаются один раз при создании сеанса, изображение
+    передаётся из памяти без кодирования в PNG и без запуска процесса.
+    Для набора языков создаётся не больше size сеансов, каждый сеанс
+    одновременно занят одним потоком; на время распознавания tesserocr
+    отпускает GIL, поэтому сеансы работают параллельно.
+    Прервать уже идущее распознавание нельзя — отмена срабатывает между вызовами.
+    """
+
+    def __init__(self, size=None, datapath=None):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr не установлен")
+        self.size = max(1, size or os.cpu_count() or 1)
+        self.datapath = datapath
+        self.cond = threading.Condition()
+        self.idle = {}  # (языки, oem) -> свободные сеансы
+        self.created = {}  # (языки, oem) -> число созданных сеансов
+        self.init_time = 0.0
+        self.closed = False
+
+    def _acquire(self, key):
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise RuntimeError("пул сеансов tesseract закрыт")
+                idle = self.idle.setdefault(key, [])
+                if idle:
+                    return idle.pop()
+                if self.created.get(key, 0) < self.size:
+                    self.created[key] = self.created.get(key, 0) + 1
+                    break
+                self.cond.wait()
+
+        # Модели загружаются вне блокировки — остальные потоки в это время работают со своими сеансами
+        start = time.perf_counter()
+        try:
+            kwargs = {"lang": key[0], "oem": key[1]}
+            if self.datapath:
+                kwargs["path"] = self.datapath
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+        except Exception:
+            with self.cond:
+                self.created[key] -= 1
+                self.cond.notify()
+            raise
+        with self.cond:
+            self.init_time += time.perf_counter() - start
+        return api
+
+    def _release(self, key, api):
+        with self.cond:
+            if self.closed:
+                api.End()
+            else:
+                self.idle[key].append(api)
+            self.cond.notify()
+
+    def run(self, img, config, token=None, stats=None):
+        """Распознаёт изображение в свободном сеансе; возвращает текст или TSV, как командная строка.
+
+        В stats (EngineStats) записывается время вызова без ожидания и создания сеанса.
+        """
+        lang, oem, psm, tsv = parse_config(config)
+        key = (lang, oem)
+        api = self._acquire(key)
+        start = time.perf_counter()
+        try:
+            if token is not None:
+                token.check()
+            img = np.ascontiguousarray(img)
+            h, w = img.shape[:2]
+            bpp = 1 if img.ndim == 2 else img.shape[2]
+            api.SetPageSegMode(psm)
+            api.SetImageBytes(img.tobytes(), w, h, bpp, w * bpp)
+            text = TSV_HEADER + api.GetTSVText(0) if tsv else api.GetUTF8Text()
+            api.Clear()
+        finally:
+            self._release(key, api)
+        if stats is not None:
+            stats.add(time.perf_counter() - start)
+        if token is not None:
+            token.check()
+        return text
+
+    def sessions(self):
+        with self.cond:
+            return sum(self.created.values())
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            for sessions in self.idle.values():
+                for api in sessions:
+                    api.End()
+            self.idle.clear()
+            self.cond.notify_all()
+
+
+class EngineStats:
+    """Время вызовов tesseract и оценка накладных расходов на один вызов.
+
+    Накладные расходы измеряются распознаванием пустого изображения: для процесса
+    это запуск и загрузка языковых моделей, для сеанса пула — передача изображения
+    и анализ пустой страницы. Остальное время вызова — само распознавание.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.total = 0.0
+        self.overhead = {}  # языки -> секунды на пустой вызов
+
+    def add(self, seconds):
+        with self.lock:
+            self.calls += 1
+            self.total += seconds
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.total = 0.0
+            self.overhead.clear()
+
+    def summary(self):
+        """{'calls', 'mean_ms', 'overhead_ms', 'recognition_ms', 'overhead_share'}; без калибровки накладные — None"""
+        with self.lock:
+            calls, total = self.calls, self.total
+            overheads = list(self.overhead.values())
+        mean = total / calls if calls else 0.0
+        data = {"calls": calls, "mean_ms": mean * 1000.0, "overhead_ms": None, "recognition_ms": None,
+                "overhead_share": None}
+        if overheads and calls:
+            overhead = min(sum(overheads) / len(overheads), mean)
+            data.update(overhead_ms=overhead * 1000.0, recognition_ms=(mean - overhead) * 1000.0,
+                        overhead_share=overhead / mean if mean > 0 else 0.0)
+        return data
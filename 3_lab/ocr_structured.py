@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+from html import escape
+
+import cv2
+
+# Уровни элементов в TSV-выводе tesseract
+LEVEL_PAGE, LEVEL_BLOCK, LEVEL_PAR, LEVEL_LINE, LEVEL_WORD = 1, 2, 3, 4, 5
+EXPORT_FORMATS = ("txt", "tsv", "hocr", "json")
+
+
+class OcrElement:
+    """Элемент страницы из TSV tesseract: блок, абзац, строка или слово"""
+
+    def __init__(self, level, ids, box, conf=-1.0, text=""):
+        self.level = level
+        self.ids = ids  # (block_num, par_num, line_num, word_num)
+        self.box = box  # (x, y, w, h)
+        self.conf = conf
+        self.text = text
+        self.children = []
+
+    def bbox(self):
+        x, y, w, h = self.box
+        return x, y, x + w, y + h
+
+    def to_dict(self):
+        data = {"box": list(self.box)}
+        if self.level == LEVEL_WORD:
+            data["text"] = self.text
+            data["conf"] = self.conf
+        else:
+            key = {LEVEL_BLOCK: "paragraphs", LEVEL_PAR: "lines", LEVEL_LINE: "words"}[self.level]
+            data[key] = [child.to_dict() for child in self.children]
+        return data
+
+
+class StructuredResult:
+    """Результат одного прогона tesseract в формате TSV: текст, рамки и уверенность.
+
+    Обычный текст, JSON и hOCR строятся из того же TSV, поэтому повторно
+    запускать tesseract для координат не нужно.
+    """
+
+    def __init__(self, tsv):
+        self.tsv = tsv
+        self.width = self.height = 0
+        self.blocks = []
+        self._parse(tsv)
+
+    def _parse(self, tsv):
+        parents = {}
+        for row in csv.DictReader(io.StringIO(tsv), delimiter="\t", quoting=csv.QUOTE_NONE):
+            try:
+                level = int(row["level"])
+                ids = tuple(int(row[k]) for k in ("block_num", "par_num", "line_num", "word_num"))
+                box = tuple(int(row[k]) for k in ("left", "top", "width", "height"))
+                conf = float(row["conf"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if level == LEVEL_PAGE:
+                self.width, self.height = box[2], box[3]
+                continue
+            text = (row.get("text") or "").strip()
+            if level == LEVEL_WORD and not text:
+                continue
+            element = OcrElement(level, ids, box, conf, text)
+            # Родитель определяется по номерам блока/абзаца/строки на уровень выше
+            parent = parents.get((level - 1,) + ids[:level - 2])
+            if level == LEVEL_BLOCK:
+                self.blocks.append(element)
+            elif parent is not None:
+                parent.children.append(element)
+            parents[(level,) + ids[:level - 1]] = element
+
+    def iter_level(self, level):
+        stack = list(reversed(self.blocks))
+        while stack:
+            element = stack.pop()
+            if element.level == level:
+                yield element
+            elif element.level < level:
+                stack.extend(reversed(element.children))
+
+    @property
+    def words(self):
+        return list(self.iter_level(LEVEL_WORD))
+
+    @property
+    def lines(self):
+        return [line for line in self.iter_level(LEVEL_LINE) if line.children]
+
+    @property
+    def text(self):
+        """Текст как у image_to_string: слова строки через пробел, абзацы через пустую строку"""
+        paragraphs = []
+        for par in self.iter_level(LEVEL_PAR):
+            lines = [" ".join(w.text for w in line.children) for line in par.children if line.children]
+            if lines:
+                paragraphs.append("\n".join(lines))
+        return "\n\n".join(paragraphs)
+
+    def to_dict(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "text": self.text,
+            "blocks": [block.to_dict() for block in self.blocks],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def to_hocr(self):
+        classes = {LEVEL_BLOCK: ("div", "ocr_carea", "block"), LEVEL_PAR: ("p", "ocr_par", "par"),
+                   LEVEL_LINE: ("span", "ocr_line", "line"), LEVEL_WORD: ("span", "ocrx_word", "word")}
+        out = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"'
+            ' "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">',
+            '<html xmlns="http://www.w3.org/1999/xhtml">',
+            ' <head>',
+            '  <meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>',
+            "  <meta name='ocr-system' content='tesseract'/>",
+            "  <meta name='ocr-capabilities' content='ocr_page ocr_carea ocr_par ocr_line ocrx_word'/>",
+            ' </head>',
+            ' <body>',
+            f"  <div class='ocr_page' id='page_1' title='bbox 0 0 {self.width} {self.height}'>",
+        ]
+        counters = {}
+
+        def emit(element, depth):
+            tag, cls, prefix = classes[element.level]
+            counters[prefix] = counters.get(prefix, 0) + 1
+            title = "bbox %d %d %d %d" % element.bbox()
+            indent = " " * (depth + 3)
+            if element.level == LEVEL_WORD:
+                title += f"; x_wconf {int(round(element.conf))}"
+                out.append(f"{indent}<{tag} class='{cls}' id='{prefix}_1_{counters[prefix]}' title='{title}'>"
+                           f"{escape(element.text)}</{tag}>")
+                return
+            out.append(f"{indent}<{tag} class='{cls}' id='{prefix}_1_{counters[prefix]}' title='{title}'>")
+            for child in element.children:
+                emit(child, depth + 1)
+            out.append(f"{indent}</{tag}>")
+
+        for block in self.blocks:
+            emit(block, 0)
+        out += ["  </div>", " </body>", "</html>", ""]
+        return "\n".join(out)
+
+    def export(self, fmt):
+        """Текст результата в формате txt, tsv, hocr или json"""
+        if fmt == "txt":
+            return self.text
+        if fmt == "tsv":
+            return self.tsv
+        if fmt == "hocr":
+            return self.to_hocr()
+        if fmt == "json":
+            return self.to_json()
+        raise ValueError(f"Неизвестный формат: {fmt}. Доступны: {', '.join(EXPORT_FORMATS)}")
+
+
+def confidence_color(conf):
+    """Цвет рамки слова (BGR): от красного при низкой уверенности к зелёному при высокой"""
+    t = min(max(conf, 0.0), 100.0) / 100.0
+    return 0, int(255 * t), int(255 * (1.0 - t))
+
+
+def draw_words(img, result):
+    """Рамки слов поверх изображения, цвет — по уверенности распознавания"""
+    vis = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img.copy()
+    thickness = max(1, min(vis.shape[:2]) // 600)
+    for word in result.words:
+        x0, y0, x1, y1 = word.bbox()
+        cv2.rectangle(vis, (x0, y0), (x1, y1), confidence_color(word.conf), thickness)
+    return vis
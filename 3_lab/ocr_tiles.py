@@ -0,0 +1,264 @@
+import hashlib
+import os
+import struct
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from ocr_cache import digest_key, ocr_key
+from ocr_engine import DEFAULT_LANG, run_tesseract, stage, tesseract_config
+
+# Изображения больше этого числа пикселей открываются в режиме полос
+LARGE_IMAGE_PIXELS = 40_000_000
+# Наибольшая сторона предпросмотра, пикселей
+PREVIEW_MAX_SIDE = 4000
+# Высота полосы для распознавания, пикселей полного разрешения
+STRIP_HEIGHT = 2048
+# Строк за одно чтение при построении предпросмотра несжатого TIFF
+PREVIEW_READ_ROWS = 512
+TILED_PREPROCESS = "strips|gray+otsu(preview)"
+
+REDUCED_COLOR = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+REDUCED_GRAYSCALE = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                     8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+# Байт на пиксель в несжатых полосах TIFF, которые читаются по частям
+RAW_PIXEL_BYTES = {"L": 1, "RGB": 3, "RGBA": 4, "RGBX": 4}
+
+
+def _open_header(path):
+    """Изображение PIL с разобранным заголовком (формат, размер, раскладка данных); пиксели не читаются.
+
+    Защита PIL от «бомб» декомпрессии срабатывает при открытии по числу
+    пикселей, хотя здесь пиксели не читаются; её предупреждение и ошибка
+    перехватываются только в этом вызове, глобальный предел PIL не меняется.
+    Файл к возврату уже закрыт.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            with Image.open(path) as im:
+                return im
+        except Image.DecompressionBombError:
+            pass
+    # Больше двойного предела: заголовок разбирается модулем формата напрямую, без проверки размера
+    Image.init()
+    with open(path, "rb") as f:
+        prefix = f.read(16)
+        for fmt in Image.ID:
+            factory, accept = Image.OPEN[fmt]
+            result = accept(prefix) if accept is not None else True
+            if not result or isinstance(result, str):
+                continue
+            f.seek(0)
+            try:
+                return factory(f, path)
+            except (SyntaxError, IndexError, TypeError, struct.error):
+                continue
+    raise OSError(f"неизвестный формат изображения: {path}")
+
+
+def image_header(path):
+    """(формат, ширина, высота) из заголовка файла, без декодирования пикселей"""
+    im = _open_header(path)
+    return (im.format, *im.size)
+
+
+def image_size(path):
+    """(ширина, высота) из заголовка файла, без декодирования пикселей"""
+    return image_header(path)[1:]
+
+
+def _row_bytes(rawmode, width):
+    if rawmode in ("1", "1;I"):
+        return (width + 7) // 8
+    if rawmode in RAW_PIXEL_BYTES:
+        return RAW_PIXEL_BYTES[rawmode] * width
+    return None
+
+
+def tiff_strips(path):
+    """Чтение несжатого TIFF по строкам: (ширина, высота, read_rows) или None.
+
+    read_rows(y0, y1) читает с диска только строки y0..y1 и возвращает их
+    в оттенках серого; раскладку полос (смещения, формат пикселей) разбирает PIL.
+    Сжатые TIFF (LZW, Deflate, CCITT) PIL распаковывает только целиком,
+    для них и для остальных форматов возвращается None.
+    """
+    try:
+        im = _open_header(path)
+    except OSError:
+        return None
+    if im.format != "TIFF" or not im.tile:
+        return None
+    w, h = im.size
+    strips = []
+    for codec, (x0, y0, x1, y1), offset, args in im.tile:
+        if codec != "raw" or x0 != 0 or x1 != w:
+            return None
+        rawmode, stride, ystep = args
+        row_bytes = stride or _row_bytes(rawmode, w)
+        if ystep != 1 or row_bytes is None:
+            return None
+        strips.append((y0, y1, offset, rawmode, row_bytes))
+
+    def read_rows(top, bottom):
+        parts = []
+        with open(path, "rb") as f:
+            for y0, y1, offset, rawmode, row_bytes in strips:
+                a, b = max(top, y0), min(bottom, y1)
+                if a >= b:
+                    continue
+                f.seek(offset + (a - y0) * row_bytes)
+                data = f.read((b - a) * row_bytes)
+                if rawmode == "L":
+                    parts.append(np.frombuffer(data, np.uint8).reshape(b - a, row_bytes)[:, :w])
+                else:
+                    part = Image.frombytes(im.mode, (w, b - a), data, "raw", rawmode)
+                    parts.append(np.asarray(part.convert("L")))
+        if not parts:
+            raise ValueError("не удалось прочитать строки изображения")
+        return parts[0] if len(parts) == 1 else np.vstack(parts)
+
+    return w, h, read_rows
+
+
+def _strip_preview(w, h, read_rows, factor):
+    """Серый предпросмотр и хэш полного изображения (как у image_hash) за один проход по полосам"""
+    digest = hashlib.sha1()
+    digest.update(str((h, w)).encode())
+    digest.update(b"uint8")
+    step = max(factor, PREVIEW_READ_ROWS // factor * factor)
+    rows = []
+    for y0 in range(0, h, step):
+        strip = read_rows(y0, min(h, y0 + step))
+        digest.update(np.ascontiguousarray(strip))
+        if factor == 1:
+            rows.append(strip)
+        elif strip.shape[0] >= factor:
+            rows.append(cv2.resize(strip, (w // factor, strip.shape[0] // factor), interpolation=cv2.INTER_AREA))
+    return np.vstack(rows), digest.hexdigest()
+
+
+def is_large_image(path):
+    try:
+        w, h = image_size(path)
+    except OSError:
+        return False
+    return w * h > LARGE_IMAGE_PIXELS
+
+
+def preview_factor(w, h, max_side=PREVIEW_MAX_SIDE):
+    """Коэффициент уменьшения предпросмотра: 1, 2, 4 или 8"""
+    factor = 1
+    while factor < 8 and max(w, h) / factor > max_side:
+        factor *= 2
+    return factor
+
+
+def load_preview(path, max_side=PREVIEW_MAX_SIDE):
+    """Уменьшенная копия для показа. Возвращает (изображение BGR, коэффициент уменьшения).
+
+    Только JPEG декодер OpenCV умеет сразу читать в 2, 4 или 8 раз меньше
+    (IMREAD_REDUCED_*): тогда в памяти лишь предпросмотр. Несжатый TIFF
+    читается по полосам (tiff_strips). Остальные PNG и TIFF декодируются
+    в полном разрешении и затем уменьшаются, поэтому предпросмотр строится
+    из серого декодирования (IMREAD_REDUCED_GRAYSCALE_*): пик — около одной
+    полной серой плоскости (1 байт на пиксель) вместо трёх байт на пиксель у цветного.
+    """
+    fmt, w, h = image_header(path)
+    factor = preview_factor(w, h, max_side)
+    if factor == 1:
+        return cv2.imread(path), factor
+    if fmt == "JPEG":
+        return cv2.imread(path, REDUCED_COLOR[factor]), factor
+    strips = tiff_strips(path) if fmt == "TIFF" else None
+    if strips is not None:
+        preview, _ = _strip_preview(*strips, factor)
+        return cv2.cvtColor(preview, cv2.COLOR_GRAY2BGR), factor
+    img = cv2.imread(path, REDUCED_GRAYSCALE[factor])
+    return (None if img is None else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)), factor
+
+
+def strip_bounds(preview_gray, factor, full_height, threshold, strip_height=STRIP_HEIGHT):
+    """Границы полос [(y0, y1)] в пикселях полного разрешения.
+
+    Каждая граница ставится в строку предпросмотра с наименьшим количеством
+    тёмных пикселей рядом с номинальным положением — в промежуток между
+    строками текста, чтобы строки не разрезались и склейка сводилась
+    к объединению текста полос.
+    """
+    ink = np.count_nonzero(preview_gray < threshold, axis=1)
+    step = max(1, strip_height // factor)
+    window = step // 4
+    cuts = [0]
+    nominal = step
+    while nominal < len(ink) - window:
+        lo, hi = nominal - window, nominal + window
+        cut = lo + int(np.argmin(ink[lo:hi]))
+        cuts.append(cut)
+        nominal = cut + step
+    bounds = [min(full_height, c * factor) for c in cuts] + [full_height]
+    return [(y0, y1) for y0, y1 in zip(bounds[:-1], bounds[1:]) if y1 > y0]
+
+
+def recognize_tiled(path, lang=DEFAULT_LANG, token=None, cache=None, workers=None, strip_height=STRIP_HEIGHT):
+    """Распознаёт большое изображение по горизонтальным полосам.
+
+    Несжатый TIFF читается с диска по полосам (tiff_strips): первый проход
+    строит предпросмотр и хэш для кэша, при распознавании каждая полоса
+    читается заново, и в памяти одновременно не больше workers полос.
+    Остальные форматы декодируются один раз в оттенках серого (1 байт на пиксель,
+    без цветной копии; во время декодирования PNG/TIFF пик около двух байт
+    на пиксель), предпросмотр для порога и границ полос уменьшается из той же
+    плоскости. Бинаризуется и передаётся в tesseract только полоса,
+    одновременно — не больше workers полос. Порог Оцу считается по предпросмотру,
+    поэтому он одинаков для всех полос. Возвращает (текст, бинаризованный предпросмотр).
+    """
+    lang = lang or "eng"
+    config = tesseract_config(lang)
+    strips = tiff_strips(path)
+    if strips is not None:
+        w, h, read_rows = strips
+        factor = preview_factor(w, h)
+        with stage("decode"):
+            preview_gray, digest = _strip_preview(w, h, read_rows, factor)
+        key = digest_key(digest, TILED_PREPROCESS, config)
+    else:
+        with stage("decode"):
+            gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError("не удалось прочитать изображение")
+        h, w = gray.shape
+        factor = preview_factor(w, h)
+        preview_gray = cv2.resize(gray, (w // factor, h // factor), interpolation=cv2.INTER_AREA) if factor > 1 else gray
+        key = ocr_key(gray, TILED_PREPROCESS, config) if cache is not None else None
+
+        def read_rows(y0, y1):
+            return gray[y0:y1]
+    threshold, preview_thresh = cv2.threshold(preview_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    if cache is not None:
+        text = cache.get(key)
+        if text is not None:
+            return text, preview_thresh
+
+    def recognize_strip(bounds):
+        if token is not None:
+            token.check()
+        y0, y1 = bounds
+        rows = read_rows(y0, y1)
+        with stage("threshold"):
+            _, strip = cv2.threshold(rows, threshold, 255, cv2.THRESH_BINARY)
+        return run_tesseract(strip, config, token).strip()
+
+    bounds = strip_bounds(preview_gray, factor, h, threshold, strip_height)
+    with ThreadPoolExecutor(max(1, workers or os.cpu_count() or 1), thread_name_prefix="ocr-strip") as pool:
+        texts = list(pool.map(recognize_strip, bounds))
+    text = "\n".join(t for t in texts if t)
+
+    if cache is not None:
+        cache.put(key, text)
+    return text, preview_thresh
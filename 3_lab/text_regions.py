@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+
+
+def estimate_char_height(edges, min_height=5):
+    """Медианная высота связных компонент карты границ — приблизительная высота букв"""
+    _, _, stats, _ = cv2.connectedComponentsWithStats(edges, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = heights[(heights >= min_height) & (heights < edges.shape[0] // 4) & (widths < heights * 4)]
+    return float(np.median(heights)) if len(heights) else 12.0
+
+
+def find_text_lines(gray, min_height=6, min_width=10, min_fill=0.15):
+    """Рамки строк текста (x, y, w, h): морфологический градиент + замыкание по горизонтали.
+
+    Размер ядра замыкания берётся от оценки высоты букв, поэтому одинаково
+    работает на фотографии и на скане любого разрешения.
+    """
+    h, w = gray.shape[:2]
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    char_h = estimate_char_height(edges)
+    # Соседние буквы и слова склеиваются в одну строку, соседние строки — нет
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, int(char_h * 1.2)), max(1, int(char_h * 0.15))))
+    closed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    lines = []
+    for contour in contours:
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if ch < min_height or cw < min_width or ch > h // 2:
+            continue
+        # У текста заметная, но не сплошная плотность границ; длинные тонкие линии и пятна отбрасываются
+        fill = cv2.countNonZero(edges[y:y + ch, x:x + cw]) / float(cw * ch)
+        if fill < min_fill or cw < ch * 0.5:
+            continue
+        lines.append((x, y, cw, ch))
+    return lines
+
+
+def group_blocks(lines, gap_ratio=1.0):
+    """Объединяет строки в блоки (абзацы): следующая строка ниже не дальше gap_ratio * высоты
+    строки и перекрывается с блоком по горизонтали. Возвращает [(x, y, w, h, число строк)]"""
+    blocks = []
+    for x, y, w, h in sorted(lines, key=lambda r: r[1]):
+        for block in blocks:
+            bx0, by0, bx1, by1, _ = block
+            overlap = min(bx1, x + w) - max(bx0, x)
+            if overlap > 0 and y <= by1 + gap_ratio * h:
+                block[0], block[1] = min(bx0, x), min(by0, y)
+                block[2], block[3] = max(bx1, x + w), max(by1, y + h)
+                block[4] += 1
+                break
+        else:
+            blocks.append([x, y, x + w, y + h, 1])
+    return [(x0, y0, x1 - x0, y1 - y0, n) for x0, y0, x1, y1, n in merge_overlapping(blocks)]
+
+
+def merge_overlapping(blocks):
+    """Сливает пересекающиеся блоки [x0, y0, x1, y1, n], пока пересечений не останется"""
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for block in blocks:
+            for other in result:
+                if block[0] < other[2] and other[0] < block[2] and block[1] < other[3] and other[1] < block[3]:
+                    other[0], other[1] = min(other[0], block[0]), min(other[1], block[1])
+                    other[2], other[3] = max(other[2], block[2]), max(other[3], block[3])
+                    other[4] += block[4]
+                    merged = True
+                    break
+            else:
+                result.append(block)
+        blocks = result
+    return blocks
+
+
+def reading_order(blocks):
+    """Сортирует блоки сверху вниз, а блоки на одной высоте — слева направо"""
+    rows = []
+    for block in sorted(blocks, key=lambda b: b[1]):
+        y, h = block[1], block[3]
+        for row in rows:
+            # Один ряд — если вертикальные интервалы перекрываются хотя бы на половину меньшего
+            overlap = min(row["y1"], y + h) - max(row["y0"], y)
+            if overlap > 0.5 * min(h, row["y1"] - row["y0"]):
+                row["blocks"].append(block)
+                row["y0"], row["y1"] = min(row["y0"], y), max(row["y1"], y + h)
+                break
+        else:
+            rows.append({"y0": y, "y1": y + h, "blocks": [block]})
+    rows.sort(key=lambda r: r["y0"])
+    return [block for row in rows for block in sorted(row["blocks"], key=lambda b: b[0])]
+
+
+def pad_box(box, shape, ratio=0.15):
+    """Расширяет рамку на долю высоты строки — tesseract плохо читает буквы у самого края"""
+    x, y, w, h = box[:4]
+    lines = box[4] if len(box) > 4 else 1
+    pad = max(2, int(h / lines * ratio))
+    img_h, img_w = shape[:2]
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(img_w, x + w + pad), min(img_h, y + h + pad)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def find_text_regions(gray):
+    """Текстовые блоки в порядке чтения: [(x, y, w, h, число строк)] с отступами"""
+    blocks = reading_order(group_blocks(find_text_lines(gray)))
+    return [pad_box(b, gray.shape) + (b[4],) for b in blocks]
+
+
+def draw_regions(gray, regions):
+    """Изображение для просмотра: рамки найденных блоков поверх исходного"""
+    vis = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    for i, (x, y, w, h, _) in enumerate(regions):
+        cv2.rectangle(vis, (x, y), (x + w, y + h), (0, 0, 255), 2)
+        cv2.putText(vis, str(i + 1), (x, max(12, y - 4)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    return vis
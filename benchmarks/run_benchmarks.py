@@ -0,0 +1,356 @@
+"""Воспроизводимые замеры производительности трёх лабораторных без камеры и экрана.
+
+Для каждого конвейера генерируются синтетические данные (см. synthetic.py),
+замеряется время каждого этапа, считаются перцентили и пропускная
+способность. Результат сохраняется в JSON и может сравниваться с базовым:
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --baseline bench.json --tolerance 0.15
+
+При сравнении код возврата 1 означает, что медиана какого-либо этапа
+выросла больше чем на tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+
+import cv2
+import numpy as np
+
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "3_lab"))
+sys.path.insert(0, os.path.join(ROOT, "2_lab"))
+sys.path.insert(0, os.path.join(ROOT, "1_lab"))
+
+from object_matching import MatchResult, TemplateModel, draw_match, object_corners, ratio_test  # noqa: E402
+from feature_backends import FLANN_SEARCH_PARAMS  # noqa: E402
+from face_backends import BACKENDS as FACE_BACKENDS  # noqa: E402
+from face_detection import FaceEyeDetector, draw_detections  # noqa: E402
+
+
+class StageTimer:
+    """Собирает длительности именованных этапов по всем кадрам"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+    def summary(self, frames, wall_time):
+        stages = {}
+        for name, values in self.samples.items():
+            ms = np.array(values) * 1000.0
+            stages[name] = {
+                "count": len(ms),
+                "mean_ms": round(float(ms.mean()), 4),
+                "p50_ms": round(float(np.percentile(ms, 50)), 4),
+                "p90_ms": round(float(np.percentile(ms, 90)), 4),
+                "p99_ms": round(float(np.percentile(ms, 99)), 4),
+            }
+        return {
+            "frames": frames,
+            "wall_s": round(wall_time, 4),
+            "throughput_fps": round(frames / wall_time, 3) if wall_time > 0 else 0.0,
+            "stages": stages,
+        }
+
+
+def bench_matching(args):
+    template, scenes = synthetic.matching_scenes(args.frames, args.height, args.width, seed=args.seed)
+    model = TemplateModel.from_image(template, backend=args.backend)
+    timer = StageTimer()
+    errors = []
+
+    start = time.perf_counter()
+    for scene, H_true in scenes:
+        with timer.stage("total"):
+            with timer.stage("grayscale"):
+                gray = cv2.cvtColor(scene, cv2.COLOR_BGR2GRAY)
+            with timer.stage("detectAndCompute"):
+                keypoints, descriptors = model.detector.detectAndCompute(gray, None)
+            if descriptors is None or len(descriptors) < 2:
+                continue
+            with timer.stage("knnMatch"):
+                indices, dists = model.index.knnSearch(descriptors, 2, params=FLANN_SEARCH_PARAMS)
+            with timer.stage("ratio_test"):
+                query_idx, train_idx = ratio_test(indices, dists, model.backend.ratio_threshold(0.75))
+                src = model.points[train_idx].reshape(-1, 1, 2)
+                dst = cv2.KeyPoint_convert(keypoints)[query_idx].reshape(-1, 1, 2)
+            if len(src) < 4:
+                continue
+            with timer.stage("homography"):
+                M, mask = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+            if M is None:
+                continue
+            with timer.stage("render"):
+                result = MatchResult(M, object_corners(model.shape, M), dst.reshape(-1, 2)[mask.ravel() > 0])
+                draw_match(scene.copy(), result)
+        # Точность: среднее отклонение углов от истинных, пикс.
+        errors.append(float(np.abs(object_corners(model.shape, M) - object_corners(model.shape, H_true)).mean()))
+    wall = time.perf_counter() - start
+
+    summary = timer.summary(len(scenes), wall)
+    summary["found"] = len(errors)
+    summary["corner_error_px"] = round(float(np.median(errors)), 3) if errors else None
+    return summary
+
+
+# Время каскадов Хаара зависит от содержимого кадра, поэтому лица замеряются только на настоящих кадрах
+NO_FACE_SOURCE = "нужны кадры с лицами: --face-source <каталог фотографий или видеозапись>"
+
+
+def bench_faces(args):
+    if not args.face_source:
+        return {"skipped": NO_FACE_SOURCE}
+    frames = synthetic.face_frames(args.frames, args.face_source, args.height, args.width)
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
+    timer = StageTimer()
+    faces_total = 0
+
+    start = time.perf_counter()
+    for frame in frames:
+        with timer.stage("total"):
+            with timer.stage("grayscale"):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            with timer.stage("cascade_face"):
+                faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+            eyes_per_face = []
+            with timer.stage("cascade_eye"):
+                for (x, y, w, h) in faces:
+                    eyes_per_face.append(eye_cascade.detectMultiScale(gray[y:y + h, x:x + w], scaleFactor=1.1,
+                                                                      minNeighbors=5, minSize=(10, 10)))
+            with timer.stage("render"):
+                out = frame.copy()
+                for (x, y, w, h), eyes in zip(faces, eyes_per_face):
+                    cv2.rectangle(out, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                    for (ex, ey, ew, eh) in eyes:
+                        cv2.rectangle(out, (x + ex, y + ey), (x + ex + ew, y + ey + eh), (0, 255, 0), 2)
+                cv2.cvtColor(out, cv2.COLOR_BGR2RGB)  # как перед выводом в Tk
+        faces_total += len(faces)
+    wall = time.perf_counter() - start
+
+    summary = timer.summary(len(frames), wall)
+    summary["faces"] = faces_total
+    summary["source"] = args.face_source
+    return summary
+
+
+def bench_face_backend(backend, args):
+    """Лица и глаза через FaceEyeDetector с заданным детектором, кадры подаются пакетами по --face-batch"""
+    if not FACE_BACKENDS[backend].available(args.face_models):
+        return {"skipped": f"нет файлов модели {backend} (см. --face-models)"}
+    if not args.face_source:
+        return {"skipped": NO_FACE_SOURCE}
+    frames = synthetic.face_frames(args.frames, args.face_source, args.height, args.width)
+    detector = FaceEyeDetector(backend=backend, model_dir=args.face_models)
+    batch = max(1, args.face_batch)
+    timer = StageTimer()
+    faces_total = 0
+
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch):
+        chunk = frames[i:i + batch]
+        with timer.stage("detect"):
+            results = detector.detect_batch(chunk)
+        with timer.stage("render"):
+            for frame, detections in zip(chunk, results):
+                draw_detections(frame.copy(), detections)
+        faces_total += sum(len(detections) for detections in results)
+    wall = time.perf_counter() - start
+
+    summary = timer.summary(len(frames), wall)
+    summary["faces"] = faces_total
+    summary["batch"] = batch
+    summary["latency_ms"] = round(wall / len(frames) * 1000.0, 4) if frames else None
+    summary["source"] = args.face_source
+    return summary
+
+
+def bench_ocr(args):
+    try:
+        import pytesseract
+    except ImportError:
+        return {"skipped": "pytesseract не установлен"}
+
+    pages = synthetic.text_pages(max(1, args.frames // 10), seed=args.seed)
+    timer = StageTimer()
+    words_ok = words_total = 0
+
+    start = time.perf_counter()
+    for page, lines in pages:
+        with timer.stage("total"):
+            with timer.stage("grayscale"):
+                gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+            with timer.stage("threshold"):
+                _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            try:
+                with timer.stage("tesseract"):
+                    text = pytesseract.image_to_string(thresh, config="--oem 3 --psm 6 -l eng")
+            except pytesseract.TesseractNotFoundError:
+                return {"skipped": "tesseract не найден"}
+        expected = " ".join(lines).split()
+        recognized = set(text.split())
+        words_total += len(expected)
+        words_ok += sum(1 for w in expected if w in recognized)
+    wall = time.perf_counter() - start
+
+    summary = timer.summary(len(pages), wall)
+    summary["word_recall"] = round(words_ok / words_total, 4) if words_total else None
+    return summary
+
+
+def bench_ocr_engine(engine, args):
+    """Те же страницы через слой ocr_engine: процесс на вызов или пул сеансов tesserocr"""
+    try:
+        import ocr_engine
+        import pytesseract
+    except ImportError:
+        return {"skipped": "pytesseract не установлен"}
+    try:
+        ocr_engine.set_engine(ocr_engine.create_engine(engine, 1))
+    except RuntimeError as e:
+        return {"skipped": str(e)}
+
+    pages = synthetic.text_pages(max(1, args.frames // 10), seed=args.seed)
+    timer = StageTimer()
+    try:
+        start = time.perf_counter()
+        for page, _ in pages:
+            with timer.stage("total"):
+                with timer.stage("threshold"):
+                    thresh = ocr_engine.preprocess(page)
+                with timer.stage("tesseract"):
+                    ocr_engine.run_tesseract(thresh, ocr_engine.tesseract_config("eng"))
+        wall = time.perf_counter() - start
+        ocr_engine.calibrate_engine("eng")
+    except pytesseract.TesseractNotFoundError:
+        ocr_engine.set_engine(None)
+        return {"skipped": "tesseract не найден"}
+    except RuntimeError as e:
+        # tesserocr не нашёл языковые модели (tessdata)
+        ocr_engine.set_engine(None)
+        return {"skipped": str(e)}
+    stats = ocr_engine.ENGINE_STATS.summary()
+    ocr_engine.set_engine(None)
+
+    summary = timer.summary(len(pages), wall)
+    summary["engine"] = engine
+    summary["call_overhead_ms"] = round(stats["overhead_ms"], 4)
+    summary["call_recognition_ms"] = round(stats["recognition_ms"], 4)
+    return summary
+
+
+BENCHMARKS = {
+    "matching": bench_matching,
+    "faces": bench_faces,
+    "ocr": bench_ocr,
+    "ocr_process": partial(bench_ocr_engine, "process"),
+    "ocr_tesserocr": partial(bench_ocr_engine, "tesserocr"),
+}
+# Один и тот же конвейер FaceEyeDetector для каждого детектора лиц — для сравнения между собой
+BENCHMARKS.update({f"faces_{name}": partial(bench_face_backend, name) for name in FACE_BACKENDS})
+
+
+def compare(results, baseline, tolerance):
+    """Сравнивает медианы этапов с базовыми. Возвращает список регрессий"""
+    regressions = []
+    for bench, data in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(bench, {})
+        for stage, stats in data.get("stages", {}).items():
+            base_stats = base.get("stages", {}).get(stage)
+            if not base_stats or base_stats["p50_ms"] <= 0:
+                continue
+            change = stats["p50_ms"] / base_stats["p50_ms"] - 1.0
+            line = f"{bench}.{stage}: {base_stats['p50_ms']:.3f} -> {stats['p50_ms']:.3f} мс ({change:+.1%})"
+            print(line)
+            if change > tolerance:
+                regressions.append(line)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности лабораторных на синтетических данных")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="какие конвейеры запускать, через запятую")
+    parser.add_argument("--frames", type=int, default=30, help="кадров на конвейер (страниц OCR — в 10 раз меньше)")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="SIFT", help="тип признаков для поиска образца")
+    parser.add_argument("--face-source", help="каталог с фотографиями лиц или видеозапись; без него замеры лиц пропускаются")
+    parser.add_argument("--face-models", help="каталог с файлами DNN-моделей лиц (по умолчанию 1_lab/models)")
+    parser.add_argument("--face-batch", type=int, default=1, help="кадров в одном вызове детектора лиц")
+    parser.add_argument("--threads", type=int, help="cv2.setNumThreads (по умолчанию — как настроено в OpenCV)")
+    parser.add_argument("--output", help="файл для сохранения результатов JSON")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="допустимый рост медианы этапа (доля)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "cv2_threads": cv2.getNumThreads(),
+        },
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "benchmarks": {},
+    }
+
+    for name in args.only.split(","):
+        name = name.strip()
+        if name not in BENCHMARKS:
+            print(f"Неизвестный конвейер: {name}", file=sys.stderr)
+            return 2
+        print(f"== {name}", file=sys.stderr)
+        data = BENCHMARKS[name](args)
+        results["benchmarks"][name] = data
+        if "skipped" in data:
+            print(f"   пропущен: {data['skipped']}", file=sys.stderr)
+            continue
+        print(f"   {data['throughput_fps']:.2f} к/с", file=sys.stderr)
+        for stage, stats in data["stages"].items():
+            print(f"   {stage:<18} p50={stats['p50_ms']:9.3f}  p90={stats['p90_ms']:9.3f}  p99={stats['p99_ms']:9.3f} мс",
+                  file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Регрессии производительности:", file=sys.stderr)
+            for line in regressions:
+                print("  " + line, file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+
+
+def textured_image(rng, height, width, blobs=30):
+    """Случайное текстурированное изображение: сглаженный шум + цветные круги"""
+    img = cv2.GaussianBlur((rng.random((height, width, 3)) * 255).astype(np.uint8), (5, 5), 0)
+    for _ in range(blobs):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = int(rng.integers(3, max(4, min(width, height) // 8)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.circle(img, center, radius, color, -1)
+    return img
+
+
+def random_homography(rng, tpl_shape, scene_shape):
+    """Случайная перспектива, при которой образец целиком попадает в кадр"""
+    th, tw = tpl_shape[:2]
+    sh, sw = scene_shape[:2]
+    scale = rng.uniform(0.8, 1.4)
+    angle = np.deg2rad(rng.uniform(-20, 20))
+    c, s = np.cos(angle) * scale, np.sin(angle) * scale
+    A = np.array([[c, -s, 0], [s, c, 0], [rng.uniform(-2e-4, 2e-4), rng.uniform(-2e-4, 2e-4), 1]])
+    corners = cv2.perspectiveTransform(np.float32([[0, 0], [0, th], [tw, th], [tw, 0]]).reshape(-1, 1, 2), A).reshape(-1, 2)
+    x0, y0 = corners.min(axis=0)
+    x1, y1 = corners.max(axis=0)
+    dx = rng.uniform(-x0, max(-x0, sw - x1))
+    dy = rng.uniform(-y0, max(-y0, sh - y1))
+    return np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]]) @ A
+
+
+def matching_scenes(count, height=720, width=1280, tpl_size=(200, 260), seed=0):
+    """Образец и сцены, где он наложен со случайной перспективой на фон.
+
+    Возвращает (template, [(scene, H), ...]), H — истинная гомография образец -> сцена.
+    """
+    rng = np.random.default_rng(seed)
+    template = textured_image(rng, tpl_size[0], tpl_size[1])
+    scenes = []
+    for _ in range(count):
+        background = cv2.GaussianBlur(textured_image(rng, height, width, blobs=60), (9, 9), 0)
+        H = random_homography(rng, template.shape, background.shape)
+        warped = cv2.warpPerspective(template, H, (width, height))
+        mask = cv2.warpPerspective(np.full(template.shape[:2], 255, np.uint8), H, (width, height))
+        scene = background.copy()
+        scene[mask > 0] = warped[mask > 0]
+        scenes.append((scene, H))
+    return template, scenes
+
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud").split()
+
+
+def text_pages(count, height=1600, width=1200, lines=30, seed=0):
+    """Страницы с отрисованным текстом для OCR. Возвращает [(page, lines_text), ...]"""
+    rng = np.random.default_rng(seed)
+    pages = []
+    for _ in range(count):
+        page = np.full((height, width, 3), 255, np.uint8)
+        texts = []
+        step = (height - 100) // lines
+        for i in range(lines):
+            text = " ".join(rng.choice(WORDS, size=int(rng.integers(5, 9))))
+            cv2.putText(page, text, (60, 80 + i * step), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (20, 20, 20), 2, cv2.LINE_AA)
+            texts.append(text)
+        # Лёгкий шум, как у скана
+        noise = rng.normal(0, 8, page.shape)
+        page = np.clip(page + noise, 0, 255).astype(np.uint8)
+        pages.append((page, texts))
+    return pages
+
+
+def face_frames(count, source, height=720, width=1280):
+    """Кадры для детекторов лиц из каталога с фотографиями лиц или видеофайла (например, записи с камеры).
+
+    Синтетических кадров для лиц нет: каскад Хаара отбрасывает окна на первых
+    ступенях, поэтому его время сильно зависит от содержимого (на шумной
+    текстуре — в разы дольше, чем на гладком кадре того же размера), и замер
+    на сгенерированных кадрах не говорит о скорости на реальной съёмке.
+    """
+    return _load_frames(source, count, height, width)
+
+
+def _load_frames(source, count, height, width):
+    frames = []
+    if os.path.isdir(source):
+        for path in sorted(glob.glob(os.path.join(source, "*"))):
+            img = cv2.imread(path)
+            if img is not None:
+                frames.append(cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA))
+            if len(frames) >= count:
+                break
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+        cap.release()
+    if not frames:
+        raise OSError(f"Не удалось прочитать кадры из {source}")
+    # Если кадров меньше, чем нужно, повторяем их по кругу
+    return [frames[i % len(frames)] for i in range(count)]
@@ -0,0 +1 @@
+"""Общие компоненты лабораторных работ (подключаются из 1_lab, 2_lab и 3_lab)."""
@@ -0,0 +1,369 @@
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+CAMERA, VIDEO, IMAGES, URL = "camera", "video", "images", "url"
+# realtime — кадры отдаются с частотой источника, fast — сразу по готовности
+PACING_REALTIME, PACING_FAST = "realtime", "fast"
+PACINGS = (PACING_REALTIME, PACING_FAST)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+# Частота для последовательности изображений, если не задана явно
+DEFAULT_IMAGES_FPS = 25.0
+# Кадров, декодируемых заранее
+DEFAULT_BUFFER_SIZE = 8
+# Пауза перед переподключением к сетевому потоку, с (удваивается до предела)
+RECONNECT_DELAY = 0.5
+RECONNECT_DELAY_MAX = 5.0
+
+
+def source_kind(spec):
+    """Тип источника по строке: номер камеры, URL, каталог или маска файлов, иначе видеофайл"""
+    spec = str(spec)
+    if spec.isdigit():
+        return CAMERA
+    if "://" in spec:
+        return URL
+    if os.path.isdir(spec) or any(c in spec for c in "*?["):
+        return IMAGES
+    return VIDEO
+
+
+def image_sequence(spec):
+    """Файлы последовательности по алфавиту: все изображения каталога или файлы по маске"""
+    if os.path.isdir(spec):
+        return sorted(
+            os.path.join(spec, name) for name in os.listdir(spec) if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    return sorted(glob.glob(spec))
+
+
+class FrameRing:
+    """Кольцевой буфер кадров фиксированной ёмкости.
+
+    Для живых источников (drop_oldest=True) новый кадр вытесняет самый старый,
+    а get() отдаёт самый свежий кадр и отбрасывает более старые — задержка
+    не копится, сколько бы кадров ни держал буфер; для файлов поток
+    декодирования ждёт свободного места, и кадры не теряются.
+    """
+
+    def __init__(self, capacity, drop_oldest):
+        self.cond = threading.Condition()
+        self.items = deque()
+        self.capacity = max(1, capacity)
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self.closed = False
+        self.finished = False
+
+    def put(self, item):
+        with self.cond:
+            while len(self.items) >= self.capacity and not self.closed:
+                if self.drop_oldest:
+                    self.items.popleft()
+                    self.dropped += 1
+                    break
+                self.cond.wait()
+            if self.closed:
+                return False
+            self.items.append(item)
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Следующий кадр или None, если источник закончился, закрыт или истёк таймаут"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.items or self.finished or self.closed, timeout):
+                return None
+            if not self.items:
+                return None
+            if self.drop_oldest:
+                item = self.items.pop()
+                self.dropped += len(self.items)
+                self.items.clear()
+            else:
+                item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    def resize(self, capacity):
+        with self.cond:
+            self.capacity = max(1, capacity)
+            while len(self.items) > self.capacity:
+                self.items.popleft()
+                self.dropped += 1
+            self.cond.notify_all()
+
+    def finish(self):
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.items.clear()
+            self.cond.notify_all()
+
+
+class FrameSource:
+    """Источник кадров с интерфейсом cv2.VideoCapture: камера, видеофайл, последовательность изображений, URL.
+
+    Кадры декодируются заранее в отдельном потоке в кольцевой буфер на
+    buffer_size кадров. stride — брать каждый stride-й кадр (пропущенные
+    кадры видео не декодируются, только grab()). width/height/fps для камеры
+    и URL запрашиваются у устройства; если источник отдаёт другой размер,
+    кадры масштабируются. Для файлов pacing="realtime" отдаёт кадры
+    с частотой записи (или fps), "fast" — так быстро, как их читают.
+    Живые источники всегда идут в своём темпе: read() отдаёт самый свежий
+    кадр, более старые отбрасываются.
+
+    VideoCapture принадлежит потоку декодирования: только он читает и
+    переоткрывает его. release() освобождает VideoCapture сам, лишь если поток
+    уже завершился; если поток ещё заблокирован в read() или grab() сетевого
+    потока, он освободит его на выходе.
+    """
+
+    def __init__(self, spec, pacing=PACING_REALTIME, stride=1, width=None, height=None, fps=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE, loop=False):
+        self.spec = str(spec)
+        self.kind = source_kind(spec)
+        self.live = self.kind in (CAMERA, URL)
+        self.pacing = pacing
+        self.stride = max(1, int(stride))
+        self.width, self.height = width, height
+        self.loop = loop and not self.live
+
+        self.cap = None
+        self.paths = []
+        self.source_fps = 0.0
+        self.frame_count = 0
+        self._open(fps)
+        self.fps = fps or self.source_fps or DEFAULT_IMAGES_FPS
+
+        self.ring = FrameRing(buffer_size, drop_oldest=self.live)
+        self.reconnects = 0
+        self.delivered = 0
+        self.decoded = 0
+        self.start_time = None
+        self.release_lock = threading.Lock()
+        self.thread = None
+        if self.isOpened():
+            self.thread = threading.Thread(target=self._decode_loop, name="frame-source", daemon=True)
+            self.thread.start()
+
+    def _open(self, fps):
+        if self.kind == IMAGES:
+            self.paths = image_sequence(self.spec)
+            self.frame_count = len(self.paths)
+            self.source_fps = fps or DEFAULT_IMAGES_FPS
+            return
+        self.cap = cv2.VideoCapture(int(self.spec) if self.kind == CAMERA else self.spec)
+        if not self.cap.isOpened():
+            return
+        self._configure(fps)
+
+    def _configure(self, fps):
+        if self.live:
+            # Согласование с устройством: запрашиваем, затем читаем то, что оно реально выставило
+            if self.width and self.height:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            if fps:
+                self.cap.set(cv2.CAP_PROP_FPS, fps)
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.source_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+
+    def isOpened(self):
+        if self.kind == IMAGES:
+            return bool(self.paths)
+        if self.kind == URL and self.thread is not None:
+            return not self.ring.closed  # на время переподключения поток считается открытым
+        cap = self.cap
+        return cap is not None and cap.isOpened()
+
+    def _read_next(self, index):
+        """(номер кадра, кадр), начиная с номера index, или (index, None) в конце источника"""
+        if self.kind == IMAGES:
+            # Нечитаемый файл пропускается, последовательность продолжается
+            for i in range(index, len(self.paths), self.stride):
+                frame = cv2.imread(self.paths[i])
+                if frame is not None:
+                    return i, frame
+            return index, None
+        ok, frame = self.cap.read()
+        return index, frame if ok else None
+
+    def _skip(self):
+        """Пропускает stride - 1 кадров видео без декодирования"""
+        if self.cap is not None:
+            for _ in range(self.stride - 1):
+                if not self.cap.grab():
+                    break
+
+    def _rewind(self):
+        if self.cap is not None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _reconnect(self, delay):
+        """Переоткрывает сетевой поток после паузы delay; False, если источник закрыли"""
+        with self.ring.cond:
+            if self.ring.cond.wait_for(lambda: self.ring.closed, delay):
+                return False
+        cap = cv2.VideoCapture(self.spec)
+        with self.release_lock:
+            if self.ring.closed:
+                # Источник закрыли, пока шло подключение
+                cap.release()
+                return False
+            old, self.cap = self.cap, cap
+        if old is not None:
+            old.release()
+        self.reconnects += 1
+        if cap.isOpened():
+            self._configure(None)
+        return True
+
+    def _decode_loop(self):
+        try:
+            self._decode_frames()
+        finally:
+            self.ring.finish()
+            if self.ring.closed:
+                self._release_cap()
+
+    def _decode_frames(self):
+        index = 0  # номер кадра в источнике
+        offset = 0.0  # время от начала воспроизведения до начала текущего круга, с
+        delay = RECONNECT_DELAY
+        while not self.ring.closed:
+            index, frame = self._read_next(index)
+            if frame is None:
+                if self.kind == URL:
+                    # Сетевой поток оборвался — переподключаемся с нарастающей паузой
+                    if not self._reconnect(delay):
+                        break
+                    delay = min(delay * 2, RECONNECT_DELAY_MAX)
+                    continue
+                if self.live:
+                    # Поток мог прерваться на мгновение — пробуем дальше
+                    time.sleep(0.01)
+                    continue
+                if not self.loop or index == 0:
+                    break
+                offset += index / self.fps
+                index = 0
+                self._rewind()
+                continue
+            if self.width and self.height and frame.shape[1::-1] != (self.width, self.height):
+                frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+            self.decoded += 1
+            delay = RECONNECT_DELAY
+            if not self.ring.put((offset + index / self.fps, frame)):
+                break
+            index += self.stride
+            self._skip()
+
+    def read(self, timeout=1.0):
+        """(True, кадр) или (False, None), если источник закончился или кадр не пришёл за timeout"""
+        item = self.ring.get(timeout)
+        if item is None:
+            return False, None
+        pts, frame = item
+        if self.pacing == PACING_REALTIME and not self.live:
+            now = time.perf_counter()
+            if self.start_time is None:
+                self.start_time = now - pts
+            delay = self.start_time + pts - now
+            if delay > 0:
+                time.sleep(delay)
+        self.delivered += 1
+        return True, frame
+
+    @property
+    def ended(self):
+        """Файл дочитан до конца и все кадры отданы"""
+        return self.ring.finished and not self.ring.items
+
+    @property
+    def lossless(self):
+        """Файл воспроизводится на полной скорости — обработчик не должен пропускать кадры"""
+        return not self.live and self.pacing == PACING_FAST
+
+    @property
+    def dropped(self):
+        return self.ring.dropped
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps / self.stride
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return -(-self.frame_count // self.stride)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.delivered
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            if self.width and self.height:
+                return self.width if prop == cv2.CAP_PROP_FRAME_WIDTH else self.height
+            cap = self.cap
+            return cap.get(prop) if cap is not None else 0.0
+        return 0.0
+
+    def set(self, prop, value):
+        """Поддерживается только CAP_PROP_BUFFERSIZE — ёмкость буфера заранее декодированных кадров"""
+        if prop == cv2.CAP_PROP_BUFFERSIZE:
+            self.ring.resize(int(value))
+            return True
+        return False
+
+    def describe(self):
+        w, h = int(self.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        size = f"{w}x{h}, " if w and h else ""
+        name = self.spec if self.kind in (CAMERA, URL) else os.path.basename(self.spec.rstrip("/\\")) or self.spec
+        stride = f", каждый {self.stride}-й кадр" if self.stride > 1 else ""
+        return f"{name}: {size}{self.get(cv2.CAP_PROP_FPS):.1f} к/с{stride}"
+
+    def _release_cap(self):
+        with self.release_lock:
+            cap, self.cap = self.cap, None
+        if cap is not None:
+            cap.release()
+
+    def release(self, timeout=2.0):
+        self.ring.close()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                # Поток декодирования ещё в read()/grab(): VideoCapture он освободит сам
+                return
+            self.thread = None
+        self._release_cap()
+
+
+def add_source_args(parser, default="0"):
+    """Флаги источника кадров для командной строки приложения"""
+    parser.add_argument("--source", default=default,
+                        help="номер камеры, видеофайл, каталог или маска изображений (frames/*.png), URL")
+    return add_source_options(parser)
+
+
+def add_source_options(parser):
+    """Флаги чтения кадров без самого источника — для программ с несколькими источниками"""
+    parser.add_argument("--pacing", choices=PACINGS, default=PACING_REALTIME,
+                        help="для файлов: realtime — с частотой записи, fast — как можно быстрее")
+    parser.add_argument("--stride", type=int, default=1, help="брать каждый N-й кадр")
+    parser.add_argument("--width", type=int, help="ширина кадра (запрашивается у камеры, иначе масштабирование)")
+    parser.add_argument("--height", type=int, help="высота кадра")
+    parser.add_argument("--fps", type=float, help="частота кадров: запрос к камере или темп воспроизведения файла")
+    parser.add_argument("--loop", action="store_true", help="повторять файл по кругу")
+    return parser
+
+
+def source_options(args):
+    """Параметры FrameSource из флагов add_source_options (кроме самого источника)"""
+    return {"pacing": args.pacing, "stride": args.stride, "width": args.width, "height": args.height,
+            "fps": args.fps, "loop": args.loop}
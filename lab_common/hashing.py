@@ -0,0 +1,12 @@
+import hashlib
+
+import numpy as np
+
+
+def image_hash(img):
+    """Хэш содержимого изображения (пиксели + форма + тип)"""
+    h = hashlib.sha1()
+    h.update(str(img.shape).encode())
+    h.update(str(img.dtype).encode())
+    h.update(np.ascontiguousarray(img).tobytes())
+    return h.hexdigest()
@@ -0,0 +1,356 @@
+import cProfile
+import csv
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Сколько последних замеров этапа учитывается в перцентилях
+DEFAULT_WINDOW = 500
+# Период записи журнала метрик, с
+LOG_INTERVAL = 1.0
+
+
+class StageStats:
+    """Замеры одного этапа: скользящее окно для перцентилей и накопленные число и сумма"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def summary(self):
+        ms = np.array(self.samples) * 1000.0
+        p50, p90, p99 = np.percentile(ms, (50, 90, 99)) if len(ms) else (0.0, 0.0, 0.0)
+        return {
+            "count": self.count,
+            "sum_s": round(self.total, 6),
+            "last_ms": round(self.last * 1000.0, 4),
+            "mean_ms": round(float(ms.mean()), 4) if len(ms) else 0.0,
+            "p50_ms": round(float(p50), 4),
+            "p90_ms": round(float(p90), 4),
+            "p99_ms": round(float(p99), 4),
+        }
+
+
+class Metrics:
+    """Именованные таймеры этапов, счётчики и текущие значения (потокобезопасно).
+
+    Этапы замеряются контекстным менеджером stage(name) или добавляются готовыми
+    длительностями через record(); счётчики (кадры, пропуски) увеличиваются count(),
+    текущие значения (попадания в кэш, очередь) задаются set().
+    У счётчиков и значений могут быть метки (labels={"stream": "door-1"}):
+    в снимке это отдельная запись «dropped{stream=door-1}», а в Prometheus —
+    одна метрика dropped_total с меткой, так что произвольные имена потоков
+    не попадают в имя метрики.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.series = {}  # ключ записи -> (имя метрики, метки)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats(self.window)
+            stats.add(seconds)
+
+    def record_timings(self, timings, prefix=""):
+        """Добавляет словарь длительностей этапов {имя: секунды}, например MatchResult.timings"""
+        for name, seconds in timings.items():
+            self.record(prefix + name, seconds)
+
+    def _key(self, name, labels):
+        if not labels:
+            return name
+        labels = tuple(sorted(labels.items()))
+        key = name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+        self.series[key] = (name, labels)
+        return key
+
+    def count(self, name, n=1, labels=None):
+        with self.lock:
+            key = self._key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def set(self, name, value, labels=None):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.series.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "time": time.time(),
+                "stages": {name: stats.summary() for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def format_lines(self):
+        """Строки для панели статистики: этапы с перцентилями, затем счётчики"""
+        snap = self.snapshot()
+        lines = [f"{'этап':<16}{'p50':>9}{'p90':>9}{'p99':>9}  мс"]
+        for name, s in snap["stages"].items():
+            lines.append(f"{name:<16}{s['p50_ms']:9.2f}{s['p90_ms']:9.2f}{s['p99_ms']:9.2f}  ({s['count']})")
+        values = {**snap["counters"], **snap["gauges"]}
+        if values:
+            lines.append(" | ".join(f"{k}: {_format_value(v)}" for k, v in values.items()))
+        return lines
+
+    def to_prometheus(self, prefix="lab"):
+        """Текстовый формат Prometheus: этапы — summary с квантилями, счётчики — counter, значения — gauge"""
+        snap = self.snapshot()
+        with self.lock:
+            series = dict(self.series)
+        out = [f"# HELP {prefix}_stage_seconds Длительность этапа обработки",
+               f"# TYPE {prefix}_stage_seconds summary"]
+        for name, s in snap["stages"].items():
+            label = f'stage="{_escape_label(name)}"'
+            for q, key in (("0.5", "p50_ms"), ("0.9", "p90_ms"), ("0.99", "p99_ms")):
+                out.append(f'{prefix}_stage_seconds{{{label},quantile="{q}"}} {s[key] / 1000.0:.6f}')
+            out.append(f"{prefix}_stage_seconds_sum{{{label}}} {s['sum_s']:.6f}")
+            out.append(f"{prefix}_stage_seconds_count{{{label}}} {s['count']}")
+        for kind, suffix, type_name in (("counters", "_total", "counter"), ("gauges", "", "gauge")):
+            # Записи одной метрики с разными метками выводятся под одним # TYPE
+            families = {}
+            for key, value in snap[kind].items():
+                name, labels = series.get(key, (key, ()))
+                families.setdefault(f"{prefix}_{_metric_name(name)}{suffix}", []).append((labels, value))
+            for metric, samples in families.items():
+                out.append(f"# TYPE {metric} {type_name}")
+                for labels, value in samples:
+                    label = ",".join(f'{_metric_name(k)}="{_escape_label(str(v))}"' for k, v in labels)
+                    out.append(f"{metric}{{{label}}} {value}" if label else f"{metric} {value}")
+        return "\n".join(out) + "\n"
+
+
+def _format_value(value):
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsLog:
+    """Периодическая запись снимков метрик в файл: JSON Lines (.jsonl, .json) или CSV (.csv)"""
+
+    CSV_FIELDS = ("time", "kind", "name", "count", "value", "p50_ms", "p90_ms", "p99_ms")
+
+    def __init__(self, path, metrics, interval=LOG_INTERVAL):
+        self.path = path
+        self.metrics = metrics
+        self.interval = interval
+        self.is_csv = path.lower().endswith(".csv")
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file) if self.is_csv else None
+        if self.is_csv and self.file.tell() == 0:
+            self.writer.writerow(self.CSV_FIELDS)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def write(self):
+        snap = self.metrics.snapshot()
+        if not self.is_csv:
+            self.file.write(json.dumps(snap, ensure_ascii=False) + "\n")
+        else:
+            t = round(snap["time"], 3)
+            for name, s in snap["stages"].items():
+                self.writer.writerow((t, "stage", name, s["count"], s["mean_ms"], s["p50_ms"], s["p90_ms"], s["p99_ms"]))
+            for kind in ("counters", "gauges"):
+                for name, value in snap[kind].items():
+                    self.writer.writerow((t, kind[:-1], name, "", value, "", "", ""))
+        self.file.flush()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name="metrics-log", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
+        self.file.close()
+
+
+class MetricsServer:
+    """Локальный HTTP-эндпоинт /metrics в текстовом формате Prometheus (отдельный поток)"""
+
+    def __init__(self, metrics, port, host="127.0.0.1", prefix="lab"):
+        server_metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = server_metrics.to_prometheus(prefix).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # запросы сборщика метрик не засоряют консоль
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SessionProfiler:
+    """cProfile на весь сеанс, при остановке — один файл .prof.
+
+    До Python 3.12 cProfile замеряет только поток, в котором включён, поэтому
+    потоки, запущенные после start(), включают свой профиль сами при первом
+    вызове функции. С 3.12 cProfile работает через sys.monitoring: один
+    профиль охватывает все потоки процесса, а второй включить нельзя.
+    """
+
+    PROCESS_WIDE = sys.version_info >= (3, 12)
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.profiles = []
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Уже включён другой профилировщик: поток работает дальше без профиля
+            print(f"Профиль потока {threading.current_thread().name} не включён: {e}", file=sys.stderr)
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def _thread_hook(self, frame, event, arg):
+        sys.setprofile(None)
+        self._enable()
+
+    def start(self):
+        if not self.PROCESS_WIDE:
+            threading.setprofile(self._thread_hook)
+        self._enable()
+
+    def stop(self, top=20):
+        """Сохраняет общий профиль и печатает самые затратные функции в stderr"""
+        if not self.PROCESS_WIDE:
+            threading.setprofile(None)
+        with self.lock:
+            profiles, self.profiles = self.profiles, []
+        for profile in profiles:
+            profile.disable()
+        stats = None
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile, stream=sys.stderr)
+            else:
+                stats.add(profile)
+        if stats is None:
+            return
+        stats.dump_stats(self.path)
+        scope = "все потоки" if self.PROCESS_WIDE else f"потоков: {len(profiles)}"
+        print(f"Профиль сохранён: {self.path} ({scope})", file=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(top)
+
+
+def add_metrics_args(parser):
+    """Флаги инструментирования для командной строки приложения"""
+    parser.add_argument("--stats-log", help="журнал метрик: .jsonl (JSON Lines) или .csv, запись раз в секунду")
+    parser.add_argument("--metrics-port", type=int, help="порт локального эндпоинта Prometheus /metrics")
+    parser.add_argument("--profile", help="записать профиль cProfile всего сеанса в файл .prof")
+    return parser
+
+
+class Instrumentation:
+    """Вывод метрик сеанса по флагам add_metrics_args: журнал, эндпоинт Prometheus, cProfile"""
+
+    def __init__(self, metrics, stats_log=None, metrics_port=None, profile=None, prefix="lab"):
+        self.metrics = metrics
+        self.log = MetricsLog(stats_log, metrics) if stats_log else None
+        self.server = MetricsServer(metrics, metrics_port, prefix=prefix) if metrics_port else None
+        self.profiler = SessionProfiler(profile) if profile else None
+
+    @classmethod
+    def from_args(cls, metrics, args, prefix="lab"):
+        return cls(metrics, args.stats_log, args.metrics_port, args.profile, prefix)
+
+    def start(self):
+        if self.profiler is not None:
+            self.profiler.start()
+        if self.log is not None:
+            self.log.start()
+        if self.server is not None:
+            self.server.start()
+            print(f"Метрики: {self.server.address}", file=sys.stderr)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+        if self.log is not None:
+            self.log.close()
+            print(f"Журнал метрик: {os.path.abspath(self.log.path)}", file=sys.stderr)
+        if self.profiler is not None:
+            self.profiler.stop()
@@ -0,0 +1,88 @@
+import tkinter as tk
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+def fit_size(width, height, max_width, max_height, allow_upscale=False):
+    """Размер, вписанный в max_width x max_height с сохранением пропорций"""
+    scale = min(max_width / width, max_height / height)
+    if not allow_upscale:
+        scale = min(scale, 1.0)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class FramePresenter:
+    """Вывод кадров OpenCV в виджет Tk с минимумом выделений памяти.
+
+    Держит один PhotoImage и одну картинку на Canvas (или в Label) и
+    обновляет их на месте через PhotoImage.paste(). Буферы для cv2.resize
+    и преобразования BGR -> RGB выделяются заново только при смене размера.
+    Для живого видео используется дешёвая интерполяция, для статичных
+    изображений — LANCZOS.
+    """
+
+    LIVE_INTERPOLATION = cv2.INTER_LINEAR
+    STILL_INTERPOLATION = cv2.INTER_LANCZOS4
+
+    def __init__(self, widget, item=None, anchor=tk.NW):
+        self.widget = widget
+        self.is_canvas = isinstance(widget, tk.Canvas)
+        self.item = item
+        if self.is_canvas and self.item is None:
+            self.item = widget.create_image(0, 0, anchor=anchor)
+
+        self.photo = None
+        self.size = None
+        self.resize_buf = None
+        self.rgb_buf = None
+
+    def show(self, img, size=None, live=True):
+        """Показывает img (BGR или оттенки серого) в размере size=(w, h) или в исходном.
+
+        Возвращает фактический размер. Если размер изменился, вызывающий код
+        может обновить, например, область прокрутки.
+        """
+        if img is None:
+            return self.size
+        h, w = img.shape[:2]
+        size = (w, h) if size is None else (int(size[0]), int(size[1]))
+
+        # Масштабирование в заранее выделенный буфер
+        if size != (w, h):
+            buf_shape = (size[1], size[0]) + img.shape[2:]
+            if self.resize_buf is None or self.resize_buf.shape != buf_shape:
+                self.resize_buf = np.empty(buf_shape, img.dtype)
+            interpolation = self.LIVE_INTERPOLATION if live else self.STILL_INTERPOLATION
+            cv2.resize(img, size, dst=self.resize_buf, interpolation=interpolation)
+            img = self.resize_buf
+
+        # Преобразование цвета в заранее выделенный буфер
+        if self.rgb_buf is None or self.rgb_buf.shape[:2] != (size[1], size[0]):
+            self.rgb_buf = np.empty((size[1], size[0], 3), np.uint8)
+        code = cv2.COLOR_GRAY2RGB if img.ndim == 2 else cv2.COLOR_BGR2RGB
+        cv2.cvtColor(img, code, dst=self.rgb_buf)
+        pil_img = Image.fromarray(self.rgb_buf)
+
+        if self.photo is None or self.size != size:
+            # Новый PhotoImage — только при смене размера
+            self.photo = ImageTk.PhotoImage(image=pil_img)
+            self.size = size
+            if self.is_canvas:
+                self.widget.itemconfig(self.item, image=self.photo)
+            else:
+                self.widget.configure(image=self.photo)
+            self.widget.image = self.photo  # Сохраняем ссылку, чтобы изображение не исчезло
+        else:
+            self.photo.paste(pil_img)
+        return size
+
+    def clear(self):
+        if self.is_canvas:
+            self.widget.itemconfig(self.item, image="")
+        else:
+            self.widget.configure(image="")
+        self.widget.image = None
+        self.photo = None
+        self.size = None
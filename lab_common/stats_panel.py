@@ -0,0 +1,39 @@
+import tkinter as tk
+
+# Период обновления панели статистики, мс
+STATS_REFRESH_MS = 500
+
+
+class StatsPanel:
+    """Панель статистики этапов (моноширинный текст), обновляется в цикле Tk.
+
+    Показывается и скрывается флажком; пока скрыта, снимки метрик не строятся.
+    """
+
+    def __init__(self, parent, metrics, **pack_options):
+        self.metrics = metrics
+        self.pack_options = pack_options or {"fill": tk.X}
+        self.var = tk.StringVar(value="")
+        self.label = tk.Label(parent, textvariable=self.var, font=("Courier", 9), justify=tk.LEFT, anchor=tk.W)
+        self.visible = False
+        self.after_id = None
+
+    def toggle(self, visible):
+        if visible and not self.visible:
+            self.visible = True
+            self.label.pack(**self.pack_options)
+            self.refresh()
+        elif not visible and self.visible:
+            self.visible = False
+            self.label.pack_forget()
+            # Иначе после быстрого повторного включения работали бы два цикла обновления
+            if self.after_id is not None:
+                self.label.after_cancel(self.after_id)
+                self.after_id = None
+
+    def refresh(self):
+        self.after_id = None
+        if not self.visible:
+            return
+        self.var.set("\n".join(self.metrics.format_lines()))
+        self.after_id = self.label.after(STATS_REFRESH_MS, self.refresh)
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import cv2
+
+# Промежуточные фрагменты пишутся без потерь (FFV1, нужен FFmpeg в сборке OpenCV)
+# или MJPEG наилучшего качества, чтобы при склейке видео сжималось с потерями один раз
+CHUNK_CODECS = ("FFV1", "MJPG")
+
+
+def video_frame_count(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise OSError(f"Не удалось открыть видео: {path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return total
+
+
+def video_chunks(path, chunk_size, annotate=None):
+    """Делит видео на задания по диапазонам кадров [first, last).
+
+    Возвращает список (path, first, last, chunk_path); chunk_path — файл для
+    размеченного фрагмента (None, если разметка не нужна). Если контейнер
+    или поток не сообщает число кадров (0 или -1), задание одно: last=None,
+    видео читается подряд до конца.
+    """
+    total = video_frame_count(path)
+    if total <= 0:
+        print(f"{path}: число кадров неизвестно, видео читается одним заданием подряд", file=sys.stderr)
+        return [(path, 0, None, f"{annotate}.part00000.avi" if annotate else None)]
+    chunks = []
+    for i, first in enumerate(range(0, total, chunk_size)):
+        chunk_path = f"{annotate}.part{i:05d}.avi" if annotate else None
+        chunks.append((path, first, min(first + chunk_size, total), chunk_path))
+    return chunks
+
+
+def mirror_path(out_dir, path, root):
+    """Путь в out_dir, повторяющий путь файла относительно root.
+
+    Одноимённые файлы из разных каталогов не перезаписывают друг друга.
+    """
+    return os.path.join(out_dir, os.path.relpath(os.path.abspath(path), root))
+
+
+def common_root(paths):
+    """Общий каталог файлов — от него отсчитываются пути в mirror_path"""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+
+
+def open_writer(path, frame, fps):
+    h, w = frame.shape[:2]
+    return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps or 25.0, (w, h))
+
+
+def open_chunk_writer(path, frame, fps):
+    """Писатель промежуточного фрагмента: первый доступный кодек из CHUNK_CODECS"""
+    h, w = frame.shape[:2]
+    for codec in CHUNK_CODECS:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps or 25.0, (w, h))
+        if writer.isOpened():
+            writer.set(cv2.VIDEOWRITER_PROP_QUALITY, 100)  # учитывается только MJPEG
+            return writer
+        writer.release()
+    return open_writer(path, frame, fps)
+
+
+def join_video_chunks(chunks, out_path):
+    """Склеивает размеченные фрагменты в один видеофайл (mp4v) и удаляет фрагменты"""
+    writer = None
+    for _, _, _, chunk_path in chunks:
+        if not chunk_path or not os.path.exists(chunk_path):
+            continue
+        cap = cv2.VideoCapture(chunk_path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if writer is None:
+                writer = open_writer(out_path, frame, cap.get(cv2.CAP_PROP_FPS))
+            writer.write(frame)
+        cap.release()
+        os.remove(chunk_path)
+    if writer is not None:
+        writer.release()